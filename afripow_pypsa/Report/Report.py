@@ -21,6 +21,7 @@ from ..classes.settingsEditor import tk_tree_view
 
 from ..helpers.direcory_cases import find_input_directories
 from ..helpers.is_solved_case import is_solved_case
+from ..helpers.network_cache import load_network_cached
 
 from ..helpers.own_types import FigAxDF
 from ..helpers.plot_order_colours import get_plot_order_colours
@@ -112,7 +113,7 @@ class Report:
             print(f"[ INFO ] - Importing Pypsa Network from {year}")
             # TODO - error - if network not available here, add blank Pypsa Network
             try:
-                loaded_network = pypsa.Network(self.paths[str(year)][year])
+                loaded_network = load_network_cached(self.paths[str(year)][year])
                 self.networks.append(loaded_network)
             except KeyError:
                 self.networks.append(pypsa.Network())
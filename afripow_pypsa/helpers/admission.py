@@ -0,0 +1,144 @@
+"""
+Admission control for solves running at the same time.
+
+Several CPLEX solves on one machine run out of memory or over-subscribe the cores when every solve
+is started as soon as a worker is free, each with CPLEX's default of all the threads. The
+AdmissionController keeps the solves that are running with their predicted peak memory and CPLEX
+threads, and a new solve is only started when
+
+    memory of the running solves + its predicted peak <= memory budget
+
+(the first solve always starts, with a warning when it alone is over the budget). The threads of
+a new solve are the free threads split over the solves that can still start:
+
+    threads = free threads // min(free worker slots, solves waiting, solves of its size that fit)
+
+The predicted peak is the peak_rss_mb of the last run of the same stage and year in the case's
+run_metrics.csv, else the largest of the stage, else the largest of the case, else
+DEFAULT_PEAK_MB. The threads every solve used are recorded there as well ('threads').
+
+A case that was never solved has no history, the model size preview (toolbox.preview_model_sizes)
+estimates its peak before the first solve as
+
+    RSS after the model is built + nonzeros * SOLVER_BYTES_PER_NONZERO
+
+where the second part is CPLEX's copy of the problem with the presolve and barrier work space.
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PEAK_MB = 4096
+# part of the physical memory used when no budget is given
+DEFAULT_BUDGET_SHARE = 0.85
+# CPLEX memory per nonzero of the constraint matrix, a rough rule of thumb for barrier solves
+# (the factorization dominates), only used until the case has a run_metrics.csv history
+SOLVER_BYTES_PER_NONZERO = 160
+
+
+def total_memory_mb() -> float:
+    """physical memory of the machine in MB, nan when it can not be read"""
+    if sys.platform == "win32":
+        try:
+            import win32api
+
+            return win32api.GlobalMemoryStatusEx()["TotalPhys"] / 2**20
+        except Exception:
+            return np.nan
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**20
+    except (ValueError, OSError, AttributeError):
+        return np.nan
+
+
+def predicted_peak_mb(
+    run_metrics: pd.DataFrame, stage: str, year, default_mb=DEFAULT_PEAK_MB
+) -> float:
+    """the expected peak memory of a stage year, from the earlier runs of the case"""
+    if run_metrics.empty or "peak_rss_mb" not in run_metrics.columns:
+        return default_mb
+    history = run_metrics.dropna(subset=["peak_rss_mb"])
+    same_stage = history[history["stage"] == stage]
+    same_year = same_stage[same_stage["year"].astype(str) == str(year)]
+    for rows in [same_year.tail(1), same_stage, history]:
+        if not rows.empty:
+            return float(rows["peak_rss_mb"].max())
+    return default_mb
+
+
+def estimated_solve_peak_mb(model_rss_mb: float, nonzeros: int) -> float:
+    """the peak memory of a solve, from the RSS of the built model and its nonzeros"""
+    return model_rss_mb + nonzeros * SOLVER_BYTES_PER_NONZERO / 2**20
+
+
+class AdmissionController:
+    """the solves running at the same time, see the module docstring"""
+
+    def __init__(self, max_solves, total_threads=None, memory_budget_mb=None):
+        self.max_solves = max(1, int(max_solves))
+        self.total_threads = int(total_threads or os.cpu_count() or 1)
+        if not memory_budget_mb:
+            memory_budget_mb = total_memory_mb() * DEFAULT_BUDGET_SHARE
+        self.memory_budget_mb = memory_budget_mb
+        self.running = {}  # key: (predicted_mb, threads)
+        self._condition = threading.Condition()
+
+    def used_memory_mb(self) -> float:
+        return sum(mb for mb, _ in self.running.values())
+
+    def used_threads(self) -> int:
+        return sum(threads for _, threads in self.running.values())
+
+    def try_start(self, key, predicted_mb, waiting=1, threads=None):
+        """
+        the CPLEX threads of the solve when it can start now, None when it has to wait.
+        waiting: the number of solves that are ready to start, this one included.
+        threads: a fixed number of threads, only the memory is checked
+        """
+        with self._condition:
+            if self.running:
+                if len(self.running) >= self.max_solves:
+                    return None
+                # nan budget (memory unknown): only the number of solves is limited
+                if self.used_memory_mb() + predicted_mb > self.memory_budget_mb:
+                    return None
+            elif predicted_mb > self.memory_budget_mb:
+                print(
+                    f"[ WARNING ] - {key} is expected to need {predicted_mb:.0f} MB, more than "
+                    f"the memory budget of {self.memory_budget_mb:.0f} MB"
+                )
+            if not threads:
+                free_threads = max(1, self.total_threads - self.used_threads())
+                slots = max(1, min(self.max_solves - len(self.running), waiting))
+                if predicted_mb > 0 and not np.isnan(self.memory_budget_mb):
+                    # solves of this size that fit in the memory left, this one included
+                    fit = (
+                        self.memory_budget_mb - self.used_memory_mb()
+                    ) // predicted_mb
+                    slots = max(1, min(slots, int(fit)))
+                threads = max(1, free_threads // slots)
+            self.running[key] = (predicted_mb, int(threads))
+            print(
+                f"[ INFO ] - Admitted {key}: {predicted_mb:.0f} MB expected, {threads} threads "
+                f"({self.used_memory_mb():.0f} of {self.memory_budget_mb:.0f} MB, "
+                f"{len(self.running)} solves running)"
+            )
+            return int(threads)
+
+    def acquire(self, key, predicted_mb, waiting=1, threads=None) -> int:
+        """wait until the solve can start (for callers in threads), returns its threads"""
+        with self._condition:
+            while True:
+                admitted = self.try_start(key, predicted_mb, waiting, threads)
+                if admitted is not None:
+                    return admitted
+                self._condition.wait()
+
+    def finish(self, key) -> None:
+        with self._condition:
+            self.running.pop(key, None)
+            self._condition.notify_all()
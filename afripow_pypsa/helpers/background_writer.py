@@ -0,0 +1,127 @@
+"""
+Background writer for the results folders.
+
+save_outputs used to block the year loop on network.export_to_csv_folder and the statistics.
+With a BackgroundResultsWriter the export only takes a snapshot of the frames that PyPSA would
+write (the exporter already hands over copies), and the csv files are written by a thread pool
+while the next year is loading and solving.
+
+The files, names and layout are exactly those of network.export_to_csv_folder, the same
+PyPSA exporter is used, only the writing is deferred.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import pandas as pd
+import pypsa
+from pypsa.io import ExporterCSV, _export_to_exporter
+
+
+class SnapshotExporterCSV(ExporterCSV):
+    """ExporterCSV that collects (file, frame) writes in self.jobs in place of writing them"""
+
+    def __init__(self, csv_folder_name, encoding=None):
+        super().__init__(csv_folder_name, encoding)
+        self.jobs = []
+
+    def _add_job(self, filename, df):
+        self.jobs.append((os.path.join(self.csv_folder_name, filename), df))
+
+    def save_attributes(self, attrs):
+        name = attrs.pop("name")
+        self._add_job(
+            "network.csv", pd.DataFrame(attrs, index=pd.Index([name], name="name"))
+        )
+
+    def save_snapshots(self, snapshots):
+        self._add_job("snapshots.csv", snapshots)
+
+    def save_investment_periods(self, investment_periods):
+        self._add_job("investment_periods.csv", investment_periods.copy())
+
+    def save_static(self, list_name, df):
+        self._add_job(list_name + ".csv", df)
+
+    def save_series(self, list_name, attr, df):
+        self._add_job(list_name + "-" + attr + ".csv", df)
+
+
+class BackgroundResultsWriter:
+    def __init__(self, max_workers=4):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="results_writer"
+        )
+        self._futures = {}
+
+    def submit(self, description, fn, *args, **kwargs):
+        self._futures[self._pool.submit(fn, *args, **kwargs)] = description
+
+    def export_to_csv_folder(
+        self, network: pypsa.Network, csv_folder_name, encoding=None
+    ):
+        """same files as network.export_to_csv_folder(csv_folder_name), written in the background"""
+        start = time.perf_counter()
+        exporter = SnapshotExporterCSV(csv_folder_name, encoding)
+        _export_to_exporter(
+            network, exporter, basename=os.path.basename(csv_folder_name)
+        )
+        for file_path, df in exporter.jobs:
+            self.submit(file_path, df.to_csv, file_path, encoding=encoding)
+        print(
+            f"Queued {len(exporter.jobs)} files for {csv_folder_name} "
+            f"(snapshot took {time.perf_counter() - start:.1f}s)"
+        )
+
+    @property
+    def pending(self) -> int:
+        return sum(not f.done() for f in self._futures)
+
+    def flush(self) -> list[tuple[str, BaseException]]:
+        """wait for all the queued writes, returns the (description, error) of the failed ones"""
+        if self.pending:
+            print(f"\nWaiting for {self.pending} result writes to finish")
+        wait(self._futures)
+        errors = [
+            (description, f.exception())
+            for f, description in self._futures.items()
+            if f.exception() is not None
+        ]
+        self._futures = {}
+        if errors:
+            print("\nThe following result writes FAILED:")
+            for description, error in errors:
+                print(f" ❌ -- {description}: {error!r}")
+        return errors
+
+    def close(self) -> list[tuple[str, BaseException]]:
+        errors = self.flush()
+        self._pool.shutdown()
+        return errors
+
+
+@contextmanager
+def results_writer(background_export=True, max_workers=4):
+    """
+    Yields a BackgroundResultsWriter, or None when background_export is False.
+
+    On exit all writes are flushed. Failed writes raise a RuntimeError, unless the run itself
+    already failed, then the original exception is kept.
+    """
+    if not background_export:
+        yield None
+        return
+
+    writer = BackgroundResultsWriter(max_workers=max_workers)
+    try:
+        yield writer
+    except BaseException:
+        writer.close()
+        raise
+    errors = writer.close()
+    if errors:
+        raise RuntimeError(
+            f"{len(errors)} result files could not be written, first: {errors[0][0]}"
+        )
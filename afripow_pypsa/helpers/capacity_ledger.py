@@ -0,0 +1,122 @@
+"""
+Capacity ledger: the optimised capacities of every solved stage and year of a case.
+
+One row per component, name, year and stage with the 'nom_opt' (p_nom_opt, s_nom_opt or e_nom_opt).
+It is saved next to the years of the case as one small parquet file per stage and year
+
+    <case>/.capacity_ledger/Results_opt_2025.parquet
+
+so fix_n_minus_capacities does not have to import the whole previous year network.
+The ledger that was saved last for a case and stage is also kept in memory, so the next year
+in the same process does not even read the file.
+"""
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pypsa
+from pypsa.descriptors import nominal_attrs
+
+LEDGER_DIR_NAME = ".capacity_ledger"
+LEDGER_COLUMNS = [
+    "component",
+    "name",
+    "carrier",
+    "year",
+    "stage",
+    "attr",
+    "nom_opt",
+    "extendable",
+]
+
+# (case folder, stage) -> (year, parquet mtime_ns, ledger)
+_last_saved_ledgers = {}
+
+
+def case_and_stage_from_results_folder(results_folder_name: str | Path):
+    """'<case>/2025/Results_opt' -> ('<case>', 'Results_opt', '2025')"""
+    results_folder = Path(results_folder_name)
+    return results_folder.parent.parent, results_folder.name, results_folder.parent.name
+
+
+def capacity_ledger_file(case_folder: str | Path, stage: str, year) -> Path:
+    return Path(case_folder) / LEDGER_DIR_NAME / f"{stage}_{int(year)}.parquet"
+
+
+def capacity_ledger_from_network(network: pypsa.Network, year, stage) -> pd.DataFrame:
+    frames = []
+    for c, attr in nominal_attrs.items():
+        df = network.df(c)
+        if df.empty:
+            continue
+        nom_opt = df[attr + "_opt"] if attr + "_opt" in df.columns else df[attr]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "component": c,
+                    "name": df.index.values,
+                    "carrier": df["carrier"].values,
+                    "year": int(year),
+                    "stage": stage,
+                    "attr": attr,
+                    "nom_opt": nom_opt.values.astype(float),
+                    "extendable": df[attr + "_extendable"].values.astype(bool),
+                }
+            )
+        )
+    if not frames:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    ledger = pd.concat(frames, ignore_index=True)
+    for col in ["component", "stage", "attr"]:
+        ledger[col] = ledger[col].astype("category")
+    return ledger
+
+
+def write_capacity_ledger(
+    network: pypsa.Network, results_folder_name: str | Path, year
+) -> pd.DataFrame:
+    """save the ledger of a solved network, called from save_outputs"""
+    case_folder, stage, _ = case_and_stage_from_results_folder(results_folder_name)
+    ledger = capacity_ledger_from_network(network, year, stage)
+
+    ledger_file = capacity_ledger_file(case_folder, stage, year)
+    ledger_file.parent.mkdir(exist_ok=True)
+    tmp_file = ledger_file.with_suffix(f".{os.getpid()}.tmp")
+    ledger.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, ledger_file)
+
+    _last_saved_ledgers[(str(case_folder), stage)] = (
+        int(year),
+        ledger_file.stat().st_mtime_ns,
+        ledger,
+    )
+    print(f"Capacity ledger saved to {ledger_file}")
+    return ledger
+
+
+def read_capacity_ledger(case_folder: str | Path, stage: str, year):
+    """the ledger for a stage and year, or None if it was never saved"""
+    ledger_file = capacity_ledger_file(case_folder, stage, year)
+    if not ledger_file.exists():
+        return None
+
+    saved_year, saved_mtime, ledger = _last_saved_ledgers.get(
+        (str(case_folder), stage), (None, None, None)
+    )
+    # the in memory copy is only used if no other process rewrote the file since
+    if saved_year == int(year) and saved_mtime == ledger_file.stat().st_mtime_ns:
+        print(f"Using {stage} {year} capacities from memory")
+        return ledger
+
+    print(f"Reading capacity ledger {ledger_file}")
+    return pd.read_parquet(ledger_file)
+
+
+def read_case_capacity_ledger(case_folder: str | Path) -> pd.DataFrame:
+    """all the saved stages and years of a case in one table"""
+    ledger_dir = Path(case_folder) / LEDGER_DIR_NAME
+    files = sorted(ledger_dir.glob("*.parquet")) if ledger_dir.exists() else []
+    if not files:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
@@ -0,0 +1,181 @@
+"""
+Component summary: energy, load factor, costs and hours at maximum output per asset.
+
+This replaces the add_*_info functions that wrote 'total_energy__', 'ave_lf__', ... columns into
+the network tables (and so into every exported csv) and assumed 8760 hours. Here every component
+goes through the same NumPy kernel:
+
+    W  (periods x snapshots)   snapshot weightings, zero outside the period
+    P  (snapshots x assets)    output, positive = dispatch, negative = store
+
+    energy_dispatch = W @ max(P, 0)         energy_store = W @ min(P, 0)
+    hours           = W.sum(axis=1)         hours_at_max = W @ (P >= nom_opt * (1 - MAX_OUTPUT_TOL))
+
+and the result is one compact table, written as z_component_summary.csv in the results folder.
+
+Output per component: Generator p, Link and Line p0, Store p, StorageUnit p_dispatch - p_store.
+For a Store nom_opt is e_nom_opt, as in the old summary, so its load factors are per MWh stored.
+
+variable_cost_total keeps the old per-component rules (marginal_cost times):
+
+    Generator, Link    net energy (dispatch + store, i.e. the signed output)
+    StorageUnit        dispatch and store energy both counted positive
+    Store              dispatch energy only
+    Line               nothing, lines have no marginal cost
+"""
+
+import numpy as np
+import pandas as pd
+import pypsa
+from pypsa.descriptors import nominal_attrs
+
+SUMMARY_COMPONENTS = ["Generator", "Link", "Line", "StorageUnit", "Store"]
+SUMMARY_COLUMNS = [
+    "carrier",
+    "nom_opt",
+    "hours",
+    "energy",
+    "energy_dispatch",
+    "energy_store",
+    "load_factor",
+    "load_factor_store",
+    "hours_at_max",
+    "capital_cost_total",
+    "variable_cost_total",
+    "ave_cost",
+]
+MAX_OUTPUT_TOL = 1e-3
+# weight of the (negative) store energy in variable_cost_total, see the module docstring
+STORE_COST_SIGN = {"StorageUnit": -1.0, "Store": 0.0}
+
+
+def _output(network: pypsa.Network, c: str) -> pd.DataFrame:
+    pnl = network.pnl(c)
+    if c == "StorageUnit":
+        dispatch, store = pnl.get("p_dispatch"), pnl.get("p_store")
+        if dispatch is None or store is None:
+            return pnl.get("p")
+        return dispatch.sub(store, fill_value=0.0)
+    return pnl.get("p0") if c in network.branch_components else pnl.get("p")
+
+
+def _period_weights(network: pypsa.Network, c: str, snapshots: pd.Index):
+    """(period labels, W) with W periods x snapshots"""
+    if c == "Generator":
+        column = "generators"
+    elif c in ["StorageUnit", "Store"]:
+        column = "stores"
+    else:
+        column = "objective"
+    weights = network.snapshot_weightings[column].reindex(snapshots).to_numpy(float)
+
+    if isinstance(snapshots, pd.MultiIndex):
+        periods, codes = np.unique(snapshots.get_level_values(0), return_inverse=True)
+        in_period = codes[None, :] == np.arange(len(periods))[:, None]
+        return list(periods), in_period * weights[None, :]
+    return [None], weights[None, :]
+
+
+def _summary_kernel(P, W, nom_opt, capital_cost, marginal_cost, store_cost_sign=1.0):
+    """all the summary columns in one go, arrays are periods x assets"""
+    dispatch = np.clip(P, 0.0, None)
+    store = np.clip(P, None, 0.0)
+
+    hours = W.sum(axis=1)[:, None]
+    energy_dispatch = W @ dispatch
+    energy_store = W @ store
+    at_max = P >= nom_opt[None, :] * (1 - MAX_OUTPUT_TOL)
+    hours_at_max = W @ (at_max & (nom_opt[None, :] > 0))
+
+    # store_cost_sign 1: signed output, -1: store counted positive, 0: dispatch only
+    variable_cost = W @ ((dispatch + store_cost_sign * store) * marginal_cost)
+    capital = np.broadcast_to(capital_cost * nom_opt, energy_dispatch.shape)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        capacity_hours = nom_opt[None, :] * hours
+        load_factor = np.where(
+            capacity_hours > 0, energy_dispatch / capacity_hours, np.nan
+        )
+        load_factor_store = np.where(
+            capacity_hours > 0, -energy_store / capacity_hours, np.nan
+        )
+        ave_cost = np.where(
+            energy_dispatch > 0, (capital + variable_cost) / energy_dispatch, np.nan
+        )
+
+    return {
+        "hours": np.broadcast_to(hours, energy_dispatch.shape),
+        "energy": energy_dispatch + energy_store,
+        "energy_dispatch": energy_dispatch,
+        "energy_store": energy_store,
+        "load_factor": load_factor,
+        "load_factor_store": load_factor_store,
+        "hours_at_max": hours_at_max,
+        "capital_cost_total": capital,
+        "variable_cost_total": variable_cost,
+        "ave_cost": ave_cost,
+    }
+
+
+def component_summary(network: pypsa.Network, components=None) -> pd.DataFrame:
+    """
+    One row per asset (and investment period), index (period, component, name), or
+    (component, name) when the network has no investment periods. The network is not changed.
+    """
+    components = components or SUMMARY_COMPONENTS
+    frames = []
+    for c in components:
+        df = network.df(c)
+        P = _output(network, c)
+        if df.empty or P is None or P.empty:
+            continue
+
+        attr = nominal_attrs[c]
+        nom_opt = df[f"{attr}_opt"] if f"{attr}_opt" in df.columns else df[attr]
+        nom_opt = nom_opt.to_numpy(float)
+
+        P = P.reindex(columns=df.index, fill_value=0.0)
+        periods, W = _period_weights(network, c, P.index)
+        if "marginal_cost" in df.columns:
+            marginal_cost = network.get_switchable_as_dense(c, "marginal_cost")
+            marginal_cost = marginal_cost.reindex(
+                index=P.index, columns=df.index, fill_value=0.0
+            ).to_numpy(float)
+        else:
+            marginal_cost = np.zeros(P.shape)
+
+        columns = _summary_kernel(
+            P.to_numpy(float),
+            W,
+            nom_opt,
+            df["capital_cost"].to_numpy(float),
+            marginal_cost,
+            STORE_COST_SIGN.get(c, 1.0),
+        )
+
+        n_periods = len(periods)
+        frame = pd.DataFrame(
+            {name: values.ravel() for name, values in columns.items()},
+            index=pd.MultiIndex.from_product(
+                [periods, [c], df.index], names=["period", "component", "name"]
+            ),
+        )
+        frame.insert(0, "carrier", np.tile(df["carrier"].to_numpy(), n_periods))
+        frame.insert(1, "nom_opt", np.tile(nom_opt, n_periods))
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    summary = pd.concat(frames)[SUMMARY_COLUMNS]
+    if not isinstance(network.snapshots, pd.MultiIndex):
+        summary = summary.droplevel("period")
+    return summary
+
+
+def drop_legacy_summary_columns(network: pypsa.Network) -> None:
+    """remove the 'xxx__' columns that the old add_summaries wrote into results networks"""
+    for c in SUMMARY_COMPONENTS:
+        df = network.df(c)
+        legacy = [col for col in df.columns if str(col).endswith("__")]
+        if legacy:
+            df.drop(columns=legacy, inplace=True)
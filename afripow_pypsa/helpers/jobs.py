@@ -0,0 +1,235 @@
+"""
+Detached study jobs.
+
+A study used to run inside the Streamlit script thread, the session was frozen for hours and a
+browser refresh lost the run. start_job runs the study (cli.py) as its own process, detached from
+the Streamlit server, and keeps everything about it in a job folder of the study base directory:
+
+    <study base dir>/.jobs/<job id>/job.json    id, label, command, pid, status, created_at,
+                                                started_ts, finished_at, returncode, and the
+                                                case, stages and years once cli.py knows them
+    <study base dir>/.jobs/<job id>/job.log     stdout and stderr of the run
+
+so any session can list the jobs, follow one (job_progress, log_tail) and cancel it.
+
+status: 'starting', 'running', 'finished' (exit code 0), 'failed', 'cancelled', and 'lost' when
+the process is gone without writing its exit code (killed, machine restarted).
+Progress is read from the run manifests (helpers/run_manifest.py): every stage year recorded after
+the job started is 'running', 'ok' or how it ended, the others are 'waiting'.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from .run_manifest import read_run_manifest
+
+JOBS_DIR_NAME = ".jobs"
+JOB_FILE_NAME = "job.json"
+JOB_LOG_FILE_NAME = "job.log"
+ACTIVE_STATUSES = ["starting", "running"]
+
+
+def jobs_folder(base_dir: str | Path) -> Path:
+    return Path(base_dir) / JOBS_DIR_NAME
+
+
+def read_job(job_file: str | Path) -> dict:
+    with open(job_file, "r") as f:
+        return json.load(f)
+
+
+def update_job(job_file: str | Path, **fields) -> dict:
+    """set fields of a job file, written through a temporary file so readers never see half"""
+    job_file = Path(job_file)
+    job = read_job(job_file) if job_file.exists() else {}
+    job.update(fields)
+    tmp_file = job_file.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(job, f, indent=1, default=str)
+    os.replace(tmp_file, job_file)
+    return job
+
+
+def start_job(
+    base_dir: str | Path, script: str | Path, args: list[str], label: str
+) -> dict:
+    """
+    run 'python script --job-file <job.json> *args' detached from this process, returns the job.
+    The script updates the job file itself (status, pid, returncode), see cli.py.
+    """
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    job_dir = jobs_folder(base_dir) / job_id
+    job_dir.mkdir(parents=True)
+    job_file = job_dir / JOB_FILE_NAME
+    command = [sys.executable, "-u", str(script), "--job-file", str(job_file), *args]
+    update_job(
+        job_file,
+        id=job_id,
+        label=label,
+        command=command,
+        status="starting",
+        created_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+        started_ts=time.time(),
+    )
+
+    if sys.platform == "win32":
+        detach = {
+            "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP
+            | subprocess.CREATE_NO_WINDOW
+        }
+    else:
+        detach = {"start_new_session": True}
+    with open(job_dir / JOB_LOG_FILE_NAME, "w") as log:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            cwd=Path(script).parent,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+            **detach,
+        )
+    print(f"[ INFO ] - Started job {job_id}: {label}")
+    return update_job(job_file, pid=process.pid)
+
+
+def pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    if sys.platform == "win32":
+        try:
+            import win32api
+            import win32con
+            import win32process
+
+            handle = win32api.OpenProcess(
+                win32con.PROCESS_QUERY_LIMITED_INFORMATION, False, int(pid)
+            )
+            try:
+                return win32process.GetExitCodeProcess(handle) == 259  # STILL_ACTIVE
+            finally:
+                win32api.CloseHandle(handle)
+        except Exception:
+            return False
+    try:
+        # a job started from this process stays a zombie until it is reaped
+        if os.waitpid(int(pid), os.WNOHANG)[0] != 0:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def job_status(job: dict) -> str:
+    """the status of the job file, 'lost' when it says active but the process is gone"""
+    status = job.get("status", "starting")
+    if status in ACTIVE_STATUSES and not pid_alive(job.get("pid")):
+        # a job that is just starting has no pid yet
+        if status == "starting" and time.time() - job.get("started_ts", 0) < 30:
+            return status
+        return "lost"
+    return status
+
+
+def list_jobs(base_dir: str | Path) -> pd.DataFrame:
+    """all jobs of the study base directory, newest first"""
+    rows = []
+    folder = jobs_folder(base_dir)
+    for job_file in sorted(folder.glob(f"*/{JOB_FILE_NAME}"), reverse=True):
+        try:
+            job = read_job(job_file)
+        except (OSError, json.JSONDecodeError):
+            continue
+        end = job.get("finished_ts") or time.time()
+        rows.append(
+            {
+                "id": job.get("id", job_file.parent.name),
+                "label": job.get("label", ""),
+                "status": job_status(job),
+                "created_at": job.get("created_at", ""),
+                "duration_min": round((end - job.get("started_ts", end)) / 60, 1),
+                "returncode": job.get("returncode"),
+            }
+        )
+    return pd.DataFrame(
+        rows,
+        columns=["id", "label", "status", "created_at", "duration_min", "returncode"],
+    )
+
+
+def job_file(base_dir: str | Path, job_id: str) -> Path:
+    return jobs_folder(base_dir) / job_id / JOB_FILE_NAME
+
+
+def log_tail(base_dir: str | Path, job_id: str, lines=40, max_bytes=64_000) -> str:
+    """the last lines of the job log"""
+    log_file = jobs_folder(base_dir) / job_id / JOB_LOG_FILE_NAME
+    if not log_file.exists():
+        return ""
+    with open(log_file, "rb") as f:
+        f.seek(max(0, log_file.stat().st_size - max_bytes))
+        text = f.read().decode(errors="replace")
+    return "\n".join(text.splitlines()[-lines:])
+
+
+def job_progress(job: dict) -> pd.DataFrame:
+    """status of every stage and year of the job, from the run manifests of its case"""
+    rows = []
+    case = job.get("case")
+    if not case:
+        return pd.DataFrame(columns=["stage", "year", "status"])
+    for stage in job.get("stages", []):
+        manifest = read_run_manifest(case, stage)
+        for year in job.get("years", []):
+            entry = manifest["years"].get(str(year), {})
+            if entry.get("completed_ts", 0) >= job.get("started_ts", 0):
+                status = entry.get("status", "waiting")
+                if status not in ["ok", "running"]:
+                    status = f"{status} {entry.get('termination_condition', '')}"
+            elif job_status(job) in ACTIVE_STATUSES:
+                status = "waiting"
+            else:
+                status = "not run"
+            rows.append({"stage": stage, "year": year, "status": status.strip()})
+    return pd.DataFrame(rows, columns=["stage", "year", "status"])
+
+
+def cancel_job(base_dir: str | Path, job_id: str) -> dict:
+    """stop the job process and everything it started (the year worker processes)"""
+    path = job_file(base_dir, job_id)
+    job = read_job(path)
+    if job_status(job) not in ACTIVE_STATUSES:
+        return job
+    pid = int(job["pid"])
+    if sys.platform == "win32":
+        subprocess.run(
+            ["taskkill", "/PID", str(pid), "/T", "/F"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    else:
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    print(f"[ INFO ] - Cancelled job {job_id}")
+    return update_job(
+        path,
+        status="cancelled",
+        finished_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+        finished_ts=time.time(),
+    )
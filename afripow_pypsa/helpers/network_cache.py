@@ -0,0 +1,169 @@
+"""
+Binary (NetCDF) cache for networks that are stored as csv folders.
+
+The cache for e.g. '<case>/2025/Inputs' lives in '<case>/2025/.network_cache/Inputs.nc', with a
+manifest 'Inputs.json' that holds the size, mtime and sha1 of every csv file in the folder.
+
+    - size and mtime the same as in the manifest  -> the file is trusted without hashing
+    - mtime changed                                -> the file is hashed, same hash is still valid
+    - any file added, removed or with a new hash   -> the csv folder is loaded and the cache rebuilt
+
+Set NETWORK_CACHE_ENABLED = False to always load the csv files.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pypsa
+
+NETWORK_CACHE_ENABLED = True
+CACHE_DIR_NAME = ".network_cache"
+CACHE_VERSION = 2
+
+
+def network_cache_paths(csv_folder: str | Path) -> tuple[Path, Path]:
+    """returns the (netcdf_file, manifest_file) for a csv folder"""
+    csv_folder = Path(csv_folder)
+    cache_dir = csv_folder.parent / CACHE_DIR_NAME
+    return cache_dir / f"{csv_folder.name}.nc", cache_dir / f"{csv_folder.name}.json"
+
+
+def file_sha1(file_path: str | Path, chunk_size=1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def csv_folder_fingerprint(csv_folder: str | Path, known_files: dict = None) -> dict:
+    """
+    {filename: {"size": int, "mtime_ns": int, "sha1": str}} for every csv in the folder.
+
+    known_files is a previous fingerprint, files with the same size and mtime are not hashed again.
+    """
+    known_files = known_files or {}
+    fingerprint = {}
+    with os.scandir(csv_folder) as entries:
+        for entry in entries:
+            if not (entry.is_file() and entry.name.endswith(".csv")):
+                continue
+            stat = entry.stat()
+            known = known_files.get(entry.name, {})
+            if (
+                known.get("size") == stat.st_size
+                and known.get("mtime_ns") == stat.st_mtime_ns
+            ):
+                sha1 = known["sha1"]
+            else:
+                sha1 = file_sha1(entry.path)
+            fingerprint[entry.name] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha1": sha1,
+            }
+    return fingerprint
+
+
+def fingerprint_key(fingerprint: dict) -> str:
+    """the cache key only depends on the file names, sizes and content"""
+    h = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for name in sorted(fingerprint):
+        h.update(
+            f"{name}:{fingerprint[name]['size']}:{fingerprint[name]['sha1']};".encode()
+        )
+    return h.hexdigest()
+
+
+def _read_manifest(manifest_file: Path) -> dict:
+    try:
+        with open(manifest_file, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_manifest(manifest_file: Path, key: str, fingerprint: dict) -> None:
+    tmp_file = manifest_file.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump({"key": key, "files": fingerprint}, f, indent=1)
+    os.replace(tmp_file, manifest_file)
+
+
+def _restore_missing_strings(network: pypsa.Network) -> None:
+    """
+    NetCDF stores NaN in text columns as '', the csv import gives NaN. Put the NaN back.
+
+    Only in the extra columns of the inputs: the standard PyPSA string attributes (type, carrier,
+    bus0, ...) default to '' on a csv import too, and pypsa relies on that (e.g. lines.type != "").
+    """
+    for component in network.all_components:
+        df = network.df(component)
+        standard_attrs = network.components[component]["attrs"].index
+        for col in df.columns[df.dtypes == object]:
+            if col in standard_attrs:
+                continue
+            empty = df[col] == ""
+            if empty.any():
+                df.loc[empty, col] = np.nan
+
+
+def write_network_cache(
+    network: pypsa.Network, csv_folder: str | Path, fingerprint: dict = None
+) -> None:
+    """(re)write the cache of a csv folder, failures are reported and otherwise ignored"""
+    netcdf_file, manifest_file = network_cache_paths(csv_folder)
+    try:
+        fingerprint = fingerprint or csv_folder_fingerprint(csv_folder)
+        netcdf_file.parent.mkdir(exist_ok=True)
+        tmp_file = netcdf_file.with_suffix(f".{os.getpid()}.tmp")
+        network.export_to_netcdf(tmp_file)
+        os.replace(tmp_file, netcdf_file)
+        _write_manifest(manifest_file, fingerprint_key(fingerprint), fingerprint)
+        print(f"[ INFO ] - Network cache written to {netcdf_file}")
+    except Exception as e:
+        print(f"[ WARNING ] - Could not write network cache {netcdf_file}. {e}")
+
+
+def load_network_cached(csv_folder_name: str | Path) -> pypsa.Network:
+    """
+    Drop in for pypsa.Network().import_from_csv_folder(csv_folder_name) that uses the NetCDF cache
+    when it is valid, and otherwise loads the csv files and rebuilds the cache.
+    """
+    csv_folder = Path(csv_folder_name)
+    network = pypsa.Network()
+
+    if not NETWORK_CACHE_ENABLED or not csv_folder.is_dir():
+        network.import_from_csv_folder(csv_folder)
+        return network
+
+    netcdf_file, manifest_file = network_cache_paths(csv_folder)
+    manifest = _read_manifest(manifest_file)
+    known_files = manifest.get("files", {})
+    fingerprint = csv_folder_fingerprint(csv_folder, known_files)
+    key = fingerprint_key(fingerprint)
+
+    if manifest.get("key") == key and netcdf_file.exists():
+        try:
+            network.import_from_netcdf(netcdf_file)
+            _restore_missing_strings(network)
+            if fingerprint != known_files:
+                # only the mtimes changed, save them so the files are not hashed next time
+                _write_manifest(manifest_file, key, fingerprint)
+            print(f"[ INFO ] - Network loaded from cache {netcdf_file}")
+            return network
+        except Exception as e:
+            print(
+                f"[ WARNING ] - Network cache {netcdf_file} could not be read, loading csv. {e}"
+            )
+            network = pypsa.Network()
+
+    network.import_from_csv_folder(csv_folder)
+
+    # do not cache a folder that changed while it was being read
+    if csv_folder_fingerprint(csv_folder, fingerprint) == fingerprint:
+        write_network_cache(network, csv_folder, fingerprint)
+    return network
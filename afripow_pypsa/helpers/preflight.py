@@ -0,0 +1,263 @@
+"""
+Pre-flight checks of every selected year before the first solve.
+
+A long run used to stop in a late year on a missing reserves.csv, a 'link_relationship' that names
+a link that does not exist, or a locked results csv (get_scenarios_paths then waits on input()).
+preflight_checks reads only the csv files of the inputs folders, for all years at the same time in a
+thread pool, and returns every problem found as one table:
+
+    year, folder, file, check, message
+
+Checks:
+    files       the inputs folder, links.csv and reserves.csv exist (and inc_load.csv, loads.csv for
+                the incremental demand stage)
+    columns     reserves.csv has 'value_mw', links.csv has 'reserve_area', inc_load.csv has
+                'inc_load' and 'value_mw', and the hydro coefficients are there when 'flow_link' and
+                'store_eff' are used
+    references  link_relationship, flow_link (links.csv), store_eff (stores.csv), su_link_mw
+                (storage_units.csv) and inc_load (loads-p_set.csv) name existing components
+    reserves    every reserves.csv requirement above 0 has a link with a nonzero factor in its area,
+                else the study is infeasible (add_sparse_spinning_reserves raises)
+    writable    the results folder can be created and none of its csv files are locked
+
+Only file contents are read, nothing is built or solved and nothing is written.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+PREFLIGHT_COLUMNS = ["year", "folder", "file", "check", "message"]
+
+
+class PreflightError(ValueError):
+    """the pre-flight check found problems, nothing was solved (toolbox.run_preflight)"""
+
+
+# results stage -> extra files its inputs folder needs
+STAGE_REQUIRED_FILES = {
+    "Results_opti": ["inc_load.csv", "loads.csv"],
+}
+REQUIRED_FILES = ["links.csv", "reserves.csv"]
+REQUIRED_COLUMNS = {
+    "reserves.csv": ["value_mw"],
+    "links.csv": ["reserve_area"],
+    "inc_load.csv": ["inc_load", "value_mw"],
+}
+HYDRO_COLUMNS = ["store_coefficient", "flow_coefficient", "store_constant"]
+
+
+def _is_set(values: pd.Series) -> pd.Series:
+    """the entries that name a component, as the custom constraints read them"""
+    return values.apply(lambda x: isinstance(x, str) and len(x) > 0 and x != "0")
+
+
+def _read(folder: Path, file_name: str, add, **kwargs):
+    path = folder / file_name
+    if not path.exists():
+        return None
+    try:
+        return pd.read_csv(path, **kwargs)
+    except Exception as e:
+        add(file_name, "files", f"can not be read: {e!r}")
+        return None
+
+
+def _component_names(folder: Path, file_name: str) -> pd.Index:
+    """the names (first column) of a component csv, empty when there is no such file"""
+    path = folder / file_name
+    if not path.exists():
+        return pd.Index([])
+    return pd.read_csv(path, index_col=0, usecols=[0]).index.astype(str)
+
+
+def _results_folder_problems(results_folder: Path) -> list[str]:
+    if not results_folder.exists():
+        parent = results_folder.parent
+        while not parent.exists() and parent != parent.parent:
+            parent = parent.parent
+        if not os.access(parent, os.W_OK):
+            return [f"can not be created, {parent} is not writable"]
+        return []
+    messages = []
+    for entry in os.scandir(results_folder):
+        if entry.is_file() and entry.name.endswith(".csv"):
+            try:
+                with open(entry.path, "a"):
+                    pass
+            except PermissionError:
+                messages.append(f"{entry.name} is locked (open in Excel?)")
+    return messages
+
+
+def _reserve_problems(links: pd.DataFrame, reserves: pd.DataFrame) -> list[str]:
+    """
+    the reserves.csv requirements no link can meet, level and area as add_all_reserve_constraints.
+    A blank factor counts as contributing: the link gives reserves without the p_nom * factor
+    limit, as in the reserve formulations (pypsa_toolbox/reserves.py).
+    """
+    if "reserve_area" not in links.columns or "value_mw" not in reserves.columns:
+        return []
+    areas = links["reserve_area"].dropna().astype(str)
+    areas = [area for area in areas.unique() if "reserve_area" in area]
+    levels = [column for column in links.columns if "reserve_level_" in column]
+    messages = []
+    for level in levels:
+        for area in areas:
+            level_area = f"{level}_{area}"
+            if level_area not in reserves.index:
+                continue
+            need = pd.to_numeric(reserves.at[level_area, "value_mw"], errors="coerce")
+            factor = pd.to_numeric(
+                links.loc[links["reserve_area"].astype(str) == area, level],
+                errors="coerce",
+            )
+            if need > 0 and not (factor != 0).any():
+                messages.append(
+                    f"{level_area} needs {need} MW but no link in {area} has a nonzero {level}"
+                )
+    return messages
+
+
+def check_year(
+    inputs_folder_name: str | Path, results_folder_name: str | Path, year
+) -> list[dict]:
+    """all the problems of one year, see the module docstring"""
+    inputs_folder = Path(inputs_folder_name)
+    results_folder = Path(results_folder_name)
+    problems = []
+
+    def add(file_name, check, message, folder=inputs_folder):
+        problems.append(
+            {
+                "year": year,
+                "folder": str(folder),
+                "file": file_name,
+                "check": check,
+                "message": message,
+            }
+        )
+
+    for message in _results_folder_problems(results_folder):
+        add("", "writable", message, folder=results_folder)
+
+    if not inputs_folder.is_dir():
+        add("", "files", "inputs folder does not exist")
+        return problems
+
+    required = REQUIRED_FILES + STAGE_REQUIRED_FILES.get(results_folder.name, [])
+    for file_name in required:
+        if not (inputs_folder / file_name).exists():
+            add(file_name, "files", "missing")
+
+    for file_name, columns in REQUIRED_COLUMNS.items():
+        if file_name not in required or not (inputs_folder / file_name).exists():
+            continue
+        header = _read(inputs_folder, file_name, add, nrows=0)
+        if header is None:
+            continue
+        for column in columns:
+            if column not in header.columns:
+                add(file_name, "columns", f"column '{column}' missing")
+
+    links = _read(inputs_folder, "links.csv", add, index_col=0)
+    if links is not None:
+        links.index = links.index.astype(str)
+        link_names = links.index
+
+        if "link_relationship" in links.columns:
+            relationship = links["link_relationship"]
+            relationship = relationship[_is_set(relationship)]
+            for link, other in relationship[~relationship.isin(link_names)].items():
+                add(
+                    "links.csv",
+                    "references",
+                    f"link_relationship of {link} names unknown link '{other}'",
+                )
+
+        if "flow_link" in links.columns and "store_eff" in links.columns:
+            turbines = links[_is_set(links["flow_link"]) & _is_set(links["store_eff"])]
+            for column in HYDRO_COLUMNS:
+                if not turbines.empty and column not in links.columns:
+                    add("links.csv", "columns", f"column '{column}' missing")
+            for link, other in turbines["flow_link"][
+                ~turbines["flow_link"].isin(link_names)
+            ].items():
+                add(
+                    "links.csv",
+                    "references",
+                    f"flow_link of {link} names unknown link '{other}'",
+                )
+            store_names = _component_names(inputs_folder, "stores.csv")
+            for link, other in turbines["store_eff"][
+                ~turbines["store_eff"].isin(store_names)
+            ].items():
+                add(
+                    "links.csv",
+                    "references",
+                    f"store_eff of {link} names unknown store '{other}'",
+                )
+
+        reserves = _read(inputs_folder, "reserves.csv", add, index_col=0)
+        if reserves is not None:
+            for message in _reserve_problems(links, reserves):
+                add("reserves.csv", "reserves", message)
+
+        storage_units = _read(inputs_folder, "storage_units.csv", add, index_col=0)
+        if storage_units is not None and "su_link_mw" in storage_units.columns:
+            su_link = storage_units["su_link_mw"]
+            su_link = su_link[_is_set(su_link)]
+            for storage_unit, link in su_link[~su_link.isin(link_names)].items():
+                add(
+                    "storage_units.csv",
+                    "references",
+                    f"su_link_mw of {storage_unit} names unknown link '{link}'",
+                )
+
+    if "inc_load.csv" in required and (inputs_folder / "inc_load.csv").exists():
+        inc_load = _read(inputs_folder, "inc_load.csv", add)
+        p_set = _read(inputs_folder, "loads-p_set.csv", add, nrows=0)
+        if inc_load is not None and "inc_load" in inc_load.columns:
+            time_varying = p_set.columns if p_set is not None else pd.Index([])
+            for load in inc_load["inc_load"].astype(str):
+                if load not in time_varying:
+                    add(
+                        "inc_load.csv",
+                        "references",
+                        f"load '{load}' has no column in loads-p_set.csv",
+                    )
+
+    return problems
+
+
+def preflight_checks(year_paths: dict, max_workers=8) -> pd.DataFrame:
+    """
+    year_paths: {year: (inputs_folder_name, results_folder_name)}. Checks all years at the same
+    time and returns every problem, an empty table when all years are fine.
+    """
+    if not year_paths:
+        return pd.DataFrame(columns=PREFLIGHT_COLUMNS)
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(year_paths)))
+    ) as pool:
+        futures = {
+            year: pool.submit(check_year, inputs, results, year)
+            for year, (inputs, results) in year_paths.items()
+        }
+    problems = []
+    for year, future in futures.items():
+        try:
+            problems.extend(future.result())
+        except Exception as e:
+            problems.append(
+                {
+                    "year": year,
+                    "folder": str(year_paths[year][0]),
+                    "file": "",
+                    "check": "error",
+                    "message": repr(e),
+                }
+            )
+    return pd.DataFrame(problems, columns=PREFLIGHT_COLUMNS)
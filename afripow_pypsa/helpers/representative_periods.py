@@ -0,0 +1,130 @@
+"""
+Representative periods for screening runs.
+
+The snapshots are cut in blocks of 'period_hours' (24 for days, 168 for weeks). Every block is
+described by the load, availability (p_max_pu) and inflow profiles in it, and the blocks are
+clustered with k-means. Of every cluster the block closest to the centre (the medoid) is kept,
+and its snapshot weightings are multiplied by the number of blocks in the cluster, so the total
+weight of the year stays the same.
+
+Kept blocks are real days/weeks of the inputs, so all the custom constraints see consistent
+time series. The state of charge of stores and storage units is not linked between the kept
+blocks: use screening results for capacities, not for storage operation.
+"""
+
+import numpy as np
+import pandas as pd
+import pypsa
+
+# (component, time varying attribute) that describe a block
+CLUSTER_ATTRIBUTES = [
+    ("Load", "p_set"),
+    ("Generator", "p_max_pu"),
+    ("Link", "p_max_pu"),
+    ("StorageUnit", "inflow"),
+]
+
+
+def _block_features(network: pypsa.Network, period_hours: int) -> np.ndarray:
+    """n_blocks x features, every profile scaled to its maximum"""
+    n_blocks = len(network.snapshots) // period_hours
+    n_used = n_blocks * period_hours
+    features = []
+    for c, attr in CLUSTER_ATTRIBUTES:
+        df = network.pnl(c).get(attr)
+        if df is None or df.empty:
+            continue
+        values = df.to_numpy(dtype=float)[:n_used]
+        scale = np.abs(values).max(axis=0)
+        values = np.divide(values, scale, out=np.zeros_like(values), where=scale > 0)
+        features.append(values.reshape(n_blocks, -1))
+    if not features:
+        raise ValueError("The network has no time varying profiles to cluster on")
+    return np.hstack(features)
+
+
+def _kmeans(features: np.ndarray, n_clusters: int, iterations=100, seed=0):
+    """plain Lloyd k-means with a k-means++ start, returns the cluster of every row"""
+    rng = np.random.default_rng(seed)
+    n = len(features)
+    centres = [features[rng.integers(n)]]
+    for _ in range(1, n_clusters):
+        distance = np.min([((features - c) ** 2).sum(axis=1) for c in centres], axis=0)
+        total = distance.sum()
+        p = distance / total if total > 0 else None
+        centres.append(features[rng.choice(n, p=p)])
+    centres = np.array(centres)
+
+    labels = np.zeros(n, dtype=int)
+    for i in range(iterations):
+        distance = (centres**2).sum(axis=1)[None, :] - 2 * features @ centres.T
+        new_labels = distance.argmin(axis=1)
+        if i > 0 and (new_labels == labels).all():
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            members = features[labels == k]
+            if len(members):
+                centres[k] = members.mean(axis=0)
+    return labels, centres
+
+
+def select_representative_periods(
+    network: pypsa.Network, period_hours=24, n_periods=12, seed=0
+) -> pd.DataFrame:
+    """
+    cluster the blocks of the network, returns one row per kept block with its first snapshot
+    position ('start'), the number of blocks it represents ('weight') and its cluster
+    """
+    features = _block_features(network, period_hours)
+    n_periods = max(1, min(int(n_periods), len(features)))
+    labels, centres = _kmeans(features, n_periods, seed=seed)
+
+    rows = []
+    for k in range(n_periods):
+        members = np.flatnonzero(labels == k)
+        if not len(members):
+            continue
+        distance = ((features[members] - centres[k]) ** 2).sum(axis=1)
+        medoid = members[distance.argmin()]
+        rows.append(
+            {
+                "cluster": k,
+                "block": medoid,
+                "start": medoid * period_hours,
+                "weight": len(members),
+            }
+        )
+    return pd.DataFrame(rows).sort_values("block").reset_index(drop=True)
+
+
+def reduce_to_representative_periods(
+    network: pypsa.Network, period_hours=24, n_periods=12, seed=0
+) -> pd.DataFrame:
+    """
+    keep only the snapshots of the representative blocks and scale their snapshot_weightings,
+    in place. Returns the selected blocks.
+    """
+    snapshots = network.snapshots
+    weightings = network.snapshot_weightings.copy()
+    selection = select_representative_periods(network, period_hours, n_periods, seed)
+
+    positions = np.concatenate(
+        [np.arange(start, start + period_hours) for start in selection["start"]]
+    )
+    multiplier = np.repeat(selection["weight"].to_numpy(float), period_hours)
+    kept = snapshots[positions]
+
+    # the snapshots after the last full block are spread over the kept ones
+    total_before = weightings.sum()
+    new_weightings = weightings.iloc[positions].mul(multiplier, axis=0)
+    new_weightings = new_weightings * (total_before / new_weightings.sum())
+
+    network.set_snapshots(kept)
+    network.snapshot_weightings.loc[kept, :] = new_weightings.to_numpy()
+
+    print(
+        f"[ INFO ] - Screening: {len(snapshots)} snapshots reduced to {len(kept)} "
+        f"({len(selection)} representative blocks of {period_hours}h)"
+    )
+    return selection
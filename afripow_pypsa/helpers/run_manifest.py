@@ -0,0 +1,231 @@
+"""
+Run manifest: which years of a stage are solved, from which inputs, and how the solve ended.
+
+One json file per case and stage, '<case>/run_manifest_Results_opt.json':
+
+    {"stage": "Results_opt",
+     "years": {"2025": {"status": "ok", "termination_condition": "optimal",
+                        "completed_at": "...", "inputs_key": "<sha1>", "inputs_files": {...}}}}
+
+inputs_files is the csv fingerprint of the year's inputs folder (helpers/network_cache.py), so
+checking a year again only hashes the files whose size or mtime changed. Once the results are
+written 'outputs_key' / 'outputs_files' fingerprint the results folder the same way.
+
+A year is current when its last solve was 'ok', its results were confirmed written (it has an
+outputs_key), its results folder still has network.csv and its capacity ledger, and the inputs
+folder has the same content as when it was solved. With the background writer the csv files can
+still be queued when the solve is recorded 'ok', so a run killed before the writer finished, or a
+failed write, leaves the year unconfirmed and it runs again.
+
+resume_years returns the years that have to run again; for a chained stage (optimum expansion,
+where year N starts from the capacities of year N-1) everything from the first year that is not
+current, and a year is also out of date when the year before it was solved again after it.
+
+stale_outputs follows the stages (Inputs -> Results_uc -> Results_opt -> Results_opti) and lists
+every solved stage and year that is out of date, so an edit to one year's Inputs only marks that
+year downstream, and for optimum expansion the later years as well.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .capacity_ledger import capacity_ledger_file
+from .network_cache import csv_folder_fingerprint, fingerprint_key
+
+# results stage -> the folder it reads its inputs from, in the order the stages run
+STAGE_INPUTS = {
+    "Results_uc": "Inputs",
+    "Results_opt": "Results_uc",
+    "Results_opti": "Results_opt",
+}
+# year N starts from the capacities of year N-1, see fix_n_minus_capacities
+CHAINED_STAGES = ["Results_opt"]
+
+
+def run_manifest_file(case_folder: str | Path, stage: str) -> Path:
+    return Path(case_folder) / f"run_manifest_{stage}.json"
+
+
+def read_run_manifest(case_folder: str | Path, stage: str) -> dict:
+    try:
+        with open(run_manifest_file(case_folder, stage), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"stage": stage, "years": {}}
+
+
+def record_year(
+    case_folder: str | Path,
+    stage: str,
+    year,
+    inputs_folder_name: str | Path,
+    status: str,
+    condition: str,
+) -> None:
+    """record a solved year, the inputs are fingerprinted as they are now"""
+    manifest = read_run_manifest(case_folder, stage)
+    known_files = manifest["years"].get(str(year), {}).get("inputs_files", {})
+    fingerprint = csv_folder_fingerprint(inputs_folder_name, known_files)
+    manifest["years"][str(year)] = {
+        "status": status,
+        "termination_condition": condition,
+        "completed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "completed_ts": time.time(),
+        "inputs_key": fingerprint_key(fingerprint),
+        "inputs_files": fingerprint,
+    }
+
+    _write_run_manifest(case_folder, stage, manifest)
+
+
+def _write_run_manifest(case_folder: str | Path, stage: str, manifest: dict) -> None:
+    manifest_file = run_manifest_file(case_folder, stage)
+    tmp_file = manifest_file.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_file, manifest_file)
+
+
+def record_outputs(case_folder: str | Path, stage: str, years: list) -> None:
+    """
+    fingerprint the results folders of the solved years, called once the results are written
+    (after the background writer is done), so later edits to the outputs can be found
+    """
+    manifest = read_run_manifest(case_folder, stage)
+    for year in years:
+        entry = manifest["years"].get(str(year))
+        results_folder = Path(case_folder) / str(year) / stage
+        if entry is None or entry.get("status") != "ok" or not results_folder.is_dir():
+            continue
+        fingerprint = csv_folder_fingerprint(
+            results_folder, entry.get("outputs_files", {})
+        )
+        entry["outputs_key"] = fingerprint_key(fingerprint)
+        entry["outputs_files"] = fingerprint
+    _write_run_manifest(case_folder, stage, manifest)
+
+
+def year_state(
+    manifest: dict, case_folder: str | Path, stage: str, year, child_inputs_folder: str
+) -> str:
+    """'current' or the reason the year has to run again"""
+    entry = manifest["years"].get(str(year))
+    if entry is None:
+        return "not solved"
+    if entry.get("status") == "running":
+        return "last solve did not finish"
+    if entry.get("status") != "ok":
+        return f"last solve ended {entry.get('status')} {entry.get('termination_condition')}"
+
+    results_folder = Path(case_folder) / str(year) / stage
+    if not (results_folder / "network.csv").exists():
+        return "results missing"
+    if not capacity_ledger_file(case_folder, stage, year).exists():
+        return "capacity ledger missing"
+    if "outputs_key" not in entry:
+        return "results not confirmed"
+    outputs = csv_folder_fingerprint(results_folder, entry.get("outputs_files", {}))
+    if fingerprint_key(outputs) != entry["outputs_key"]:
+        return "results changed after the solve"
+
+    inputs_folder = results_folder.parent / child_inputs_folder
+    if not inputs_folder.is_dir():
+        return "inputs folder missing"
+    fingerprint = csv_folder_fingerprint(inputs_folder, entry.get("inputs_files", {}))
+    if fingerprint_key(fingerprint) != entry.get("inputs_key"):
+        return "inputs changed"
+    return "current"
+
+
+def resume_years(
+    case_folder: str | Path,
+    stage: str,
+    years: list,
+    child_inputs_folder: str,
+    chained=False,
+) -> list:
+    """the years of 'years' that have to run, see the module docstring"""
+    manifest = read_run_manifest(case_folder, stage)
+
+    print(f"\nResume {stage}")
+    print("---------------------------")
+    to_run = []
+    for year in years:
+        state = year_state(manifest, case_folder, stage, year, child_inputs_folder)
+        if (
+            chained
+            and state == "current"
+            and _previous_year_solved_later(manifest, year)
+        ):
+            state = "previous year solved again"
+        if chained and to_run:
+            print(f"{year}: {state}, runs again after {to_run[0]}")
+            to_run.append(year)
+            continue
+        print(f"{year}: {state}")
+        if state != "current":
+            to_run.append(year)
+    if not to_run:
+        print("All years are current, nothing to run")
+    print("---------------------------\n")
+    return to_run
+
+
+def _previous_year_solved_later(manifest: dict, year) -> bool:
+    previous = manifest["years"].get(str(int(year) - 1), {})
+    current = manifest["years"].get(str(year), {})
+    return previous.get("completed_ts", 0) > current.get("completed_ts", 0)
+
+
+def case_years(case_folder: str | Path) -> list[int]:
+    return sorted(
+        int(d.name)
+        for d in Path(case_folder).iterdir()
+        if d.is_dir() and d.name.isdigit()
+    )
+
+
+def stale_outputs(case_folder: str | Path, years: list = None) -> pd.DataFrame:
+    """
+    the stage and year outputs of a case that are out of date, with the reason.
+
+    A solved output is stale when its own inputs or results changed (see year_state), when the
+    stage it reads from is stale for the same year, and for a chained stage when the year before
+    it is stale or was solved again after it. Years that were never solved are not outputs and are
+    not listed.
+    """
+    years = sorted(int(y) for y in years) if years else case_years(case_folder)
+    stale = {}
+    for stage, inputs_folder in STAGE_INPUTS.items():
+        manifest = read_run_manifest(case_folder, stage)
+        for year in years:
+            entry = manifest["years"].get(str(year))
+            results_folder = Path(case_folder) / str(year) / stage
+            if entry is None and not (results_folder / "network.csv").exists():
+                continue
+
+            if (inputs_folder, year) in stale:
+                reason = f"{inputs_folder} {year} is stale"
+            elif stage in CHAINED_STAGES and (stage, year - 1) in stale:
+                reason = f"{stage} {year - 1} is stale"
+            elif entry is None:
+                reason = "solved before run manifests were kept"
+            else:
+                reason = year_state(manifest, case_folder, stage, year, inputs_folder)
+                if (
+                    reason == "current"
+                    and stage in CHAINED_STAGES
+                    and _previous_year_solved_later(manifest, year)
+                ):
+                    reason = "previous year solved again"
+            if reason != "current":
+                stale[(stage, year)] = reason
+
+    return pd.DataFrame(
+        [(stage, year, reason) for (stage, year), reason in stale.items()],
+        columns=["stage", "year", "reason"],
+    )
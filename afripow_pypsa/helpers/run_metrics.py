@@ -0,0 +1,97 @@
+"""
+Run metrics: one row per solved stage and year, appended to '<case>/run_metrics.csv'.
+
+Years solved at the same time in the process pool, and the cases of a batch (which all write the
+solver history of their study base directory, see solver_log.py), append to the same files from
+different processes. append_csv_row holds '<file>.lock' while it writes: the lock file is created
+exclusively (works on Windows and Linux), a writer that finds it waits, and a lock older than
+LOCK_STALE_S (its writer died) is removed.
+"""
+
+import csv
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+RUN_METRICS_FILE_NAME = "run_metrics.csv"
+# a write holds the lock for milliseconds
+LOCK_STALE_S = 60
+LOCK_TIMEOUT_S = 300
+
+
+def run_metrics_file(case_folder: str | Path) -> Path:
+    return Path(case_folder) / RUN_METRICS_FILE_NAME
+
+
+def read_run_metrics(case_folder: str | Path) -> pd.DataFrame:
+    metrics_file = run_metrics_file(case_folder)
+    if not metrics_file.exists():
+        return pd.DataFrame()
+    return pd.read_csv(metrics_file)
+
+
+def append_run_metrics(case_folder: str | Path, row: dict) -> None:
+    append_csv_row(run_metrics_file(case_folder), row)
+
+
+@contextmanager
+def file_lock(path: str | Path, timeout=LOCK_TIMEOUT_S):
+    """hold '<path>.lock' for the block, between processes, see the module docstring"""
+    lock_file = Path(f"{path}.lock")
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_file.stat().st_mtime > LOCK_STALE_S:
+                    lock_file.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{lock_file} is held for more than {timeout}s")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            lock_file.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def append_csv_row(metrics_file: str | Path, row: dict) -> None:
+    """
+    append a row, new columns of later versions are added by rewriting the file once. Safe for
+    several processes, see the module docstring
+    """
+    metrics_file = Path(metrics_file)
+    row = {"recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), **row}
+    with file_lock(metrics_file):
+        _append_csv_row(metrics_file, row)
+
+
+def _append_csv_row(metrics_file: Path, row: dict) -> None:
+    if metrics_file.exists():
+        with open(metrics_file, "r", newline="") as f:
+            header = next(csv.reader(f), [])
+        if set(row) - set(header):
+            metrics = pd.concat([pd.read_csv(metrics_file), pd.DataFrame([row])])
+            tmp_file = metrics_file.with_suffix(f".{os.getpid()}.tmp")
+            metrics.to_csv(tmp_file, index=False)
+            os.replace(tmp_file, metrics_file)
+            return
+    else:
+        header = list(row)
+        with open(metrics_file, "w", newline="") as f:
+            csv.writer(f).writerow(header)
+
+    with open(metrics_file, "a", newline="") as f:
+        csv.DictWriter(f, fieldnames=header).writerow(row)
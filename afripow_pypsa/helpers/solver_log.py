@@ -0,0 +1,158 @@
+"""
+Solver log capture and parsing.
+
+Every solve writes the CPLEX log to '<case>/<year>/<stage>/solver.log' (linopy's log_fn, CPLEX then
+no longer prints to the terminal). After the solve the log is parsed into:
+
+    presolve_rows_removed, presolve_cols_removed   summed over the 'LP Presolve eliminated' lines
+    reduced_rows, reduced_cols, reduced_nonzeros   size of the LP after presolve
+    presolve_time_s
+    log_barrier_iterations                         last row of the barrier iteration log
+    time_to_first_solution_s                       'Barrier time' (the first optimal point, before
+                                                   crossover), or the solution time for simplex
+    crossover                                      primal, dual, off or none
+    crossover_time_s
+    log_solution_time_s, log_iterations
+    log_status, log_objective                      the final '<method> - <status>: Objective =' line
+
+and appended with the case, stage, year and software versions to the run history
+'<study base dir>/solver_history.csv', shared by all cases of the study folder (the writes hold a
+lock file, see run_metrics.py).
+"""
+
+import re
+from pathlib import Path
+
+import numpy as np
+
+from .run_metrics import append_csv_row
+
+SOLVER_LOG_FILE_NAME = "solver.log"
+SOLVER_HISTORY_FILE_NAME = "solver_history.csv"
+
+_NUMBER = r"([-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)"
+_PATTERNS = {
+    "presolve_eliminated": re.compile(
+        r"LP Presolve eliminated (\d+) rows and (\d+) columns"
+    ),
+    "reduced": re.compile(
+        r"Reduced LP has (\d+) rows, (\d+) columns, and (\d+) nonzeros"
+    ),
+    "presolve_time": re.compile(rf"Presolve time\s*=\s*{_NUMBER} sec"),
+    "barrier_iteration": re.compile(rf"^\s*(\d+)\s+{_NUMBER}\s+{_NUMBER}\s"),
+    "barrier_time": re.compile(rf"Barrier time\s*=\s*{_NUMBER} sec"),
+    "crossover": re.compile(r"^(Primal|Dual) crossover\."),
+    "crossover_time": re.compile(rf"Total crossover time\s*=\s*{_NUMBER} sec"),
+    "solution_time": re.compile(
+        rf"Solution time\s*=\s*{_NUMBER} sec\.(?:\s+Iterations\s*=\s*(\d+))?"
+    ),
+    "status": re.compile(
+        rf"^((?:Barrier|Primal simplex|Dual simplex|Network|Sifting|Concurrent)[^-]*?)"
+        rf" - ([^:]+?)(?::\s+Objective =\s+{_NUMBER})?\s*$"
+    ),
+}
+
+
+def solver_log_file(results_folder_name: str | Path) -> Path:
+    return Path(results_folder_name) / SOLVER_LOG_FILE_NAME
+
+
+def solver_history_file(case_folder: str | Path) -> Path:
+    """the run history is kept next to the cases, in the study base directory"""
+    return Path(case_folder).parent / SOLVER_HISTORY_FILE_NAME
+
+
+def parse_cplex_log(log_file: str | Path) -> dict:
+    """the structured metrics of a CPLEX log, see the module docstring. nan when not in the log"""
+    metrics = {
+        "presolve_rows_removed": 0,
+        "presolve_cols_removed": 0,
+        "reduced_rows": np.nan,
+        "reduced_cols": np.nan,
+        "reduced_nonzeros": np.nan,
+        "presolve_time_s": np.nan,
+        "log_barrier_iterations": np.nan,
+        "time_to_first_solution_s": np.nan,
+        "crossover": "none",
+        "crossover_time_s": np.nan,
+        "log_solution_time_s": np.nan,
+        "log_iterations": np.nan,
+        "log_status": "",
+        "log_objective": np.nan,
+    }
+    log_file = Path(log_file)
+    if not log_file.exists():
+        return metrics
+
+    in_barrier_log = False
+    barrier_used = False
+    with open(log_file, "r", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith("Itn"):
+                in_barrier_log = barrier_used = True
+                continue
+            if in_barrier_log:
+                match = _PATTERNS["barrier_iteration"].match(line)
+                if match:
+                    metrics["log_barrier_iterations"] = int(match.group(1))
+                    continue
+                in_barrier_log = False
+
+            if match := _PATTERNS["presolve_eliminated"].search(line):
+                metrics["presolve_rows_removed"] += int(match.group(1))
+                metrics["presolve_cols_removed"] += int(match.group(2))
+            elif match := _PATTERNS["reduced"].search(line):
+                metrics["reduced_rows"] = int(match.group(1))
+                metrics["reduced_cols"] = int(match.group(2))
+                metrics["reduced_nonzeros"] = int(match.group(3))
+            elif match := _PATTERNS["presolve_time"].search(line):
+                metrics["presolve_time_s"] = float(match.group(1))
+            elif match := _PATTERNS["barrier_time"].search(line):
+                metrics["time_to_first_solution_s"] = float(match.group(1))
+            elif match := _PATTERNS["crossover"].match(line):
+                metrics["crossover"] = match.group(1).lower()
+            elif match := _PATTERNS["crossover_time"].search(line):
+                metrics["crossover_time_s"] = float(match.group(1))
+            elif match := _PATTERNS["solution_time"].search(line):
+                metrics["log_solution_time_s"] = float(match.group(1))
+                if match.group(2) is not None:
+                    metrics["log_iterations"] = int(match.group(2))
+            elif match := _PATTERNS["status"].match(line.strip()):
+                metrics["log_status"] = f"{match.group(1)} - {match.group(2)}"
+                if match.group(3) is not None:
+                    metrics["log_objective"] = float(match.group(3))
+
+    if barrier_used and metrics["crossover"] == "none":
+        metrics["crossover"] = "off"
+    if np.isnan(metrics["time_to_first_solution_s"]):
+        metrics["time_to_first_solution_s"] = metrics["log_solution_time_s"]
+    return metrics
+
+
+def software_versions() -> dict:
+    """versions of the solver stack, the toolbox version is added by the caller"""
+    import linopy
+    import pypsa
+
+    versions = {
+        "pypsa_version": pypsa.__version__,
+        "linopy_version": linopy.__version__,
+        "cplex_version": "",
+    }
+    try:
+        import cplex
+
+        versions["cplex_version"] = cplex.__version__
+    except Exception:
+        pass
+    return versions
+
+
+def append_solver_history(case_folder: str | Path, row: dict) -> Path:
+    """append a solve to the run history of the study base directory, row should hold 'toolbox_version'"""
+    history_file = solver_history_file(case_folder)
+    append_csv_row(
+        history_file,
+        {"case": Path(case_folder).name, **software_versions(), **row},
+    )
+    return history_file
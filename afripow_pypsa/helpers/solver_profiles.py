@@ -0,0 +1,133 @@
+"""
+Named CPLEX solver profiles and a harness to compare them on one captured model.
+
+A profile is a dict of CPLEX parameters as linopy passes them on, dotted names are the
+parameter path, e.g. "barrier.ordering" sets cplex.parameters.barrier.ordering.
+
+    lpmethod            4 barrier, 2 dual simplex, 0 automatic
+    barrier.crossover   -1 off, 0 automatic, 1 primal, 2 dual
+    barrier.ordering    0 automatic, 1 approximate minimum degree, 2 minimum fill, 3 nested dissection
+    emphasis.memory     1 conserve memory
+    workmem             MB of working memory before CPLEX uses node files / compresses
+
+"default" is what use_lpmethod_4=True always did, "cplex_defaults" what use_lpmethod_4=False did.
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SOLVER_PROFILE = "default"
+
+SOLVER_PROFILES = {
+    "default": {"lpmethod": 4},
+    "cplex_defaults": {},
+    "barrier_no_crossover": {"lpmethod": 4, "barrier.crossover": -1},
+    "barrier_nested_dissection": {"lpmethod": 4, "barrier.ordering": 3},
+    "barrier_loose_tolerances": {
+        "lpmethod": 4,
+        "barrier.convergetol": 1e-6,
+        "simplex.tolerances.feasibility": 1e-5,
+        "simplex.tolerances.optimality": 1e-5,
+    },
+    "low_memory": {
+        "lpmethod": 4,
+        "emphasis.memory": 1,
+        "barrier.ordering": 1,
+        "workmem": 1024,
+    },
+    "dual_simplex": {"lpmethod": 2},
+}
+
+
+def solver_profile_options(profile: str = None, threads=None) -> dict:
+    """the CPLEX options of a profile (a copy), with the threads parameter when given"""
+    profile = profile or DEFAULT_SOLVER_PROFILE
+    if profile not in SOLVER_PROFILES:
+        raise ValueError(
+            f"Unknown solver profile '{profile}', choose from {list(SOLVER_PROFILES)}"
+        )
+    options = dict(SOLVER_PROFILES[profile])
+    if threads:
+        options["threads"] = int(threads)
+    return options
+
+
+def apply_cplex_options(cpx, options: dict) -> None:
+    """set options on a cplex.Cplex problem the same way linopy does"""
+    for key, value in options.items():
+        param = cpx.parameters
+        for key_layer in key.split("."):
+            param = getattr(param, key_layer)
+        param.set(value)
+
+
+def solve_lp_with_profile(lp_file: str | Path, options: dict, log_file=None) -> dict:
+    """solve a captured LP file once with the options, returns the timings and outcome"""
+    import cplex
+
+    row = {
+        "status": "",
+        "objective": np.nan,
+        "wall_time_s": np.nan,
+        "simplex_iterations": np.nan,
+        "barrier_iterations": np.nan,
+        "error": "",
+    }
+    log = open(log_file, "w") if log_file is not None else None
+    try:
+        cpx = cplex.Cplex(str(lp_file))
+        if log is not None:
+            for stream in [
+                cpx.set_results_stream,
+                cpx.set_log_stream,
+                cpx.set_warning_stream,
+            ]:
+                stream(log)
+        apply_cplex_options(cpx, options)
+
+        start = time.perf_counter()
+        cpx.solve()
+        row["wall_time_s"] = time.perf_counter() - start
+
+        row["status"] = cpx.solution.get_status_string()
+        row["objective"] = cpx.solution.get_objective_value()
+        row["simplex_iterations"] = cpx.solution.progress.get_num_iterations()
+        row["barrier_iterations"] = cpx.solution.progress.get_num_barrier_iterations()
+        cpx.end()
+    except Exception as e:
+        row["error"] = repr(e)
+    finally:
+        if log is not None:
+            log.close()
+    return row
+
+
+def tune_solver_profiles(
+    lp_file: str | Path, profiles: list[str] = None, threads=None, log_folder=None
+) -> pd.DataFrame:
+    """
+    Solve the captured model once per profile. The objective differences are against the first
+    profile in the list.
+    """
+    profiles = profiles or list(SOLVER_PROFILES)
+    rows = []
+    for profile in profiles:
+        options = solver_profile_options(profile, threads=threads)
+        print(f"\n[ TUNING ] - {profile}: {options}")
+        log_file = Path(log_folder) / f"{profile}.log" if log_folder else None
+        row = {"profile": profile, **solve_lp_with_profile(lp_file, options, log_file)}
+        print(
+            f"[ TUNING ] - {profile}: {row['status']} objective {row['objective']} "
+            f"in {row['wall_time_s']:.1f}s {row['error']}"
+        )
+        rows.append(row)
+
+    report = pd.DataFrame(rows).set_index("profile")
+    reference = report["objective"].iloc[0]
+    report["objective_diff"] = report["objective"] - reference
+    report["objective_rel_diff"] = report["objective_diff"] / abs(reference)
+    report["wall_time_vs_first"] = report["wall_time_s"] / report["wall_time_s"].iloc[0]
+    return report
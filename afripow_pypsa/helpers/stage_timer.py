@@ -0,0 +1,185 @@
+"""
+Per stage instrumentation of a study year: wall time, memory and model size.
+
+Every stage of a year (loading the csv files, fix_n_minus_capacities, create_model, each custom
+constraint family, the solve and the export) is run inside StageTimer.stage(). At the end of the
+year two files are written to the results folder:
+
+    z_stage_metrics.csv     one row per stage
+    z_stage_trace.json      the same stages as a Chrome trace, open it in chrome://tracing or
+                            https://ui.perfetto.dev to see where the time of a year went
+
+Columns of z_stage_metrics.csv:
+    stage, start_s (since the timer was created), wall_time_s, rss_mb (after the stage),
+    peak_rss_mb (highest RSS during the stage), rss_delta_mb, and variables, constraints, nonzeros
+    of the linopy model after the stage when a model was passed.
+
+peak_rss_mb is sampled every PEAK_SAMPLE_S by a thread while the stage runs. The peak the OS
+keeps (ru_maxrss, PeakWorkingSetSize) is the peak of the whole process, in a reused pool worker
+or the serial year loop it would carry the peaks of the earlier years into every later one.
+The highest peak_rss_mb of a year is its peak in run_metrics.csv, see helpers/admission.py.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STAGE_METRICS_FILE_NAME = "z_stage_metrics.csv"
+STAGE_TRACE_FILE_NAME = "z_stage_trace.json"
+# seconds between two RSS samples of a running stage
+PEAK_SAMPLE_S = 0.2
+
+
+def memory_mb() -> float:
+    """current RSS of this process in MB, nan when it can not be read"""
+    if sys.platform == "win32":
+        try:
+            import win32api
+            import win32process
+
+            info = win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())
+            return info["WorkingSetSize"] / 2**20
+        except Exception:
+            return np.nan
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except Exception:
+        return np.nan
+
+
+@contextmanager
+def sampled_peak_mb(interval_s=PEAK_SAMPLE_S):
+    """yields a dict, its 'peak_mb' is the highest RSS seen while the block ran"""
+    sample = {"peak_mb": memory_mb()}
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval_s):
+            sample["peak_mb"] = np.fmax(sample["peak_mb"], memory_mb())
+
+    sampler = threading.Thread(target=run, name="rss_sampler", daemon=True)
+    sampler.start()
+    try:
+        yield sample
+    finally:
+        stop.set()
+        sampler.join()
+        sample["peak_mb"] = np.fmax(sample["peak_mb"], memory_mb())
+
+
+def model_size(m) -> dict:
+    """number of variables, constraints and nonzeros of a linopy model"""
+    nonzeros = 0
+    for name in m.constraints:
+        con = m.constraints[name]
+        active = (con.labels.values != -1)[..., None]
+        nonzeros += int(((con.vars.values != -1) & active).sum())
+    return {"variables": m.nvars, "constraints": m.ncons, "nonzeros": nonzeros}
+
+
+class StageTimer:
+    """collects the stages of one study year, see the module docstring"""
+
+    def __init__(self, label=""):
+        self.label = str(label)
+        self.rows = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, model=None):
+        """
+        time the block, model: a linopy model to count after the block. A model created in the
+        block can be set on the yielded dict, 'with timer.stage("x") as stage: stage["model"] = m'
+        """
+        extra = {"model": model}
+        rss_before = memory_mb()
+        start = time.perf_counter()
+        try:
+            with sampled_peak_mb() as sample:
+                yield extra
+        finally:
+            wall_time = time.perf_counter() - start
+            rss = memory_mb()
+            row = {
+                "stage": name,
+                "start_s": start - self._start,
+                "wall_time_s": wall_time,
+                "rss_mb": rss,
+                "peak_rss_mb": sample["peak_mb"],
+                "rss_delta_mb": rss - rss_before,
+                "thread": threading.current_thread().name,
+            }
+            if extra["model"] is not None:
+                try:
+                    row.update(model_size(extra["model"]))
+                except Exception as e:
+                    print(f"[ WARNING ] - Could not count the model size. {e}")
+            with self._lock:
+                self.rows.append(row)
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            return pd.DataFrame(self.rows)
+
+    def chrome_trace(self) -> dict:
+        """the stages as complete ('X') events of the Chrome trace event format"""
+        pid = os.getpid()
+        events = []
+        thread_ids = {}
+        for row in self.frame().to_dict("records"):
+            if row["thread"] not in thread_ids:
+                thread_ids[row["thread"]] = len(thread_ids)
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": thread_ids[row["thread"]],
+                        "args": {"name": row["thread"]},
+                    }
+                )
+            args = {
+                k: (None if pd.isna(v) else v)
+                for k, v in row.items()
+                if k not in ["stage", "start_s", "wall_time_s", "thread"]
+            }
+            events.append(
+                {
+                    "name": row["stage"],
+                    "cat": self.label,
+                    "ph": "X",
+                    "ts": round(row["start_s"] * 1e6),
+                    "dur": round(row["wall_time_s"] * 1e6),
+                    "pid": pid,
+                    "tid": thread_ids[row["thread"]],
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, results_folder_name: str | Path) -> pd.DataFrame:
+        """write z_stage_metrics.csv and z_stage_trace.json, returns the metrics"""
+        results_folder = Path(results_folder_name)
+        results_folder.mkdir(parents=True, exist_ok=True)
+        metrics = self.frame()
+        metrics.to_csv(results_folder / STAGE_METRICS_FILE_NAME, index=False)
+        with open(results_folder / STAGE_TRACE_FILE_NAME, "w") as f:
+            json.dump(self.chrome_trace(), f, default=float)
+
+        if not metrics.empty:
+            print("\nStage timings")
+            print(
+                metrics[["stage", "wall_time_s", "peak_rss_mb"]].to_string(
+                    index=False, float_format="{:.1f}".format
+                )
+            )
+        return metrics
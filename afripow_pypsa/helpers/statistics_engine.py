@@ -0,0 +1,169 @@
+"""
+Single pass statistics for the results folders.
+
+network_statistics_output used to call network.statistics.<metric>() once per metric, and every
+call walks all the components again. compute_component_statistics builds all the metrics of a
+component as columns of one frame and groups them with a single groupby, for any grouping column
+(carrier, plant_group, ...).
+
+The metrics are the same as PyPSA's (grouping by a list of columns, so no nice names):
+
+    Optimal Capacity                 <attr>_opt
+    Installed Capacity               <attr>
+    Expanded Capacity                <attr>_opt - <attr>
+    Capital Expenditure              <attr>_opt * capital_cost             (statistics.capex)
+    Installed Capital Expenditure    <attr> * capital_cost                 (statistics.installed_capex)
+    Expanded Capital Expenditure     (<attr>_opt - <attr>) * capital_cost  (statistics.expanded_capex)
+    Operational Expenditure          weighted sum of p * marginal_cost     (statistics.opex)
+
+In a multi investment period network the columns are split per period, with only the assets
+that are active in the period, as PyPSA does.
+"""
+
+import numpy as np
+import pandas as pd
+import pypsa
+from pypsa.descriptors import nominal_attrs
+
+STATIC_METRICS = [
+    "Optimal Capacity",
+    "Installed Capacity",
+    "Expanded Capacity",
+    "Capital Expenditure",
+    "Installed Capital Expenditure",
+    "Expanded Capital Expenditure",
+]
+OPEX_METRIC = "Operational Expenditure"
+
+# metric -> the z_*.csv file that network_statistics_output has always written
+Z_FILES = {
+    "Installed Capital Expenditure": "installed_capex",
+    "Expanded Capital Expenditure": "expanded_capex",
+    "Optimal Capacity": "optimal_capacity",
+    "Installed Capacity": "installed_capacity",
+    "Expanded Capacity": "expanded_capacity",
+}
+
+
+def _static_metrics(df: pd.DataFrame, attr: str) -> pd.DataFrame:
+    optimal = df[f"{attr}_opt"].to_numpy(dtype=float)
+    installed = df[attr].to_numpy(dtype=float)
+    capital_cost = df["capital_cost"].to_numpy(dtype=float)
+    expanded = optimal - installed
+    values = np.column_stack(
+        [
+            optimal,
+            installed,
+            expanded,
+            optimal * capital_cost,
+            installed * capital_cost,
+            expanded * capital_cost,
+        ]
+    )
+    return pd.DataFrame(values, index=df.index, columns=STATIC_METRICS)
+
+
+def _weightings(n: pypsa.Network, c: str) -> pd.Series:
+    if c == "Generator":
+        return n.snapshot_weightings["generators"]
+    elif c in ["StorageUnit", "Store"]:
+        return n.snapshot_weightings["stores"]
+    return n.snapshot_weightings["objective"]
+
+
+def _opex(n: pypsa.Network, c: str, periods) -> pd.DataFrame:
+    """asset x period (or asset x [None]) operational expenditure"""
+    if c in n.branch_components:
+        p = n.pnl(c).get("p0")
+    elif c == "StorageUnit":
+        p = n.pnl(c).get("p_dispatch")
+    else:
+        p = n.pnl(c).get("p")
+    index = n.df(c).index
+    if p is None or p.empty or "marginal_cost" not in n.df(c):
+        return pd.DataFrame(0.0, index=index, columns=periods)
+
+    p = p.reindex(columns=index, fill_value=0.0)
+    marginal_cost = n.get_switchable_as_dense(c, "marginal_cost").reindex(
+        index=p.index, columns=index, fill_value=0.0
+    )
+    weightings = _weightings(n, c).reindex(p.index).to_numpy()
+    weighted = p.to_numpy() * marginal_cost.to_numpy() * weightings[:, None]
+
+    if isinstance(p.index, pd.MultiIndex):
+        result = pd.DataFrame(
+            weighted, index=p.index.get_level_values(0), columns=index
+        )
+        return result.groupby(level=0).sum().T.reindex(columns=periods, fill_value=0.0)
+    return pd.DataFrame(weighted.sum(axis=0), index=index, columns=periods)
+
+
+def compute_component_statistics(
+    network: pypsa.Network, groupby: str | list[str] = "carrier", comps=None
+) -> pd.DataFrame:
+    """
+    One table with all the metrics, index (component, *groupby), columns the metrics, or
+    (metric, period) when the network has investment periods.
+
+    Components that do not have all the groupby columns are skipped.
+    """
+    n = network
+    groupby = [groupby] if isinstance(groupby, str) else list(groupby)
+    if not groupby:
+        groupby = ["carrier"]
+    if comps is None:
+        comps = sorted(n.branch_components | n.one_port_components)
+
+    multi_period = isinstance(n.snapshots, pd.MultiIndex)
+    periods = list(n.investment_periods) if multi_period else [None]
+
+    grouped = {}
+    for c in comps:
+        df = n.df(c)
+        if df.empty or c not in nominal_attrs:
+            continue
+        missing = [key for key in groupby if key not in df.columns]
+        if missing:
+            print(f"Statistics - {c} does not have {missing}, skipping")
+            continue
+
+        static = _static_metrics(df, nominal_attrs[c])
+        opex = _opex(n, c, periods)
+
+        per_period = {}
+        for i, period in enumerate(periods):
+            if period is None:
+                active = np.ones(len(df), dtype=bool)
+            else:
+                active = n.get_active_assets(c, period).reindex(df.index).to_numpy()
+            frame = static.where(np.broadcast_to(active[:, None], static.shape))
+            frame[OPEX_METRIC] = opex.iloc[:, i].to_numpy()
+            per_period[period] = frame
+
+        if multi_period:
+            values = pd.concat(per_period, axis=1, names=["period", "metric"])
+            values = values.swaplevel(axis=1)
+        else:
+            values = per_period[None]
+
+        # a single groupby for all the metrics and periods of the component
+        grouped[c] = values.groupby([df[key] for key in groupby]).sum(min_count=1)
+
+    if not grouped:
+        return pd.DataFrame()
+
+    stats = pd.concat(grouped, names=["component", *groupby])
+    if multi_period:
+        stats = stats.sort_index(axis=1, level=0, sort_remaining=False)
+    return stats
+
+
+def metric_frame(stats: pd.DataFrame, metric: str):
+    """
+    One metric in the same shape as network.statistics.<metric>(): a frame with a column per
+    investment period, or a Series without periods. Groups that have no active asset are dropped.
+    """
+    if isinstance(stats.columns, pd.MultiIndex):
+        frame = stats[metric]
+        return frame.dropna(how="all").fillna(0.0)
+    return stats[metric].dropna()
@@ -0,0 +1,250 @@
+"""
+Warm start CPLEX from an earlier solve, matched by variable and constraint names.
+
+After a solve with warm starting enabled the CPLEX basis is saved next to the results as
+
+    <case>/<year>/<stage>/.warm_start/basis.parquet
+
+with every basis entry stored by name, e.g. 'Generator-p|t17|COAL_1'. The investment period is left
+out and a snapshot is stored as its position within its period ('t17' is the 18th snapshot of the
+year), not as its timestamp: the snapshots of each year are dated in that year, so by timestamp
+"previous_year" would only match the capacity entries. Before the next solve the saved basis is
+translated to the labels of the new model and handed to CPLEX, entries that do not exist in the new
+model are dropped and CPLEX completes the basis.
+
+Warm start modes:
+    "previous_year" - the basis of the closest earlier year of the same stage
+    "results_uc"    - the basis of the same year in Results_uc
+
+The barrier method does not use a starting basis, so a warm started solve runs with
+WARM_START_LPMETHOD (dual simplex) in place of lpmethod 4. Compare the solve times and
+iterations in the case's run_metrics.csv to see if it pays off for a case.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+WARM_START_MODES = ["previous_year", "results_uc"]
+WARM_START_DIR_NAME = ".warm_start"
+WARM_START_LPMETHOD = 2
+
+
+def warm_start_dir(results_folder_name: str | Path) -> Path:
+    return Path(results_folder_name) / WARM_START_DIR_NAME
+
+
+def named_basis_file(results_folder_name: str | Path) -> Path:
+    return warm_start_dir(results_folder_name) / "basis.parquet"
+
+
+def warm_start_source_folder(mode, results_folder_name: str | Path):
+    """the results folder to warm start '<case>/<year>/<stage>' from, or None if there is none"""
+    if mode not in WARM_START_MODES:
+        raise ValueError(f"warm_start must be one of {WARM_START_MODES}, got {mode}")
+
+    results_folder = Path(results_folder_name)
+    case_folder, stage, year = (
+        results_folder.parent.parent,
+        results_folder.name,
+        int(results_folder.parent.name),
+    )
+    if mode == "results_uc":
+        source = case_folder / str(year) / "Results_uc"
+        return source if named_basis_file(source).exists() else None
+
+    earlier_years = sorted(
+        int(d.name)
+        for d in case_folder.iterdir()
+        if d.is_dir() and d.name.isdigit() and int(d.name) < year
+    )
+    for earlier_year in reversed(earlier_years):
+        source = case_folder / str(earlier_year) / stage
+        if named_basis_file(source).exists():
+            return source
+    return None
+
+
+def _positions(n: int, periods=None) -> np.ndarray:
+    """'t0', 't1', ... the position of every entry, counted per period when periods are given"""
+    if periods is None:
+        position = np.arange(n)
+    else:
+        position = (
+            pd.Series(np.asarray(periods)).groupby(np.asarray(periods)).cumcount()
+        )
+    return np.array([f"t{p}" for p in np.asarray(position)], dtype=object)
+
+
+def _coord_strings(index: pd.Index) -> np.ndarray:
+    """
+    coordinate values as strings, without the investment period and with the timestamps as their
+    position within the period, see the module docstring
+    """
+    if isinstance(index, pd.MultiIndex):
+        periods = index.get_level_values("period") if "period" in index.names else None
+        levels = []
+        for name in index.names:
+            if name == "period":
+                continue
+            values = index.get_level_values(name)
+            if isinstance(values, pd.DatetimeIndex):
+                levels.append(_positions(len(index), periods))
+            else:
+                levels.append(np.array([str(v) for v in values], dtype=object))
+        if not levels:
+            return np.full(len(index), "", dtype=object)
+        keys = levels[0]
+        for level in levels[1:]:
+            keys = keys + "|" + level
+        return keys
+    if index.name == "period":
+        return np.full(len(index), "", dtype=object)
+    if isinstance(index, pd.DatetimeIndex):
+        return _positions(len(index))
+    return np.array([str(v) for v in index], dtype=object)
+
+
+def _container_keys(container) -> pd.Series:
+    """label -> name key for all the variables or constraints of a linopy model"""
+    frames = []
+    for name in container:
+        labels = container[name].labels
+        keys = np.array(name, dtype=object)
+        for dim in labels.dims:
+            coords = _coord_strings(labels.get_index(dim))
+            keys = (
+                np.add.outer(keys + "|", coords) if keys.ndim else keys + "|" + coords
+            )
+        values = labels.values.ravel()
+        keys = np.broadcast_to(keys, labels.shape).ravel()
+        mask = values >= 0
+        frames.append(pd.Series(keys[mask], index=values[mask]))
+    if not frames:
+        return pd.Series(dtype=object)
+    return pd.concat(frames)
+
+
+def model_name_keys(m) -> tuple[pd.Series, pd.Series]:
+    """(variable label -> key, constraint label -> key)"""
+    return _container_keys(m.variables), _container_keys(m.constraints)
+
+
+def read_basis_file(basis_fn: str | Path) -> pd.DataFrame:
+    """the entries of a CPLEX .bas file as (kind, variable label, constraint label)"""
+    rows = []
+    with open(basis_fn, "r") as f:
+        for line in f:
+            tokens = line.split()
+            if len(tokens) < 2 or tokens[0] in ["NAME", "ENDATA"]:
+                continue
+            var_label = int(tokens[1][1:])
+            con_label = int(tokens[2][1:]) if len(tokens) > 2 else -1
+            rows.append((tokens[0], var_label, con_label))
+    return pd.DataFrame(rows, columns=["kind", "var_label", "con_label"])
+
+
+def save_named_basis(m, basis_fn: str | Path, results_folder_name: str | Path) -> int:
+    """store the CPLEX basis written to basis_fn by name, returns the number of entries"""
+    if not Path(basis_fn).exists():
+        print(
+            f"[ WARNING ] - No basis written by the solver, can not warm start from {results_folder_name}"
+        )
+        return 0
+    basis = read_basis_file(basis_fn)
+    var_keys, con_keys = model_name_keys(m)
+    named = pd.DataFrame(
+        {
+            "kind": basis["kind"].values,
+            "var_key": var_keys.reindex(basis["var_label"]).values,
+            "con_key": con_keys.reindex(basis["con_label"]).values,
+        }
+    )
+    named = named.dropna(subset=["var_key"])
+
+    basis_file = named_basis_file(results_folder_name)
+    tmp_file = basis_file.with_suffix(f".{os.getpid()}.tmp")
+    named.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, basis_file)
+    print(f"[ INFO ] - Saved basis with {len(named)} entries to {basis_file}")
+    return len(named)
+
+
+def write_warm_start_basis(m, source_folder: str | Path, basis_fn: str | Path) -> dict:
+    """
+    translate the named basis of source_folder to the labels of model m and write it as a CPLEX
+    .bas file, returns the match statistics
+    """
+    named = pd.read_parquet(named_basis_file(source_folder))
+    var_keys, con_keys = model_name_keys(m)
+    var_labels = pd.Series(var_keys.index, index=var_keys.values)
+    con_labels = pd.Series(con_keys.index, index=con_keys.values)
+    var_labels = var_labels[~var_labels.index.duplicated()]
+    con_labels = con_labels[~con_labels.index.duplicated()]
+
+    var_label = var_labels.reindex(named["var_key"]).values
+    con_label = con_labels.reindex(named["con_key"]).values
+    pairs = named["kind"].isin(["XU", "XL"]).values
+    # a basic variable only enters with the row it replaces in the basis
+    keep = ~np.isnan(var_label) & (~pairs | ~np.isnan(con_label))
+
+    with open(basis_fn, "w") as f:
+        f.write("NAME          warm_start\n")
+        for kind, x, c, pair in zip(
+            named["kind"].values[keep],
+            var_label[keep],
+            con_label[keep],
+            pairs[keep],
+        ):
+            if pair:
+                f.write(f" {kind} x{int(x)} c{int(c)}\n")
+            else:
+                f.write(f" {kind} x{int(x)}\n")
+        f.write("ENDATA\n")
+
+    stats = {
+        "warm_start_source": str(source_folder),
+        "warm_start_entries": len(named),
+        "warm_start_matched": int(keep.sum()),
+    }
+    print(
+        f"[ INFO ] - Warm start from {source_folder}: "
+        f"{stats['warm_start_matched']} of {stats['warm_start_entries']} basis entries matched"
+    )
+    return stats
+
+
+def warm_start_effect(run_metrics: pd.DataFrame, stage, year, row: dict) -> dict:
+    """solve time and iterations of a warm started solve against the last cold solve of the same stage and year"""
+    if run_metrics.empty or row.get("warm_start") == "cold":
+        return {}
+    cold = run_metrics[
+        (run_metrics["stage"] == stage)
+        & (run_metrics["year"].astype(str) == str(year))
+        & (run_metrics["warm_start"] == "cold")
+    ]
+    if cold.empty:
+        return {}
+    cold = cold.iloc[-1]
+    iterations = lambda r: np.nansum(
+        [r.get("simplex_iterations", np.nan), r.get("barrier_iterations", np.nan)]
+    )
+    return {
+        "cold_solve_time_s": cold["solve_time_s"],
+        "delta_solve_time_s": row["solve_time_s"] - cold["solve_time_s"],
+        "delta_iterations": iterations(row) - iterations(cold),
+    }
+
+
+def solver_iterations(m) -> dict:
+    """simplex and barrier iterations of the last CPLEX solve of model m"""
+    try:
+        progress = m.solver_model.solution.progress
+        return {
+            "simplex_iterations": progress.get_num_iterations(),
+            "barrier_iterations": progress.get_num_barrier_iterations(),
+        }
+    except Exception:
+        return {"simplex_iterations": np.nan, "barrier_iterations": np.nan}
@@ -1,8 +1,10 @@
 from pathlib import Path
 
 import linopy
+import numpy as np
 import pandas as pd
 import pypsa
+import xarray as xr
 
 
 def add_spinning_reserves_per_level_and_area(
@@ -83,9 +85,15 @@ def add_spinning_reserves_per_level_and_area(
     The following constraint ensures that the reserve power provided by a generator must be
     less than or equal to the difference between its power p and its nominal power p_nom:
     """
+    # a blank factor has no upper limit row, the link is only limited by R <= P and R <= p_nom
     ReserveUpperLimit = m.add_constraints(
-        P + ReserveRequirement <= p_nom * contributing_factor_per_link,
+        P + ReserveRequirement <= p_nom * contributing_factor_per_link.fillna(0),
         name=f"GlobalReserveConstraint-reserve_upper_limit-{constraint_name}",
+        mask=xr.DataArray(
+            contributing_factor_per_link.notna().values,
+            coords={"Link": reserve_links.values},
+            dims="Link",
+        ),
     )
 
     """
@@ -110,8 +118,364 @@ def add_spinning_reserves_per_level_and_area(
     print(ReserveLowerLimit[0])
 
 
+def _sparse_reserve_entries(network: pypsa.Network, requirements: pd.DataFrame):
+    """
+    (entries, requirements, zero_factor_links, links_per_level_area) where entries has one row per
+    (level, area, link) with a nonzero factor, indexed by 'ReserveLink'. A blank (NaN) factor is an
+    entry too, with a NaN factor: it gets no upper limit row, as in the per level and area rows.
+    """
+    links = network.links
+    entries = []
+    zero_factor_links = set()
+    links_per_level_area = 0
+    for level_area, row in requirements.iterrows():
+        in_area = links[links["reserve_area"] == row["reserve_area"]]
+        factor = in_area[row["reserve_level"]]
+        links_per_level_area += len(in_area)
+        zero_factor_links.update(factor.index[factor == 0])
+        # NaN != 0, a blank factor contributes
+        contributing = factor[factor != 0]
+        entries.append(
+            pd.DataFrame(
+                {
+                    "level_area": level_area,
+                    "link": contributing.index,
+                    "factor": contributing.values,
+                }
+            )
+        )
+    entries = pd.concat(entries, ignore_index=True)
+    without_links = requirements.index.difference(entries["level_area"].unique())
+    unmet = requirements.loc[without_links, "value_mw"].astype(float) > 0
+    if unmet.any():
+        # the per level and area formulation is infeasible here, do not solve without them
+        raise ValueError(
+            f"No links with a nonzero reserve factor for {list(unmet.index[unmet])}, "
+            "their reserve requirement can not be met. Check links.csv and reserves.csv"
+        )
+    # a requirement of 0 without links is always met
+    requirements = requirements.drop(without_links)
+
+    entries.index = pd.Index(
+        entries["level_area"] + "|" + entries["link"], name="ReserveLink"
+    )
+    entries["p_nom"] = links["p_nom"].reindex(entries["link"]).values.astype(float)
+    zero_factor_links = pd.Index(sorted(zero_factor_links), name="ReserveZeroLink")
+    return entries, requirements, zero_factor_links, links_per_level_area
+
+
+def _select_links(var: linopy.Variable, links, dim: str, labels):
+    """Link variable at 'links', as a new dimension 'dim' with coordinates 'labels'"""
+    return var.sel(
+        {"Link": xr.DataArray(np.asarray(links), coords={dim: labels}, dims=dim)}
+    )
+
+
+def _add_sparse_reserve_rows(
+    m: linopy.model,
+    entries: pd.DataFrame,
+    requirements: pd.DataFrame,
+    zero_factor_links: pd.Index,
+    positions=None,
+    suffix="",
+) -> int:
+    """
+    the reserve constraint blocks for the snapshots at 'positions' (all when None), returns the
+    number of rows added
+    """
+    dim = "ReserveLink"
+    R = m.variables["Link-p_reserves"]
+    P = _select_links(m.variables["Link-p"], entries["link"].values, dim, entries.index)
+    if positions is not None:
+        R = R.isel(snapshot=positions)
+        P = P.isel(snapshot=positions)
+    n_snapshots = R.shape[0]
+
+    def along(values):
+        return xr.DataArray(np.asarray(values), coords={dim: entries.index}, dims=dim)
+
+    need = xr.DataArray(
+        requirements["value_mw"].astype(float).values,
+        # the values, a named index would become a coordinate on its own dimension
+        coords={"ReserveLevelArea": requirements.index.values},
+        dims="ReserveLevelArea",
+    )
+    group = along(entries["level_area"].values).rename("ReserveLevelArea")
+    m.add_constraints(
+        (1 * R).groupby(group).sum() >= need,
+        name=f"GlobalReserveConstraint-sum_of_reserves{suffix}",
+    )
+    limited = entries["factor"].notna().values
+    m.add_constraints(
+        P + R <= along(entries["p_nom"].values * entries["factor"].fillna(0).values),
+        name=f"GlobalReserveConstraint-reserve_upper_limit{suffix}",
+        mask=along(limited),
+    )
+    m.add_constraints(
+        R - P <= 0, name=f"GlobalReserveConstraint-reserve_lower_limit{suffix}"
+    )
+
+    if len(zero_factor_links):
+        P_zero = _select_links(
+            m.variables["Link-p"],
+            zero_factor_links.values,
+            "ReserveZeroLink",
+            zero_factor_links,
+        )
+        if positions is not None:
+            P_zero = P_zero.isel(snapshot=positions)
+        m.add_constraints(
+            P_zero == 0, name=f"GlobalReserveConstraint-zero_factor_limit{suffix}"
+        )
+    return n_snapshots * (
+        len(requirements) + len(entries) + limited.sum() + len(zero_factor_links)
+    )
+
+
+def add_sparse_spinning_reserves(
+    m: linopy.model,
+    network: pypsa.Network,
+    requirements: pd.DataFrame,
+    lazy: bool = False,
+    lazy_sample: int = 0,
+) -> dict:
+    """
+    All reserve levels and areas in one formulation, the same constraints as
+    add_spinning_reserves_per_level_and_area but only for the links with a nonzero factor.
+
+    requirements    :   one row per (reserve_level, reserve_area) with the 'value_mw' needed
+
+    Every (level, area, link) with a nonzero factor is an entry of the 'ReserveLink' dimension,
+    every (level, area) an entry of 'ReserveLevelArea':
+
+        Link-p_reserves                             0 <= R <= p_nom                 (snapshot, ReserveLink)
+        GlobalReserveConstraint-sum_of_reserves     sum R per level/area >= need    (snapshot, ReserveLevelArea)
+        GlobalReserveConstraint-reserve_upper_limit P + R <= p_nom * factor         (snapshot, ReserveLink)
+        GlobalReserveConstraint-reserve_lower_limit R <= P                          (snapshot, ReserveLink)
+        GlobalReserveConstraint-zero_factor_limit   P == 0                          (snapshot, ReserveZeroLink)
+
+    The last block keeps what the per level and area rows did for a link with a zero factor
+    (R >= 0, R <= P and P + R <= 0 leave P == 0, also for a link with p_min_pu < 0), without a
+    reserve variable for it.
+
+    A blank (NaN) factor in links.csv keeps the old behaviour too: the link contributes, without a
+    reserve_upper_limit row (a NaN right hand side), so only R <= P and R <= p_nom limit it. Both
+    formulations mask that row explicitly and a warning lists the links.
+
+    A requirement above 0 without any link with a nonzero factor raises a ValueError, the per
+    level and area formulation is infeasible there (the pre-flight check reports it first).
+
+    lazy=True only adds the rows for the 'lazy_sample' snapshots with the highest load, the other
+    snapshots are added when the solution violates them, see LazyReserveConstraints.
+
+    Returns the variable and constraint counts of this and of the per level and area formulation.
+    """
+    snapshots = network.snapshots
+    n_snapshots = len(snapshots)
+    n_requirements = len(requirements)
+
+    entries, requirements, zero_factor_links, links_per_level_area = (
+        _sparse_reserve_entries(network, requirements)
+    )
+    if entries.empty:
+        return {}
+    if len(zero_factor_links):
+        print(
+            f"[ WARNING ] - {len(zero_factor_links)} links have a zero reserve factor in an area with a "
+            f"reserve requirement, their dispatch is fixed to 0 as before: {list(zero_factor_links)}"
+        )
+    blank = entries.index[entries["factor"].isna()]
+    if len(blank):
+        print(
+            f"[ WARNING ] - {len(blank)} level/area links have a blank reserve factor, they give "
+            f"reserves without the p_nom * factor limit as before: {list(blank)}"
+        )
+
+    m.add_variables(
+        lower=0,
+        upper=xr.DataArray(
+            entries["p_nom"].values,
+            coords={"ReserveLink": entries.index},
+            dims="ReserveLink",
+        ),
+        coords=[snapshots, entries.index],
+        name="Link-p_reserves",
+    )
+
+    if lazy:
+        lazy_reserves = LazyReserveConstraints(
+            network, entries, requirements, zero_factor_links
+        )
+        rows = lazy_reserves.add_rows(m, lazy_reserves.sample_positions(lazy_sample))
+        _lazy_reserves[id(m)] = lazy_reserves
+    else:
+        rows = _add_sparse_reserve_rows(m, entries, requirements, zero_factor_links)
+
+    sizes = {
+        "reserve_variables_before": n_snapshots * links_per_level_area,
+        "reserve_variables_after": n_snapshots * len(entries),
+        "reserve_constraints_before": n_snapshots
+        * (n_requirements + 2 * links_per_level_area),
+        "reserve_constraints_after": rows,
+    }
+    print("\nReserve formulation size (per level and area -> sparse)")
+    for kind in ["variables", "constraints"]:
+        before, after = sizes[f"reserve_{kind}_before"], sizes[f"reserve_{kind}_after"]
+        shrink = 100 * (1 - after / before) if before else 0
+        print(f"{kind:<12} {before:>12} -> {after:>12}  ({shrink:.1f}% smaller)")
+    return sizes
+
+
+# id(linopy model) -> LazyReserveConstraints, taken by pop_lazy_reserves before the solve
+_lazy_reserves = {}
+
+
+def pop_lazy_reserves(m: linopy.model):
+    """the LazyReserveConstraints of a model built with lazy reserves, or None"""
+    return _lazy_reserves.pop(id(m), None)
+
+
+class LazyReserveConstraints:
+    """
+    Cutting plane generation of the per snapshot reserve rows.
+
+    The model is solved with the rows of a few snapshots only. For every other snapshot the
+    solution is checked in one vectorized pass: with the dispatch P fixed, the best reserve a link
+    can give is max(0, min(p_nom, p_nom * factor - P, P)), and a snapshot is violated when
+        - P > p_nom * factor or P < 0 for a contributing link, or P != 0 for a zero factor link
+        - the best reserves of a level and area do not add up to its need
+    The rows of the violated snapshots are added and the model solved again, until no snapshot
+    is violated. The reserve problem of a snapshot only depends on the dispatch of that snapshot,
+    so the final solution is the solution of the full model.
+    """
+
+    def __init__(self, network, entries, requirements, zero_factor_links, tol=1e-4):
+        self.network = network
+        self.entries = entries
+        self.requirements = requirements
+        self.zero_factor_links = zero_factor_links
+        self.tol = tol
+        self.active = np.zeros(len(network.snapshots), dtype=bool)
+        self.iterations = []
+        self.blocks_added = 0
+
+    def sample_positions(self, n_sample: int) -> np.ndarray:
+        """the positions of the n_sample snapshots with the highest total load"""
+        if not n_sample:
+            return np.array([], dtype=int)
+        load = self.network.get_switchable_as_dense("Load", "p_set").sum(axis=1)
+        return np.sort(np.argsort(-load.to_numpy())[: int(n_sample)])
+
+    def add_rows(self, m, positions) -> int:
+        positions = np.asarray(positions, dtype=int)
+        if not len(positions):
+            return 0
+        rows = _add_sparse_reserve_rows(
+            m,
+            self.entries,
+            self.requirements,
+            self.zero_factor_links,
+            positions=positions,
+            suffix=f"-lazy{self.blocks_added}",
+        )
+        self.blocks_added += 1
+        self.active[positions] = True
+        return rows
+
+    def violated_positions(self) -> np.ndarray:
+        """positions of the inactive snapshots where the current dispatch violates a reserve row"""
+        p0 = self.network.links_t.p0
+        P = p0.reindex(columns=self.entries["link"].values, fill_value=0.0).to_numpy()
+        p_nom = self.entries["p_nom"].to_numpy()
+        factor = self.entries["factor"].to_numpy(float)
+        # a blank factor has no upper limit row
+        limit = np.where(np.isnan(factor), np.inf, p_nom * factor)
+
+        violated = (P > limit + self.tol).any(axis=1) | (P < -self.tol).any(axis=1)
+        best_reserve = np.clip(np.minimum(np.minimum(p_nom, limit - P), P), 0.0, None)
+
+        codes, groups = pd.factorize(self.entries["level_area"])
+        in_group = np.zeros((len(codes), len(groups)))
+        in_group[np.arange(len(codes)), codes] = 1.0
+        need = self.requirements["value_mw"].reindex(groups).to_numpy(float)
+        violated |= (best_reserve @ in_group < need - self.tol).any(axis=1)
+
+        if len(self.zero_factor_links):
+            P_zero = p0.reindex(columns=self.zero_factor_links, fill_value=0.0)
+            violated |= (np.abs(P_zero.to_numpy()) > self.tol).any(axis=1)
+
+        return np.flatnonzero(violated & ~self.active)
+
+    def _solve_once(self, solve, iteration) -> dict:
+        import time
+
+        start = time.perf_counter()
+        status, condition = solve()
+        row = {
+            "iteration": iteration,
+            "active_snapshots": int(self.active.sum()),
+            "status": status,
+            "termination_condition": condition,
+            "objective": self.network.objective if status == "ok" else np.nan,
+            "solve_time_s": time.perf_counter() - start,
+            "violated_snapshots": 0,
+            "rows_added": 0,
+        }
+        self.iterations.append(row)
+        return row
+
+    def solve(self, m, solve, results_folder_name=None, max_iterations=50):
+        """
+        solve() solves the model and returns (status, condition). Repeats until no snapshot is
+        violated and writes the iteration statistics to z_reserve_iterations.csv. When snapshots
+        are still violated after max_iterations solves, the rows of all the remaining snapshots are
+        added and the full model is solved once more, so the returned solution always meets the
+        reserves.
+        """
+        status, condition = "", ""
+        for iteration in range(max_iterations):
+            row = self._solve_once(solve, iteration)
+            status, condition = row["status"], row["termination_condition"]
+            if status != "ok":
+                print(
+                    f"[ WARNING ] - Lazy reserves: solve {iteration} ended {condition}"
+                )
+                break
+
+            violated = self.violated_positions()
+            row["violated_snapshots"] = len(violated)
+            print(
+                f"Lazy reserves iteration {iteration}: {row['active_snapshots']} snapshots active, "
+                f"{len(violated)} violated"
+            )
+            if not len(violated):
+                break
+            row["rows_added"] = self.add_rows(m, violated)
+        else:
+            print(
+                f"[ WARNING ] - Lazy reserves: still violated after {max_iterations} solves, "
+                "adding the rows of all the remaining snapshots"
+            )
+            self.iterations[-1]["rows_added"] += self.add_rows(
+                m, np.flatnonzero(~self.active)
+            )
+            row = self._solve_once(solve, max_iterations)
+            status, condition = row["status"], row["termination_condition"]
+
+        if results_folder_name is not None:
+            pd.DataFrame(self.iterations).to_csv(
+                Path(results_folder_name) / "z_reserve_iterations.csv", index=False
+            )
+        return status, condition
+
+
 def add_all_reserve_constraints(
-    network: pypsa.Network, m: linopy.model, reserves_file_path: str | Path
+    network: pypsa.Network,
+    m: linopy.model,
+    reserves_file_path: str | Path,
+    sparse: bool = True,
+    lazy: bool = False,
+    lazy_sample: int = 48,
 ):
     """find all constraints from links.csv, and loads reserves.csv witht the RHS from Inputsfolder
 
@@ -139,6 +503,13 @@ def add_all_reserve_constraints(
 
 
 
+    sparse=True adds all levels and areas as one formulation with only the links that contribute,
+    see add_sparse_spinning_reserves. sparse=False adds the blocks per level and area, the two give
+    the same solution (toolbox.check_reserve_formulations solves a year with both and compares).
+    lazy=True (sparse only) starts with the rows of the 'lazy_sample' highest load snapshots and adds
+    the others when they are violated, the model then has to be solved with
+    pop_lazy_reserves(m).solve(...), see LazyReserveConstraints.
+
     3. Creates a dict
     find the links per area
     split the dict up into "extendable" and "non-extendable"
@@ -209,6 +580,7 @@ def add_all_reserve_constraints(
     print(f"{reserves}\n")
 
     ignored_constraints = []
+    requirements = []
 
     # add constraints found
     for reserve_level in reserve_levels:
@@ -227,14 +599,16 @@ def add_all_reserve_constraints(
                     f"Adding: {constraint_name}-{area_link_list} >= {reserve_capacity_needed}\n\n"
                 )
                 print("=" * 80)
-                # add_reserve_constraint_per_level_and_area(
-                #     m,
-                #     network,
-                #     reserve_level,
-                #     area_link_list,
-                #     reserve_capacity_needed,
-                #     constraint_name,
-                # )
+                if sparse:
+                    requirements.append(
+                        {
+                            "level_area": reserve_level_reserve_area,
+                            "reserve_level": reserve_level,
+                            "reserve_area": reserve_area,
+                            "value_mw": reserve_capacity_needed,
+                        }
+                    )
+                    continue
                 add_spinning_reserves_per_level_and_area(
                     m,
                     network,
@@ -249,6 +623,15 @@ def add_all_reserve_constraints(
                 )
                 ignored_constraints.append(reserve_level_reserve_area)
 
+    if requirements:
+        add_sparse_spinning_reserves(
+            m,
+            network,
+            pd.DataFrame(requirements).set_index("level_area"),
+            lazy=lazy,
+            lazy_sample=lazy_sample,
+        )
+
     print("Final Linopy Model for optimization:")
     print("Call: network.optimize.solve_model()")
     print("============================================================")
@@ -2,15 +2,17 @@
 
 import os
 import shutil
+import sys
 import warnings
 import time
+from functools import partial
 from pathlib import Path
 from pprint import pprint
 
 import linopy
+import xarray as xr
 import pandas as pd
 import pypsa
-import winsound
 from pypsa.descriptors import nominal_attrs
 import numpy as np
 from questionary import password
@@ -20,7 +22,60 @@ from ..Report.Report import Report, __version__
 __version__ = __version__
 
 from ..helpers.direcory_cases import remove_non_directory_files, find_int_named_subdirs
-from ..pypsa_toolbox.reserves import add_all_reserve_constraints
+from ..helpers.network_cache import load_network_cached
+from ..helpers.background_writer import results_writer
+from ..helpers.component_summary import (
+    component_summary,
+    drop_legacy_summary_columns,
+)
+from ..helpers.statistics_engine import (
+    Z_FILES,
+    compute_component_statistics,
+    metric_frame,
+)
+from ..helpers.solver_profiles import (
+    apply_cplex_options,
+    solver_profile_options,
+    tune_solver_profiles,
+)
+from ..helpers.admission import (
+    AdmissionController,
+    estimated_solve_peak_mb,
+    predicted_peak_mb,
+    total_memory_mb,
+)
+from ..helpers.preflight import PreflightError, preflight_checks
+from ..helpers.representative_periods import reduce_to_representative_periods
+from ..helpers.run_manifest import (
+    STAGE_INPUTS,
+    record_outputs,
+    record_year,
+    resume_years,
+    stale_outputs,
+)
+from ..helpers.run_metrics import append_run_metrics, read_run_metrics
+from ..helpers.solver_log import (
+    append_solver_history,
+    parse_cplex_log,
+    solver_log_file,
+)
+from ..helpers.stage_timer import StageTimer, memory_mb, model_size
+from ..helpers.warm_start import (
+    WARM_START_LPMETHOD,
+    save_named_basis,
+    solver_iterations,
+    warm_start_dir,
+    warm_start_effect,
+    warm_start_source_folder,
+    write_warm_start_basis,
+)
+from ..helpers.capacity_ledger import (
+    capacity_ledger_from_network,
+    case_and_stage_from_results_folder,
+    read_capacity_ledger,
+    write_capacity_ledger,
+)
+from ..pypsa_toolbox.reserves import add_all_reserve_constraints, pop_lazy_reserves
 
 print(f"Using toolbox version: {__version__}")
 
@@ -29,172 +84,6 @@ def add_multi_index_investment_periods(network: pypsa.Network):
     network.investment_periods = pd.Index([0])
 
 
-def add_generator_info(network):
-    componenet_type = "Generator"
-    print(f"Adding {componenet_type} info")
-    p_opt = "p_nom_opt"  #
-    p_t = "p"
-
-    _component_ref = network.df(componenet_type)  # refernce to e.g. Link
-    _component_ref_t = network.pnl(componenet_type)  # reference to Lint_t
-
-    _component_ref["total_cost__"] = (
-        _component_ref["capital_cost"] * _component_ref[p_opt]
-    )
-    _component_ref["total_energy__"] = _component_ref_t[p_t].sum()
-
-    # calcs on results of calcs a bove
-    _component_ref["total_variable_cost__"] = (
-        _component_ref["marginal_cost"] * _component_ref["total_energy__"]
-    )
-    _component_ref["ave_lf__"] = _component_ref["total_energy__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-
-    _component_ref["ave_cost__"] = (
-        _component_ref["total_cost__"] + _component_ref["total_variable_cost__"]
-    ) / _component_ref["total_energy__"]
-    return
-
-
-def add_link_info(network):
-    componenet_type = "Link"
-    print(f"Adding {componenet_type} info")
-    p_opt = "p_nom_opt"
-    p_t = "p0"
-
-    _component_ref = network.df(componenet_type)  # refernce to e.g. Link
-    _component_ref_t = network.pnl(componenet_type)  # reference to Lint_t
-
-    _component_ref["total_capital_cost__"] = (
-        _component_ref["capital_cost"] * _component_ref[p_opt]
-    )
-    _component_ref["total_energy__"] = _component_ref_t[p_t].sum()
-
-    # calcs on results of calcs a bove
-    _component_ref["total_variable_cost__"] = (
-        _component_ref["marginal_cost"] * _component_ref["total_energy__"]
-    )
-    _component_ref["ave_lf__"] = _component_ref["total_energy__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-
-    _component_ref["ave_cost__"] = (
-        _component_ref["total_capital_cost__"] + _component_ref["total_variable_cost__"]
-    ) / _component_ref["total_energy__"]
-
-
-def add_lines_info(network):
-    componenet_type = "Line"
-    print(f"Adding {componenet_type} info")
-    p_opt = "s_nom"
-    p_t = "p0"
-
-    _component_ref = network.df(componenet_type)  # refernce to e.g. Link
-    _component_ref_t = network.pnl(componenet_type)  # reference to Lint_t
-
-    _component_ref["total_cost__"] = (
-        _component_ref["capital_cost"] * _component_ref[p_opt]
-    )
-    _component_ref["total_energy__"] = _component_ref_t[p_t].sum()
-
-    # calcs on results of calcs a bove
-    # line does not have a marginal cost
-    # _component_ref['total_variable_cost__'] = _component_ref['marginal_cost'] * _component_ref['total_energy__']
-    _component_ref["ave_lf__"] = _component_ref["total_energy__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-
-    _component_ref["ave_cost__"] = (_component_ref["total_cost__"]) / _component_ref[
-        "total_energy__"
-    ]
-    return
-
-
-def add_storage_units_info(network):
-    componenet_type = "StorageUnit"
-    print(f"Adding {componenet_type} info")
-    p_opt = "p_nom_opt"
-    p_t_dispatch = "p_dispatch"
-    p_t_store = "p_store"
-
-    _component_ref = network.df(componenet_type)  # refernce to e.g. Link
-    _component_ref_t = network.pnl(componenet_type)  # reference to Lint_t
-
-    _component_ref["total_cost__"] = (
-        _component_ref["capital_cost"] * _component_ref[p_opt]
-    )
-
-    _component_ref["total_energy_dispatch__"] = _component_ref_t[p_t_dispatch].sum()
-    _component_ref["total_energy_store__"] = _component_ref_t[p_t_store].sum()
-
-    # calcs on results of calcs a bove
-    _component_ref["total_variable_cost_dispatch__"] = (
-        _component_ref["marginal_cost"] * _component_ref["total_energy_dispatch__"]
-    )
-    _component_ref["total_variable_cost_store__"] = (
-        _component_ref["marginal_cost"] * _component_ref["total_energy_store__"]
-    )
-
-    _component_ref["ave_lf_dispatch__"] = _component_ref["total_energy_dispatch__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-    _component_ref["ave_lf_store__"] = _component_ref["total_energy_store__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-
-    _component_ref["ave_cost__"] = (
-        _component_ref["total_cost__"]
-        + _component_ref["total_variable_cost_dispatch__"]
-        + _component_ref["total_variable_cost_store__"]
-    ) / (_component_ref["total_energy_dispatch__"])
-    return
-
-
-def add_stores_info(network):
-    componenet_type = "Store"
-    print(f"Adding {componenet_type} info")
-    p_opt = "e_nom_opt"
-    p_t = "p"
-
-    _component_ref = network.df(componenet_type)  # refernce to e.g. Link
-    _component_ref_t = network.pnl(componenet_type)  # reference to Lint_t
-
-    _component_ref["total_cost__"] = (
-        _component_ref["capital_cost"] * _component_ref[p_opt]
-    )
-
-    df = _component_ref_t[p_t]
-    _component_ref["total_energy_store__"] = df[df < 0].sum()  # all negative values
-    _component_ref["total_energy_dispatch__"] = df[df > 0].sum()  # all positive  values
-
-    # calcs on results of calcs a bove
-    _component_ref["total_variable_cost__"] = (
-        _component_ref["marginal_cost"] * _component_ref["total_energy_dispatch__"]
-    )
-
-    _component_ref["ave_lf_store__"] = _component_ref["total_energy_store__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-    _component_ref["ave_lf_dispatch__"] = _component_ref["total_energy_dispatch__"].div(
-        (_component_ref[p_opt] * 8760), np.nan
-    )  # %%
-
-    _component_ref["ave_cost__"] = (
-        _component_ref["total_cost__"] + _component_ref["total_variable_cost__"]
-    ) / _component_ref["total_energy_dispatch__"]
-    return
-
-
-def add_summaries(network):
-    """call this function"""
-    add_generator_info(network)
-    add_link_info(network)
-    add_lines_info(network)
-    add_storage_units_info(network)
-    add_stores_info(network)
-
-
 def change_element_attrib(network, component, name, attribute, value):
     """
     component : str -> 'links', 'generators' etc....
@@ -313,7 +202,8 @@ def fix_n_minus_capacities(
 
     :methodology
     -----------
-        1. This function will load the network for current_year-1 -> previous_network
+        1. This function will read the capacity ledger for current_year-1 (written by save_outputs),
+           and only if there is none load the network for current_year-1 -> previous_network
         2. It will iterate through 'nominal_attrs' = {
                                                     "Generator": "p_nom",
                                                     "Line": "s_nom",
@@ -334,212 +224,236 @@ def fix_n_minus_capacities(
     print("\n\nRunning fix_n_minus_capacities")
     print("---------------------------")
     previous_year = int(current_year) - 1
-    previous_network = None
-    try:
-        previous_network = load_network_at_year(
-            path_to_networks, current_year, previous_year
-        )
-        previous_network_loaded = True
 
-    except (AssertionError, FileNotFoundError):
-        print(
-            f"\n\nNOTE:\nThere does not seem to be a network for year={previous_year} at {path_to_networks}\n\n"
-        )
-        previous_network_loaded = False
+    # the capacity ledger saved by save_outputs, only load the whole network if there is none
+    case_folder, stage, _ = case_and_stage_from_results_folder(path_to_networks)
+    previous_ledger = read_capacity_ledger(case_folder, stage, previous_year)
 
-    if previous_network_loaded and previous_network:
-        # c ="Link","Transformer" etc,
-        # attr=['p_nom', 's_nom', 'e_nom']
-        for c, attr in nominal_attrs.items():
-            # get Index of c  Link -['Lk37_(B3_BG-B_Hwa)', 'Lk80_(B3_Coal-B_Hwa)', ...]
-            ext_i_current = current_network.get_extendable_i(c)
-            ext_i_previous = previous_network.get_extendable_i(c)
+    if previous_ledger is None:
+        try:
+            previous_network = load_network_at_year(
+                path_to_networks, current_year, previous_year
+            )
+            previous_ledger = capacity_ledger_from_network(
+                previous_network, previous_year, stage
+            )
+        except (AssertionError, FileNotFoundError):
+            print(
+                f"\n\nNOTE:\nThere does not seem to be a network for year={previous_year} at {path_to_networks}\n\n"
+            )
 
-            print("This year before setting to last")
-            print(current_network.df(c).loc[ext_i_current, attr + "_min"])
-            # set 'current_network': 'p|e|s_nom_min' to 'previous_network': 'p|e|s_nom_opt'
+    if previous_ledger is not None:
+        apply_n_minus_capacities(previous_ledger, current_network)
 
-            # old adjustment
-            # p_nom_miny = nom_opt_y_1
-            current_network.df(c).loc[ext_i_current, attr + "_min"] = (
-                previous_network.df(c).loc[ext_i_previous, attr + "_opt"]
-            )
+    print("n-minus-1 capacities fixed")
+    print("--------------------------\n\n")
+
+
+def apply_n_minus_capacities(
+    previous_ledger: pd.DataFrame, current_network: pypsa.Network
+) -> None:
+    """
+    Steps 2-4 of fix_n_minus_capacities with the previous year capacities taken from its
+    capacity ledger (see helpers/capacity_ledger.py).
+    """
+    # c ="Link","Transformer" etc,
+    # attr=['p_nom', 's_nom', 'e_nom']
+    for c, attr in nominal_attrs.items():
+        # get Index of c  Link -['Lk37_(B3_BG-B_Hwa)', 'Lk80_(B3_Coal-B_Hwa)', ...]
+        ext_i_current = current_network.get_extendable_i(c)
+        previous_nom_opt = previous_ledger.loc[
+            (previous_ledger["component"] == c) & previous_ledger["extendable"]
+        ].set_index("name")["nom_opt"]
 
-            # new adjustment
-            # if not p_nom_max  -> use p_nom
-            # if not p_nom_min  -> use 0
-            # p_nom_miny = Min(p_nom_maxy,Max(p_nom_opty-1, p_nom_miny))
+        print("This year before setting to last")
+        print(current_network.df(c).loc[ext_i_current, attr + "_min"])
+        # set 'current_network': 'p|e|s_nom_min' to 'previous_network': 'p|e|s_nom_opt'
 
-            # nom_max_y = current_network.df(c).loc[ext_i_current, attr + "_max"].iloc[0]
-            # nom_min_y = current_network.df(c).loc[ext_i_current, attr + "_min"].iloc[0]
+        # old adjustment
+        # p_nom_miny = nom_opt_y_1
+        current_network.df(c).loc[ext_i_current, attr + "_min"] = previous_nom_opt
 
-            # nom_opt_y_1 = (
-            #     previous_network.df(c).loc[ext_i_previous, attr + "_opt"].iloc[0]
-            # )
+        # new adjustment
+        # if not p_nom_max  -> use p_nom
+        # if not p_nom_min  -> use 0
+        # p_nom_miny = Min(p_nom_maxy,Max(p_nom_opty-1, p_nom_miny))
 
-            #
-            # current_network.df(c).loc[ext_i_current, attr + "_min"] = min(
-            #     nom_max_y, max(nom_opt_y_1, nom_min_y)
-            # )
+        # nom_max_y = current_network.df(c).loc[ext_i_current, attr + "_max"].iloc[0]
+        # nom_min_y = current_network.df(c).loc[ext_i_current, attr + "_min"].iloc[0]
 
-            print("This year equal to last year")
-            print(current_network.df(c).loc[ext_i_current, attr + "_min"])
-            print("Last year")
-            print(previous_network.df(c).loc[ext_i_previous, attr + "_opt"])
+        # nom_opt_y_1 = (
+        #     previous_network.df(c).loc[ext_i_previous, attr + "_opt"].iloc[0]
+        # )
 
-        # Set the list of index names in attr_zero_dict to 0
-        # exeptions
+        #
+        # current_network.df(c).loc[ext_i_current, attr + "_min"] = min(
+        #     nom_max_y, max(nom_opt_y_1, nom_min_y)
+        # )
+
+        print("This year equal to last year")
+        print(current_network.df(c).loc[ext_i_current, attr + "_min"])
+        print("Last year")
+        print(previous_nom_opt)
+
+    # Set the list of index names in attr_zero_dict to 0
+    # exeptions
+
+    attr_zero_dict = {
+        "Generator": get_list_from_dataframe_columns(
+            current_network.generators, "do_not_fix"
+        ),
+        "Link": get_list_from_dataframe_columns(current_network.links, "do_not_fix"),
+        "Line": get_list_from_dataframe_columns(current_network.lines, "do_not_fix"),
+        "Store": get_list_from_dataframe_columns(current_network.stores, "do_not_fix"),
+        "StorageUnit": get_list_from_dataframe_columns(
+            current_network.storage_units, "do_not_fix"
+        ),
+        "Transformer": [],  # add for completeness in iterations-->nominal_attrs
+    }
+
+    print("ZERO-DICT")
+    print(attr_zero_dict)
+    if attr_zero_dict:
+        for c, attr in nominal_attrs.items():
+            ext_i_current = current_network.get_extendable_i(c)
+            list_to_limit = attr_zero_dict[c]
+            ext_i_to_set = ext_i_current[ext_i_current.isin(list_to_limit)]
+            current_network.df(c).loc[ext_i_to_set, attr + "_min"] = 0
+            print(current_network.df(c).loc[ext_i_current, attr + "_min"])
 
-        attr_zero_dict = {
-            "Generator": get_list_from_dataframe_columns(
-                current_network.generators, "do_not_fix"
-            ),
-            "Link": get_list_from_dataframe_columns(
-                current_network.links, "do_not_fix"
-            ),
-            "Line": get_list_from_dataframe_columns(
-                current_network.lines, "do_not_fix"
-            ),
-            "Store": get_list_from_dataframe_columns(
-                current_network.stores, "do_not_fix"
-            ),
-            "StorageUnit": get_list_from_dataframe_columns(
-                current_network.storage_units, "do_not_fix"
-            ),
-            "Transformer": [],  # add for completeness in iterations-->nominal_attrs
-        }
 
-        print("ZERO-DICT")
-        print(attr_zero_dict)
-        if attr_zero_dict:
-            for c, attr in nominal_attrs.items():
-                ext_i_current = current_network.get_extendable_i(c)
-                list_to_limit = attr_zero_dict[c]
-                ext_i_to_set = ext_i_current[ext_i_current.isin(list_to_limit)]
-                current_network.df(c).loc[ext_i_to_set, attr + "_min"] = 0
-                print(current_network.df(c).loc[ext_i_current, attr + "_min"])
+def update_nominal_lower_bounds(network: pypsa.Network, m: linopy.Model) -> None:
+    """
+    Push the current 'p|e|s_nom_min' values of the network into a model that was already built.
 
-    print("n-minus-1 capacities fixed")
-    print("--------------------------\n\n")
+    PyPSA only uses '*_nom_min' in the '<c>-ext-<attr>-lower' constraints, so a model can be built
+    before the previous year is solved and the lower bounds set afterwards.
+    """
+    for c, attr in nominal_attrs.items():
+        name = f"{c}-ext-{attr}-lower"
+        if name not in m.constraints:
+            continue
+        con = m.constraints[name]
+        ext_i = con.rhs.indexes[con.rhs.dims[0]]
+        lower = network.df(c)[attr + "_min"].reindex(ext_i)
+        con.rhs = con.rhs.copy(data=lower.values)
+        print(f"Updated {name} for {len(ext_i)} extendable {c}")
+
+
+def _select_along(var: linopy.Variable, dim: str, names, new_dim: str, labels):
+    """var at the 'names' of 'dim', as a new dimension 'new_dim' with coordinates 'labels'"""
+    return var.sel(
+        {dim: xr.DataArray(list(names), coords={new_dim: list(labels)}, dims=new_dim)}
+    )
 
 
 def fix_links_capacity(network: pypsa.Network, m: linopy.model):
     # Link1 - for this link
     # Link2_- equate to link in col = 'link_relationship'
+    # all the pairs are added as one constraint block 'fix_links_capacity' over 'Link-relationship'
     print("\nfix_link_capacity")
     print("---------------------------")
     df: pd.DataFrame = network.links
 
-    if "link_relationship" in df.columns:
-        if not df["link_relationship"].isna().all():
-            filtered_df: pd.DataFrame = df[
-                df["link_relationship"].apply(
-                    lambda x: isinstance(x, str) and len(str(x)) > 0
-                )  # Ensure it's a string and not empty
-                & df["link_relationship"].ne("0")  # Remove "0"
-                & df["link_relationship"].notna()  # Remove NaN values
-            ]
-
-            # TODO ? we actualy need to test if right link is in fact in the list of left links?
-
-            # get the links variable for p_nom
-            link_capacity_var: linopy.Variable = m.variables["Link-p_nom"]
-
-            # iterate through all the links with 'link_relationship' added and set constraint
-            for index_link, right_link in filtered_df["link_relationship"].items():
-                if index_link and right_link:  # check if the links exist
-
-                    # now check extendable?
-                    index_link_extendable: bool = df.loc[df.index == index_link][
-                        "p_nom_extendable"
-                    ].values[0]
-                    right_link_extendable: bool = df.loc[right_link]["p_nom_extendable"]
-
-                    # only add constraint if both is extendable
-                    if index_link_extendable and right_link_extendable:
-                        lhs: linopy.LinearExpression = (
-                            link_capacity_var.loc[index_link]
-                            - link_capacity_var.loc[right_link]
-                        )
-                        m.add_constraints(
-                            lhs == 0, name=f"fix_{index_link}_{right_link}_capacity"
-                        )
-                        print(
-                            f" - Added fix link capacity for |{index_link}| and |{right_link}|"
-                        )
-                    else:
-                        # Both not extendable. Let user know.
-                        print(
-                            "Links Capacity - Links extendability criteria not met for:"
-                        )
-                        print(f"{index_link} extendable {index_link_extendable}")
-                        print(f"{right_link} extendable {right_link_extendable}")
-                else:
-                    # MMMM .....
-                    print("Whe should not reach here!s")
-        else:
-            print("link_relationship column is only NaN")
-    else:
+    if "link_relationship" not in df.columns:
         print("'link_relationship' column not found in the Link definition.")
+        print("---------------------------\n")
+        return
+    if df["link_relationship"].isna().all():
+        print("link_relationship column is only NaN")
+        print("---------------------------\n")
+        return
+
+    relationship = df["link_relationship"]
+    pairs = relationship[
+        relationship.apply(lambda x: isinstance(x, str) and len(str(x)) > 0)
+        & relationship.ne("0")
+    ].rename("right_link")
+    pairs = pairs.reset_index().rename(
+        columns={pairs.index.name or "index": "left_link"}
+    )
+
+    unknown = ~pairs["right_link"].isin(df.index)
+    for left_link, right_link in pairs.loc[unknown, ["left_link", "right_link"]].values:
+        print(
+            f"Links Capacity - {right_link} (related to {left_link}) is not a link, skipped"
+        )
+    pairs = pairs[~unknown]
+
+    # only add constraint if both is extendable
+    extendable = df["p_nom_extendable"].astype(bool)
+    both_extendable = (
+        extendable.reindex(pairs["left_link"]).values
+        & extendable.reindex(pairs["right_link"]).values
+    )
+    for left_link, right_link in pairs.loc[
+        ~both_extendable, ["left_link", "right_link"]
+    ].values:
+        print("Links Capacity - Links extendability criteria not met for:")
+        print(f"{left_link} extendable {extendable[left_link]}")
+        print(f"{right_link} extendable {extendable[right_link]}")
+    pairs = pairs[both_extendable]
+
+    if pairs.empty:
+        print("No link capacities to fix")
+        print("---------------------------\n")
+        return
+
+    link_capacity_var: linopy.Variable = m.variables["Link-p_nom"]
+    dim = "Link-relationship"
+    lhs = _select_along(
+        link_capacity_var, "Link-ext", pairs["left_link"], dim, pairs["left_link"]
+    ) - _select_along(
+        link_capacity_var, "Link-ext", pairs["right_link"], dim, pairs["left_link"]
+    )
+    m.add_constraints(lhs == 0, name="fix_links_capacity")
+    for left_link, right_link in pairs[["left_link", "right_link"]].values:
+        print(f" - Added fix link capacity for |{left_link}| and |{right_link}|")
     print("---------------------------\n")
 
 
 def fix_link_battery_capacity(network: pypsa.Network, m: linopy.model):
+    """
+    the p_nom of the link in a storage unit's 'su_link_mw' column equals the storage unit p_nom,
+    added as one constraint block 'Link-battery' over 'StorageUnit-link'
+    """
     print("\nfix_link_battery_capacity")
     print("---------------------------")
-    link_battery_capacity_definitions = []
     storage_units = network.storage_units
+    if "su_link_mw" not in storage_units.columns:
+        print("Current year - does not have any StorageUnit / Battery definition.")
+        print("---------------------------")
+        return
 
-    for i, storage_unit in enumerate(storage_units.itertuples(index=True)):
-        if storage_unit.su_link_mw != None and type(storage_unit.su_link_mw) == str:
-            link_battery_capacity_definitions.append(
-                {
-                    "name": f"Link-battery_{storage_unit.Index}",
-                    "link_capacity_loc": storage_unit.su_link_mw,  # Left
-                    "battery_capacity_loc": storage_unit.Index,  # Right
-                }
-            )
-    print(link_battery_capacity_definitions)
-    # link_battery_capacity_definitions = [
-    #     {
-    #         "name": "Link-battery_Pensulo",
-    #         "link_capacity_loc": "Lk196_(B1_BES_Pen-B_Pensulo)",
-    #         "battery_capacity_loc": "D-BES_Pen",
-    #     },
-    #     {
-    #         "name": "Link-battery_Chi",
-    #         "link_capacity_loc": "Lk197_(B1_BES_Chi-B_Chipata)",
-    #         "battery_capacity_loc": "D-BES_Chi",
-    #     },
-    #     {
-    #         "name": "Link-battery_Kit",
-    #         "link_capacity_loc": "Lk198_(B1_BES_Kit-B_Kitwe)",
-    #         "battery_capacity_loc": "D-BES_Kit",
-    #     },
-    #     {
-    #         "name": "Link-battery_Kas",
-    #         "link_capacity_loc": "Lk199_(B1_BES_Kas-B_Kasama)",
-    #         "battery_capacity_loc": "D-BES_Kas",
-    #     },
-    #     {
-    #         "name": "Link-battery_Lus",
-    #         "link_capacity_loc": "Lk200_(B1_BES_Lus-B_Lusaka-W)",
-    #         "battery_capacity_loc": "D-BES_Lus",
-    #     },
-    # ]
+    su_link = storage_units["su_link_mw"]
+    su_link = su_link[su_link.apply(lambda x: isinstance(x, str))]
+    print(su_link.to_dict())
 
     try:
         link_capacity = m.variables["Link-p_nom"]
         battery_capacity = m.variables["StorageUnit-p_nom"]
-
-        for bcd in link_battery_capacity_definitions:
-            lhs = (
-                link_capacity.loc[bcd["link_capacity_loc"]]
-                - battery_capacity.loc[bcd["battery_capacity_loc"]]
-            )
-            m.add_constraints(lhs == 0, name=bcd["name"])
     except KeyError:
         print("Current year - does not have any StorageUnit / Battery definition.")
+        print("---------------------------")
+        return
+
+    # both capacities need to be variables, i.e. extendable
+    known = su_link.isin(link_capacity.indexes["Link-ext"]) & su_link.index.isin(
+        battery_capacity.indexes["StorageUnit-ext"]
+    )
+    for storage_unit, link in su_link[~known].items():
+        print(f"Battery {storage_unit} or link {link} is not extendable, skipped")
+    su_link = su_link[known]
+
+    if not su_link.empty:
+        dim = "StorageUnit-link"
+        lhs = _select_along(
+            link_capacity, "Link-ext", su_link.values, dim, su_link.index
+        ) - _select_along(
+            battery_capacity, "StorageUnit-ext", su_link.index, dim, su_link.index
+        )
+        m.add_constraints(lhs == 0, name="Link-battery")
+        print(f"Added Link-battery capacity constraints for {list(su_link.index)}")
     print("---------------------------")
 
 
@@ -770,7 +684,13 @@ def check_none_gte_0(val_to_check):
 
 
 def add_hydro_turnine_efficiency(network: pypsa.Network, m):
-    hydro_turnine_efficiency_definition = []
+    """
+    loss_link_p <= store_coefficient * store_e / store_e_nom + flow_coefficient * flow_link_p / flow_link_p_nom
+                   + store_constant
+
+    for every link with a 'flow_link' and 'store_eff', added as one constraint block 'Turbine_eff'
+    over the 'Turbine' dimension (the loss links).
+    """
     links = network.links
     print("\n\nHydro efficiency - stores")
     print("-------------------------")
@@ -778,96 +698,90 @@ def add_hydro_turnine_efficiency(network: pypsa.Network, m):
     flow_link_present = "flow_link" in links.columns
     store_eff_present = "store_eff" in links.columns
 
-    if flow_link_present and store_eff_present:  # both columns needs to be present
-        for i, link in enumerate(links.itertuples(index=True)):
-            if (link.flow_link != 0 and link.flow_link != "0") and (
-                link.store_eff != 0 and link.store_eff != "0"
-            ):
-                print(f"!!{i} -- {link.flow_link}")
-                print(f"!!{i} -- {link.store_eff}")
-                hydro_turnine_efficiency_definition.append(
-                    {
-                        "name": f"Turbine{i}_eff",
-                        "loss_link": link.Index,  # name of Link where we are
-                        "flow_link": link.flow_link,
-                        "store": link.store_eff,
-                    }
-                )
+    if not (
+        flow_link_present and store_eff_present
+    ):  # both columns needs to be present
+        print(
+            f"flow_link present: {flow_link_present} or store_eff presnt {store_eff_present} not both true, skipping - add_hydro_turnine_efficiency"
+        )
+        return
+
+    def is_set(col):
+        return links[col].notna() & links[col].ne(0) & links[col].ne("0")
 
-        print(hydro_turnine_efficiency_definition)
+    turbines = links[is_set("flow_link") & is_set("store_eff")]
+    if turbines.empty:
+        print("No hydro turbines found")
         print("-------------------------\n\n")
+        return
 
-        for i, hte in enumerate(hydro_turnine_efficiency_definition):
-            name = hte["name"]
-            loss_link = hte["loss_link"]
-            flow_link = hte["flow_link"]
-            store = hte["store"]
-
-            # variable
-            # Select spesific Link, Store and Generators from the network.model.variables
-            var_loss_link_p = m.variables["Link-p"].sel(Link=loss_link)
-            var_flow_link_p = m.variables["Link-p"].sel(Link=flow_link)
-            var_store_e = m.variables["Store-e"].sel(Store=store)  # This is store
-
-            # Variable set in the Link file
-            store_coefficient = network.links.at[
-                loss_link, "store_coefficient"  # 'store_min_p'
-            ]
-            flow_coefficient = network.links.at[
-                loss_link, "flow_coefficient"
-            ]  # 'store_min_p'
-            store_constant = network.links.at[
-                loss_link, "store_constant"
-            ]  # 'store_min_p'
-
-            # Pyps set values in Stores file
-            # store_e_min_pu = network.stores.at[store, "e_min_pu"]  # 'store_min_p'
-            store_e_nom = network.stores.at[store, "e_nom"]
-            flow_link_p_nom = network.links.at[flow_link, "p_nom"]
-            loss_link_p_nom = network.links.at[loss_link, "p_nom"]
-
-            #
-            term1 = var_store_e / store_e_nom
-            term2 = var_flow_link_p / flow_link_p_nom
-
-            rhs = (
-                store_coefficient * term1 + (flow_coefficient * term2) + store_constant
-            )
+    loss_links = turbines.index
+    flow_links = turbines["flow_link"].values
+    stores = turbines["store_eff"].values
+
+    # Pyps set values in Stores and Links file, and the coefficients set in the Link file
+    store_e_nom = network.stores["e_nom"].reindex(stores).values
+    flow_link_p_nom = links["p_nom"].reindex(flow_links).values
+    definition = pd.DataFrame(
+        {
+            "flow_link": flow_links,
+            "store": stores,
+            "store_coefficient": turbines["store_coefficient"].values,
+            "flow_coefficient": turbines["flow_coefficient"].values,
+            "store_constant": turbines["store_constant"].values,
+            "flow_link_p_nom": flow_link_p_nom,
+            "loss_link_p_nom": turbines["p_nom"].values,
+            "store_e_nom": store_e_nom,
+        },
+        index=loss_links,
+    )
+    print(definition.to_string())
+    print("-------------------------\n\n")
 
-            constraint = var_loss_link_p <= rhs
-
-            m.add_constraints(constraint, name=name)
-
-            print("*********************************************")
-            print("Reference setup")
-            print(f"loss_link:              {loss_link:<20}")
-            print(f"flow_link:              {flow_link:<20}")
-            print(f"store:                  {store:<20}")
-            print("--------------------------------------------")
-            print("Constants")
-            print(f"store_coefficient:      {store_coefficient:<20}")
-            print(f"flow_coefficient:       {flow_coefficient:<20}")
-            print(f"store_constant:         {store_constant:<20}")
-            print(f"flow_link_p_nom:        {flow_link_p_nom:<20}")
-            print(f"loss_link_p_nom:        {loss_link_p_nom:<20}")
-            print(f"store_e_nom:            {store_e_nom:<20}")
-            print(
-                f"Constraint string: var_loss_link_p >= = [store_coefficient * term1 + (flow_coefficient * term2) + store_constant]"
-            )
-            print("*********************************************")
-    else:
-        print(
-            f"flow_link present: {flow_link_present} or store_eff presnt {store_eff_present} not both true, skipping - add_hydro_turnine_efficiency"
+    dim = "Turbine"
+
+    def along_turbines(values):
+        return xr.DataArray(
+            np.asarray(values, dtype=float), coords={dim: list(loss_links)}, dims=dim
         )
 
+    var_loss_link_p = _select_along(
+        m.variables["Link-p"], "Link", loss_links, dim, loss_links
+    )
+    var_flow_link_p = _select_along(
+        m.variables["Link-p"], "Link", flow_links, dim, loss_links
+    )
+    var_store_e = _select_along(
+        m.variables["Store-e"], "Store", stores, dim, loss_links
+    )
+
+    store_term = along_turbines(
+        definition["store_coefficient"] / definition["store_e_nom"]
+    )
+    flow_term = along_turbines(
+        definition["flow_coefficient"] / definition["flow_link_p_nom"]
+    )
+
+    lhs = var_loss_link_p - store_term * var_store_e - flow_term * var_flow_link_p
+    m.add_constraints(
+        lhs <= along_turbines(definition["store_constant"]), name="Turbine_eff"
+    )
+    print(f"Added Turbine_eff for {len(loss_links)} turbines")
+    print(
+        "Constraint string: var_loss_link_p <= [store_coefficient * store_e / store_e_nom "
+        "+ flow_coefficient * flow_link_p / flow_link_p_nom + store_constant]"
+    )
+
 
 def load_network_at_year(path_to_networks: Path | str, current_year, previous_year):
     """
     Load a network at the path 'path_to_networks' for  'year'
     """
-    n = pypsa.Network()
-    n.import_from_csv_folder(
-        Path(path_to_networks.replace(str(current_year), str(previous_year)))
+    # '<case>/<current_year>/Results_opt' -> '<case>/<previous_year>/Results_opt'
+    path_to_networks = Path(path_to_networks)
+    assert path_to_networks.parent.name == str(current_year)
+    n = load_network_cached(
+        path_to_networks.parent.parent / str(previous_year) / path_to_networks.name
     )
     return n
 
@@ -911,30 +825,49 @@ def get_scenarios_paths(
     if not os.path.exists(results_folder_name):
         os.makedirs(results_folder_name)
 
+    check_results_folder_unlocked(results_folder_name)
+
+    return inputs_folder_name, results_folder_name
+
+
+def beep(frequency, duration_ms):
+    """sound on Windows, winsound does not exist on Linux servers"""
+    try:
+        import winsound
+
+        winsound.Beep(frequency, duration_ms)
+    except (ImportError, RuntimeError):
+        pass
+
+
+def open_csv_with_user_retry(file_path, max_retries=3):
     # Start of Morne's Code
-    folder_path = results_folder_name
-
-    def open_csv_with_user_retry(file_path, max_retries=3):
-        retries = 0
-        while retries < max_retries:
-            try:
-                with open(file_path, "a") as csv_file:
-                    csv_file = csv_file
-                return  # Success, exit the function
-            except PermissionError:
-                retries += 1
-                if retries < max_retries:
-                    winsound.Beep(2000, 500)
-                    winsound.Beep(2000, 500)
-                    print(
-                        f"Permission error for {file_path}. Please close the file and press Enter to retry."
-                    )
-                    input()  # Wait for user input before retrying
+    retries = 0
+    while retries < max_retries:
+        try:
+            with open(file_path, "a") as csv_file:
+                csv_file = csv_file
+            return  # Success, exit the function
+        except PermissionError:
+            retries += 1
+            if retries < max_retries:
+                beep(2000, 500)
+                beep(2000, 500)
+                if sys.stdin is None or not sys.stdin.isatty():
+                    # headless (cli.py on a server), nobody to press Enter
+                    print(f"Permission error for {file_path}. Retrying in 10 seconds.")
+                    time.sleep(10)
+                    continue
+                print(
+                    f"Permission error for {file_path}. Please close the file and press Enter to retry."
+                )
+                input()  # Wait for user input before retrying
 
-        print(f"Failed to open {file_path} after {max_retries} retries.")
+    print(f"Failed to open {file_path} after {max_retries} retries.")
 
-    # List all files in the folder
 
+def check_results_folder_unlocked(folder_path):
+    """try to open every csv in the results folder, and ask the user to close the locked ones"""
     if not (os.path.exists(folder_path)):
         print("Results folder does not exist")
     if os.path.exists(folder_path):
@@ -946,7 +879,67 @@ def get_scenarios_paths(
                 file_path = os.path.join(folder_path, filename)
                 open_csv_with_user_retry(file_path)
 
-    return inputs_folder_name, results_folder_name
+
+def get_year_paths(
+    scenario_folder: str | Path,
+    year,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
+):
+    """
+    Same folders as get_scenarios_paths, but built from an absolute scenario folder
+    and not from os.getcwd(), so it is safe to call from a worker process.
+
+    Returns the inputs and results folder as str and creates the results folder.
+    """
+    scenario_folder = Path(scenario_folder)
+    if not scenario_folder.is_absolute():
+        raise ValueError(
+            f"scenario_folder must be an absolute path, got '{scenario_folder}'"
+        )
+    inputs_folder_name = scenario_folder / str(year) / child_inputs_folder
+    results_folder_name = scenario_folder / str(year) / child_results_folder
+    results_folder_name.mkdir(parents=True, exist_ok=True)
+    return str(inputs_folder_name), str(results_folder_name)
+
+
+def run_preflight(
+    scenario_folder,
+    years,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
+) -> pd.DataFrame:
+    """
+    check the inputs and results folders of all the years before anything is solved, see
+    helpers/preflight.py. Every problem is printed and saved to '<case>/preflight_<stage>.csv',
+    and a PreflightError is raised when there is any.
+    """
+    scenario_folder = Path(scenario_folder).absolute()
+    year_paths = {
+        year: (
+            scenario_folder / str(year) / child_inputs_folder,
+            scenario_folder / str(year) / child_results_folder,
+        )
+        for year in years
+    }
+    print(f"\nPre-flight check of {len(year_paths)} years")
+    print("---------------------------")
+    problems = preflight_checks(year_paths)
+    report_file = scenario_folder / f"preflight_{child_results_folder}.csv"
+    if problems.empty:
+        if report_file.exists():
+            report_file.unlink()
+        print("[ INFO ] - All years passed the pre-flight check")
+        print("---------------------------\n")
+        return problems
+
+    problems.to_csv(report_file, index=False)
+    print(problems.to_string(index=False))
+    print("---------------------------\n")
+    raise PreflightError(
+        f"Pre-flight check found {len(problems)} problems in "
+        f"{problems['year'].nunique()} years, nothing was solved. See {report_file}"
+    )
 
 
 def set_cplex_licence_key():
@@ -957,8 +950,8 @@ def set_cplex_licence_key():
 
 
 def load_and_prepare_network(inputs_folder_name, add_multi_index=True):
-    network = pypsa.Network()
-    network.import_from_csv_folder(inputs_folder_name)
+    network = load_network_cached(inputs_folder_name)
+    drop_legacy_summary_columns(network)
     if add_multi_index:
         add_multi_index_investment_periods(network)
     return network
@@ -978,44 +971,38 @@ def network_statistics_output(
     if len(grouper_list) == 0:
         grouper_list = ["carrier"]
 
+    # the full pypsa statistics table, computed once
+    z_stats = network.statistics()
+    print("In network statistics")
+    print("---------------------")
     try:
-        z_stats = network.statistics()
-        print("In network statistics")
-        print("---------------------")
         z_stats["ave_cost"] = (
             z_stats["Capital Expenditure"] + z_stats["Operational Expenditure"]
         ) / z_stats["Transmission"]
-        z_stats.to_csv(output_folder / f"{p}statistics.csv")
-    except:
-        network.statistics().to_csv(output_folder / f"{p}statistics.csv")
-
-    installed_capex: pd.DataFrame = network.statistics.installed_capex(
-        groupby=grouper_list
-    )
-    installed_capex.to_csv(output_folder / f"{p}installed_capex.csv")
-
-    expanded_capex: pd.DataFrame = network.statistics.expanded_capex(
-        groupby=grouper_list
-    )
-    expanded_capex.to_csv(output_folder / f"{p}expanded_capex.csv")
-
-    optimal_capacity: pd.DataFrame = network.statistics.optimal_capacity(
-        groupby=grouper_list
-    )
-    optimal_capacity.to_csv(output_folder / f"{p}optimal_capacity.csv")
-
-    installed_capacity: pd.DataFrame = network.statistics.installed_capacity(
-        groupby=grouper_list
-    )
-    installed_capacity.to_csv(output_folder / f"{p}installed_capacity.csv")
-
-    expanded_capacity: pd.DataFrame = network.statistics.expanded_capacity(
-        groupby=grouper_list
-    )
-    expanded_capacity.to_csv(output_folder / f"{p}expanded_capacity.csv")
+    except KeyError:
+        pass
+    z_stats.to_csv(output_folder / f"{p}statistics.csv")
+
+    # capacities and capex of all components in a single pass
+    component_stats = compute_component_statistics(network, grouper_list)
+    component_stats.to_csv(output_folder / f"{p}component_statistics.csv")
+    for metric, file_name in Z_FILES.items():
+        metric_frame(component_stats, metric).to_csv(
+            output_folder / f"{p}{file_name}.csv"
+        )
 
 
-def save_outputs(network, scenario_folder, year, results_folder_name):
+def save_outputs(
+    network, scenario_folder, year, results_folder_name, writer=None, timer=None
+):
+    """
+    writer: a BackgroundResultsWriter (helpers/background_writer.py). When given the csv export and
+    the statistics are queued and written in the background, the capacity ledger is always written
+    straight away because the next year needs it. The timer then only sees the queueing.
+    timer: a StageTimer (helpers/stage_timer.py)
+    """
+    timer = timer or StageTimer()
+    queued = "" if writer is None else "_queued"
     if True:
         print("****************************************")
         print("Last run completed: ", scenario_folder)
@@ -1023,10 +1010,36 @@ def save_outputs(network, scenario_folder, year, results_folder_name):
         print("Year completed: ", year)
         print("****************************************")
         print("")
-        winsound.Beep(1000, 1000)
-        network.export_to_csv_folder(results_folder_name)
+        beep(1000, 1000)
+        with timer.stage(f"export{queued}"):
+            if writer is None:
+                network.export_to_csv_folder(results_folder_name)
+            else:
+                writer.export_to_csv_folder(network, results_folder_name)
+        with timer.stage("capacity_ledger"):
+            write_capacity_ledger(network, results_folder_name, year)
+
+        summary_file = Path(results_folder_name) / "z_component_summary.csv"
+        with timer.stage(f"component_summary{queued}"):
+            if writer is None:
+                component_summary(network).to_csv(summary_file)
+            else:
+                writer.submit(
+                    str(summary_file),
+                    lambda: component_summary(network).to_csv(summary_file),
+                )
 
-        network_statistics_output(network, "carrier", Path(results_folder_name))
+        with timer.stage(f"statistics{queued}"):
+            if writer is None:
+                network_statistics_output(network, "carrier", Path(results_folder_name))
+            else:
+                writer.submit(
+                    f"{results_folder_name} statistics",
+                    network_statistics_output,
+                    network,
+                    "carrier",
+                    Path(results_folder_name),
+                )
         # try:
         #     print("In network statisics")
         #     z_stats = network.statistics()
@@ -1119,8 +1132,8 @@ def copy_file(from_dir, to_dir, filename):
     print(f"\n\nFile {filename} copied from {from_dir} to {to_dir}\n\n")
 
 
-def print_cplex_options():
-    """A helper function to print all the cplex option
+def print_cplex_options(solver_profile=None):
+    """A helper function to print all the cplex option, the ones a solver_profile changes are marked *
     Parameter                                           Value
     =========                                           =====
     advance                                             1
@@ -1312,116 +1325,968 @@ def print_cplex_options():
         import cplex
 
         empty_problem = cplex.Cplex()
+        if solver_profile:
+            apply_cplex_options(empty_problem, solver_profile_options(solver_profile))
+            print(f"Solver profile: {solver_profile}")
         parameters = empty_problem.parameters.get_all()
+        changed = {str(p[0]) for p in empty_problem.parameters.get_changed()}
 
         print(f"{'Parameter':<50}  Value")
         print(f"{'=========':<50}  =====")
         for p in parameters:
-            print(f"{str(p[0]).replace('parameters.',''):<50}  {p[1]}")
+            mark = "*" if str(p[0]) in changed else ""
+            print(f"{str(p[0]).replace('parameters.','') + mark:<50}  {p[1]}")
 
     except:
         print("CPLEX solver is not installed.")
 
 
-def run_unconstrained_expansion(
-    scenario_folder,
-    years,
-    child_inputs_folder="Inputs",
-    child_results_folder="Results_uc",
-    use_lpmethod_4=True,
-):
-    print_study_start_info(child_inputs_folder, child_results_folder)
+def get_cplex_options(use_lpmethod_4=True, threads=None, solver_profile=None) -> dict:
+    """solver_profile is a name in SOLVER_PROFILES (helpers/solver_profiles.py), it replaces use_lpmethod_4"""
+    if solver_profile:
+        return solver_profile_options(solver_profile, threads=threads)
 
-    for year in years:
-        inputs_folder_name, results_folder_name = get_scenarios_paths(
-            year,
-            scenario_folder,
-            child_inputs_folder=child_inputs_folder,
-            child_results_folder=child_results_folder,
-        )
+    if use_lpmethod_4:
+        cplex_option = {"lpmethod": 4}  # no crossover
+    else:
+        cplex_option = {}
 
-        network = load_and_prepare_network(inputs_folder_name, add_multi_index=True)
+    if threads:
+        cplex_option["threads"] = int(threads)
+    return cplex_option
 
-        m = network.optimize.create_model(multi_investment_periods=True)
+
+def add_custom_constraints(
+    network: pypsa.Network,
+    m,
+    inputs_folder_name,
+    lazy_reserves=False,
+    timer=None,
+    sparse_reserves=True,
+):
+    """
+    the custom constraint chain that is added to every study model after create_model.
+    lazy_reserves=True adds the reserve rows per snapshot only when they are violated, see
+    LazyReserveConstraints in pypsa_toolbox/reserves.py
+    sparse_reserves=False uses the reserve blocks per level and area, see add_all_reserve_constraints
+    """
+    timer = timer or StageTimer()
+    with timer.stage("hydro_turbine_efficiency", model=m):
         add_hydro_turnine_efficiency(network, m)
+    with timer.stage("link_battery_capacity", model=m):
         fix_link_battery_capacity(network, m)
+    with timer.stage("links_capacity", model=m):
         fix_links_capacity(network, m)
-        add_all_reserve_constraints(network, m, inputs_folder_name + r"\reserves.csv")
-
-        if use_lpmethod_4:
-            cplex_option = {"lpmethod": 4}  # no crossover
-        else:
-            cplex_option = {}
-
-        network.optimize.solve_model(solver_name="cplex", solver_options=cplex_option)
+    with timer.stage("reserves", model=m):
+        add_all_reserve_constraints(
+            network,
+            m,
+            os.path.join(inputs_folder_name, "reserves.csv"),
+            sparse=sparse_reserves,
+            lazy=lazy_reserves,
+        )
 
-        add_summaries(network)
 
-        save_outputs(network, scenario_folder, year, results_folder_name)
+def prepare_unconstrained_network(
+    inputs_folder_name, results_folder_name, year, timer=None
+):
+    timer = timer or StageTimer()
+    with timer.stage("load_csv"):
+        return load_and_prepare_network(inputs_folder_name, add_multi_index=True)
 
-        copy_file(inputs_folder_name, results_folder_name, "reserves.csv")
-        copy_file(inputs_folder_name, results_folder_name, "inc_load.csv")
 
+def prepare_optimum_network(
+    inputs_folder_name, results_folder_name, year, fix_n_minus=True, timer=None
+):
+    """
+    fix_n_minus=False leaves the '*_nom_min' as loaded, used when the previous year is still
+    being solved and apply_n_minus_capacities is called once it is done.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("load_csv"):
+        network = load_and_prepare_network(inputs_folder_name, add_multi_index=True)
+    if fix_n_minus:
+        with timer.stage("fix_n_minus_capacities"):
+            fix_n_minus_capacities(
+                path_to_networks=results_folder_name,
+                current_network=network,
+                current_year=year,
+            )
     return network
 
 
-def run_optimum_expansion(
-    scenario_folder,
-    years,
-    child_inputs_folder="Results_uc",
-    child_results_folder="Results_opt",
-    use_lpmethod_4=True,
+def prepare_incremental_network(
+    inputs_folder_name, results_folder_name, year, timer=None
 ):
-    print_study_start_info(child_inputs_folder, child_results_folder)
+    timer = timer or StageTimer()
+    with timer.stage("load_csv"):
+        network = load_and_prepare_network(inputs_folder_name, add_multi_index=True)
 
-    for year in years:
-        inputs_folder_name, results_folder_name = get_scenarios_paths(
-            year,
-            scenario_folder,
-            child_inputs_folder=child_inputs_folder,
-            child_results_folder=child_results_folder,
-        )
+    with timer.stage("incremental_demand"):
+        # make extentable
+        make_all_non_extendable(network)
 
-        network = load_and_prepare_network(inputs_folder_name, add_multi_index=True)
+        make_extendable(network)
+        increase_load_fixed(network, inputs_folder_name)
 
-        fix_n_minus_capacities(
-            path_to_networks=results_folder_name,
-            current_network=network,
-            current_year=year,
-        )
+        # remove all proxy plants (3/7/2024)
+        remove_proxy_plant(network)
+    return network
 
-        m = network.optimize.create_model(multi_investment_periods=True)
-        add_hydro_turnine_efficiency(network, m)
-        fix_link_battery_capacity(network, m)
-        fix_links_capacity(network, m)
-        add_all_reserve_constraints(network, m, inputs_folder_name + r"\reserves.csv")
 
-        if use_lpmethod_4:
-            cplex_option = {"lpmethod": 4}  # no crossover
-        else:
-            cplex_option = {}
+def prepare_screening_network(
+    inputs_folder_name,
+    results_folder_name,
+    year,
+    period_hours=24,
+    n_periods=12,
+    timer=None,
+):
+    """the unconstrained network reduced to representative days or weeks, see helpers/representative_periods.py"""
+    timer = timer or StageTimer()
+    network = prepare_unconstrained_network(
+        inputs_folder_name, results_folder_name, year, timer=timer
+    )
+    with timer.stage("representative_periods"):
+        selection = reduce_to_representative_periods(network, period_hours, n_periods)
+    selection.to_csv(
+        Path(results_folder_name) / "z_representative_periods.csv", index=False
+    )
+    return network
 
-        network.optimize.solve_model(solver_name="cplex", solver_options=cplex_option)
 
-        add_summaries(network)
+def build_study_model(
+    network: pypsa.Network,
+    inputs_folder_name,
+    lazy_reserves=False,
+    timer=None,
+    sparse_reserves=True,
+):
+    timer = timer or StageTimer()
+    with timer.stage("create_model") as stage:
+        m = network.optimize.create_model(multi_investment_periods=True)
+        stage["model"] = m
+    add_custom_constraints(
+        network,
+        m,
+        inputs_folder_name,
+        lazy_reserves=lazy_reserves,
+        timer=timer,
+        sparse_reserves=sparse_reserves,
+    )
+    return m
 
-        save_outputs(network, scenario_folder, year, results_folder_name)
 
-        copy_file(inputs_folder_name, results_folder_name, "reserves.csv")
-        copy_file(inputs_folder_name, results_folder_name, "inc_load.csv")
+# results stage -> (inputs stage, network preparer)
+STAGES = {
+    "Results_uc": ("Inputs", prepare_unconstrained_network),
+    "Results_opt": ("Results_uc", prepare_optimum_network),
+    "Results_opti": ("Results_opt", prepare_incremental_network),
+}
 
-    return network
 
+def capture_study_model(scenario_folder, year, child_results_folder="Results_uc"):
+    """
+    build the model of one stage and year, with the custom constraints, and write it as an LP file to
+    '<case>/<year>/.tuning/<stage>.lp'. Nothing is solved and the results folder is not written.
+    """
+    child_inputs_folder, prepare_network = STAGES[child_results_folder]
+    inputs_folder_name, results_folder_name = get_year_paths(
+        Path(scenario_folder).absolute(),
+        year,
+        child_inputs_folder,
+        child_results_folder,
+    )
+    network = prepare_network(inputs_folder_name, results_folder_name, year)
+    m = build_study_model(network, inputs_folder_name)
 
-def run_incremental_demand_expansion(
+    lp_file = (
+        Path(results_folder_name).parent / ".tuning" / f"{child_results_folder}.lp"
+    )
+    lp_file.parent.mkdir(exist_ok=True)
+    m.to_file(lp_file)
+    print(f"[ INFO ] - Model captured to {lp_file}")
+    return lp_file
+
+
+MODEL_SIZE_COLUMNS = [
+    "stage",
+    "year",
+    "built_from",
+    "variables",
+    "constraints",
+    "nonzeros",
+    "hydro_efficiency_constraints",
+    "link_relationship_constraints",
+    "reserves_constraints",
+    "build_time_s",
+    "model_rss_mb",
+    "estimated_peak_mb",
+    "history_peak_mb",
+    "error",
+]
+# constraint family -> the last timer stage of it in add_custom_constraints
+CUSTOM_CONSTRAINT_STAGES = {
+    "hydro_efficiency": "hydro_turbine_efficiency",
+    "link_relationship": "links_capacity",
+    "reserves": "reserves",
+}
+
+
+def model_size_file(scenario_folder, stage) -> Path:
+    return Path(scenario_folder) / f"model_size_{stage}.csv"
+
+
+def preview_model_sizes(
     scenario_folder,
     years,
-    child_inputs_folder="Results_opt",
-    child_results_folder="Results_opti",
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
+    prepare_network=None,
+    lazy_reserves=False,
+) -> pd.DataFrame:
+    """
+    Dry run of a stage: build the model of every year with the custom constraints but do not solve
+    it, and return the variables, constraints, nonzeros (also per custom constraint family), build
+    time and memory of every year. Saved as '<case>/model_size_<stage>.csv', nothing else is written.
+
+    estimated_peak_mb is the RSS after the build plus the solver's share of the nonzeros (see
+    helpers/admission.py), history_peak_mb the peak admission control expects from run_metrics.csv.
+    A year whose inputs folder has no csv files yet (its previous stage is not solved) is built from
+    its Inputs folder, the networks of the later stages hold the same components.
+    """
+    import gc
+
+    scenario_folder = Path(scenario_folder).absolute()
+    if prepare_network is None:
+        prepare_network = STAGES[child_results_folder][1]
+    if prepare_network is prepare_optimum_network:
+        # the capacities of year N-1 change the bounds only, not the size
+        prepare_network = partial(prepare_optimum_network, fix_n_minus=False)
+    run_metrics = read_run_metrics(scenario_folder)
+
+    print(f"\nModel size preview of {child_results_folder}, {len(years)} years")
+    print("---------------------------")
+    rows = []
+    for year in years:
+        row = {
+            "stage": child_results_folder,
+            "year": int(year),
+            "built_from": child_inputs_folder,
+            "error": "",
+        }
+        inputs_folder_name = scenario_folder / str(year) / child_inputs_folder
+        prepare = prepare_network
+        if not any(inputs_folder_name.glob("*.csv")):
+            inputs_folder_name = scenario_folder / str(year) / "Inputs"
+            prepare = prepare_unconstrained_network
+            row["built_from"] = "Inputs"
+        results_folder_name = scenario_folder / str(year) / child_results_folder
+
+        timer = StageTimer(f"{child_results_folder} {year} dry run")
+        start = time.perf_counter()
+        try:
+            network = prepare(
+                str(inputs_folder_name), str(results_folder_name), year, timer=timer
+            )
+            m = build_study_model(
+                network,
+                str(inputs_folder_name),
+                lazy_reserves=lazy_reserves,
+                timer=timer,
+            )
+            row.update(model_size(m))
+            counts = timer.frame().set_index("stage")["constraints"]
+            previous = counts["create_model"]
+            for family, stage in CUSTOM_CONSTRAINT_STAGES.items():
+                row[f"{family}_constraints"] = counts[stage] - previous
+                previous = counts[stage]
+            row["model_rss_mb"] = memory_mb()
+            row["estimated_peak_mb"] = estimated_solve_peak_mb(
+                row["model_rss_mb"], row["nonzeros"]
+            )
+        except Exception as e:
+            print(f"[ ERROR ] - {child_results_folder} {year}: {e}")
+            row["error"] = repr(e)
+        row["build_time_s"] = time.perf_counter() - start
+        row["history_peak_mb"] = predicted_peak_mb(
+            run_metrics, child_results_folder, year, default_mb=np.nan
+        )
+        rows.append(row)
+        # the next year is built in the same process
+        network = m = None
+        gc.collect()
+
+    sizes = pd.DataFrame(rows).reindex(columns=MODEL_SIZE_COLUMNS)
+    sizes.to_csv(model_size_file(scenario_folder, child_results_folder), index=False)
+    print(
+        sizes.drop(columns="error").to_string(index=False, float_format="{:.0f}".format)
+    )
+    memory = total_memory_mb()
+    too_big = sizes[sizes["estimated_peak_mb"] > memory]
+    for _, row in too_big.iterrows():
+        print(
+            f"[ WARNING ] - {row['stage']} {row['year']} is expected to need "
+            f"{row['estimated_peak_mb']:.0f} MB, the machine has {memory:.0f} MB"
+        )
+    print(f"Saved to {model_size_file(scenario_folder, child_results_folder)}")
+    print("---------------------------\n")
+    return sizes
+
+
+def check_reserve_formulations(
+    scenario_folder, year, child_results_folder="Results_uc", threads=None, tol=1e-3
+) -> pd.DataFrame:
+    """
+    solve one stage year with the sparse and with the per level and area reserve formulation (see
+    add_all_reserve_constraints) and compare the objective and the link dispatch. The two should
+    give the same objective, 'same' is False when they differ by more than tol (relative). The
+    largest link dispatch difference is listed as well, an LP with several optima can differ
+    there with the same objective. Saved as
+    '<case>/reserve_formulation_check_<stage>_<year>.csv', the results folder is not written.
+    """
+    child_inputs_folder, prepare_network = STAGES[child_results_folder]
+    if prepare_network is prepare_optimum_network:
+        prepare_network = partial(prepare_optimum_network, fix_n_minus=False)
+    inputs_folder_name = str(
+        Path(scenario_folder).absolute() / str(year) / child_inputs_folder
+    )
+    results_folder_name = str(
+        Path(scenario_folder).absolute() / str(year) / child_results_folder
+    )
+
+    rows = []
+    dispatch = {}
+    for sparse in [True, False]:
+        network = prepare_network(inputs_folder_name, results_folder_name, year)
+        m = build_study_model(network, inputs_folder_name, sparse_reserves=sparse)
+        reserve_rows = sum(
+            int((m.constraints[name].labels.values != -1).sum())
+            for name in m.constraints
+            if "GlobalReserveConstraint" in name
+        )
+        start = time.perf_counter()
+        status, condition = network.optimize.solve_model(
+            solver_name="cplex", solver_options=get_cplex_options(threads=threads)
+        )
+        formulation = "sparse" if sparse else "per_level_area"
+        rows.append(
+            {
+                "formulation": formulation,
+                "status": status,
+                "termination_condition": condition,
+                "objective": network.objective if status == "ok" else np.nan,
+                "reserve_rows": reserve_rows,
+                "solve_time_s": time.perf_counter() - start,
+            }
+        )
+        dispatch[formulation] = network.links_t.p0
+
+    check = pd.DataFrame(rows).set_index("formulation")
+    objective = check["objective"]
+    objective_diff = abs(objective["sparse"] - objective["per_level_area"])
+    dispatch_diff = (
+        (dispatch["sparse"] - dispatch["per_level_area"]).abs().max().max()
+        if not dispatch["sparse"].empty
+        else 0.0
+    )
+    check["objective_diff"] = objective_diff
+    check["max_link_dispatch_diff_mw"] = dispatch_diff
+    check["same"] = bool(
+        objective_diff <= tol * max(1.0, abs(objective["per_level_area"]))
+    )
+
+    check_file = (
+        Path(scenario_folder)
+        / f"reserve_formulation_check_{child_results_folder}_{year}.csv"
+    )
+    check.to_csv(check_file)
+    print("\n\nReserve formulation check")
+    print("-------------------------")
+    print(check)
+    print(f"Saved to {check_file}\n")
+    if not check["same"].all():
+        print(
+            "[ WARNING ] - The sparse and the per level and area reserve formulations differ"
+        )
+    return check
+
+
+def run_solver_tuning(
+    scenario_folder,
+    year,
+    child_results_folder="Results_uc",
+    profiles=None,
+    threads=None,
+    lp_file=None,
+) -> pd.DataFrame:
+    """
+    Solve one captured model under several solver profiles (all of SOLVER_PROFILES by default) and
+    save the wall times, iterations and objective differences to
+    '<case>/solver_tuning_<stage>_<year>.csv'. lp_file reuses an earlier capture.
+    """
+    if lp_file is None:
+        lp_file = capture_study_model(scenario_folder, year, child_results_folder)
+
+    report = tune_solver_profiles(
+        lp_file, profiles, threads=threads, log_folder=Path(lp_file).parent
+    )
+    report_file = (
+        Path(scenario_folder) / f"solver_tuning_{child_results_folder}_{year}.csv"
+    )
+    report.to_csv(report_file)
+    print("\n\nSolver tuning")
+    print("-------------")
+    print(report)
+    print(f"Saved to {report_file}\n")
+    return report
+
+
+def solve_and_save_year(
+    network,
+    scenario_folder,
+    year,
+    inputs_folder_name,
+    results_folder_name,
+    cplex_option,
+    writer=None,
+    warm_start=None,
+    metrics=None,
+    timer=None,
+):
+    """
+    solve the model built on the network and write the results folder, see save_outputs for writer.
+
+    warm_start: None, "previous_year" or "results_uc", see helpers/warm_start.py
+    metrics: optional dict that is updated with the row recorded in the case's run_metrics.csv
+    timer: the StageTimer of the year (helpers/stage_timer.py), its stages are written to
+    z_stage_metrics.csv and z_stage_trace.json in the results folder
+    """
+    timer = timer or StageTimer(f"{Path(results_folder_name).name} {year}")
+    log_file = solver_log_file(results_folder_name)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    solve_kwargs = {"log_fn": str(log_file)}
+    row = {"warm_start": warm_start or "cold"}
+    if warm_start:
+        basis_dir = warm_start_dir(results_folder_name)
+        basis_dir.mkdir(parents=True, exist_ok=True)
+        solve_kwargs["basis_fn"] = str(basis_dir / "model.bas")
+        source_folder = warm_start_source_folder(warm_start, results_folder_name)
+        if source_folder is None:
+            print(
+                f"[ INFO ] - No saved basis for warm start '{warm_start}', cold start"
+            )
+            row["warm_start"] = "cold"
+        else:
+            row.update(
+                write_warm_start_basis(
+                    network.model, source_folder, basis_dir / "start.bas"
+                )
+            )
+            solve_kwargs["warmstart_fn"] = str(basis_dir / "start.bas")
+            cplex_option = {**cplex_option, "lpmethod": WARM_START_LPMETHOD}
+
+    solves = []
+
+    def solve():
+        # with lazy reserves the earlier logs are kept as solver_<n>.log, solver.log is the last
+        if solves and log_file.exists():
+            os.replace(log_file, log_file.with_name(f"solver_{len(solves)}.log"))
+        solves.append(len(solves))
+        print(f"[ INFO ] - CPLEX log written to {log_file}")
+        return network.optimize.solve_model(
+            solver_name="cplex", solver_options=cplex_option, **solve_kwargs
+        )
+
+    start = time.perf_counter()
+    lazy_reserves = pop_lazy_reserves(network.model)
+    with timer.stage("solve", model=network.model):
+        if lazy_reserves is None:
+            status, condition = solve()
+        else:
+            status, condition = lazy_reserves.solve(
+                network.model, solve, results_folder_name
+            )
+            row["reserve_solves"] = len(lazy_reserves.iterations)
+    row["solve_time_s"] = time.perf_counter() - start
+    row["threads"] = cplex_option.get("threads", os.cpu_count())
+    row.update(solver_iterations(network.model))
+    row.update(parse_cplex_log(log_file))
+    print(
+        f"CPLEX: {row['log_status']}, presolve removed {row['presolve_rows_removed']} rows, "
+        f"crossover {row['crossover']}, first solution after {row['time_to_first_solution_s']}s"
+    )
+    if warm_start:
+        save_named_basis(network.model, solve_kwargs["basis_fn"], results_folder_name)
+
+    save_outputs(
+        network, scenario_folder, year, results_folder_name, writer=writer, timer=timer
+    )
+
+    copy_file(inputs_folder_name, results_folder_name, "reserves.csv")
+    copy_file(inputs_folder_name, results_folder_name, "inc_load.csv")
+
+    stages = timer.write(results_folder_name)
+    if not stages.empty:
+        row["peak_rss_mb"] = stages["peak_rss_mb"].max()
+
+    record_solve_metrics(network, results_folder_name, year, status, condition, row)
+    if metrics is not None:
+        metrics.update(row)
+
+    return status, condition
+
+
+def record_solve_metrics(network, results_folder_name, year, status, condition, row):
+    """add the stage, year and outcome to row and append it to the case's run_metrics.csv"""
+    case_folder, stage, _ = case_and_stage_from_results_folder(results_folder_name)
+    row.update(
+        {
+            "stage": stage,
+            "year": year,
+            "status": status,
+            "termination_condition": condition,
+            "objective": network.objective,
+        }
+    )
+    try:
+        row.update(warm_start_effect(read_run_metrics(case_folder), stage, year, row))
+        append_run_metrics(case_folder, row)
+        append_solver_history(case_folder, {"toolbox_version": __version__, **row})
+    except Exception as e:
+        print(f"[ WARNING ] - Could not record the run metrics. {e}")
+
+
+def record_run_manifest(
+    results_folder_name,
+    year,
+    inputs_folder_name,
+    status,
+    condition="",
+    outputs_written=False,
+):
+    """
+    record the state of a year in the stage's run manifest, see helpers/run_manifest.py
+
+    outputs_written: the results folder is complete (no background writer), fingerprint it now.
+    Otherwise record_outputs runs once the writer is done, until then the year is not current.
+    """
+    case_folder, stage, _ = case_and_stage_from_results_folder(results_folder_name)
+    try:
+        record_year(case_folder, stage, year, inputs_folder_name, status, condition)
+        if outputs_written and status == "ok":
+            record_outputs(case_folder, stage, [year])
+    except Exception as e:
+        print(f"[ WARNING ] - Could not update the run manifest. {e}")
+
+
+def solve_unconstrained_year(
+    scenario_folder,
+    year,
+    inputs_folder_name,
+    results_folder_name,
+    cplex_option,
+    warm_start=None,
+    metrics=None,
+    lazy_reserves=False,
+):
+    """load, build, solve and save a single unconstrained year"""
+    timer = StageTimer(f"{Path(results_folder_name).name} {year}")
+    network = prepare_unconstrained_network(
+        inputs_folder_name, results_folder_name, year, timer=timer
+    )
+    build_study_model(
+        network, inputs_folder_name, lazy_reserves=lazy_reserves, timer=timer
+    )
+    status, condition = solve_and_save_year(
+        network,
+        scenario_folder,
+        year,
+        inputs_folder_name,
+        results_folder_name,
+        cplex_option,
+        warm_start=warm_start,
+        metrics=metrics,
+        timer=timer,
+    )
+    return network, status, condition
+
+
+def _solve_unconstrained_year_worker(
+    scenario_folder,
+    year,
+    inputs_folder_name,
+    results_folder_name,
+    cplex_option,
+    warm_start=None,
+    lazy_reserves=False,
+) -> dict:
+    """process pool entry point, returns a row for the run summary and never raises"""
+    silence_warnings()
+    start = time.perf_counter()
+    row = {
+        "year": year,
+        "status": "",
+        "termination_condition": "",
+        "objective": np.nan,
+        "wall_time_s": np.nan,
+        "results_folder": results_folder_name,
+        "error": "",
+    }
+    try:
+        metrics = {}
+        network, status, condition = solve_unconstrained_year(
+            scenario_folder,
+            year,
+            inputs_folder_name,
+            results_folder_name,
+            cplex_option,
+            warm_start=warm_start,
+            metrics=metrics,
+            lazy_reserves=lazy_reserves,
+        )
+        row.update(metrics)
+        row["status"] = status
+        row["termination_condition"] = condition
+        row["objective"] = network.objective
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = repr(e)
+    row["wall_time_s"] = time.perf_counter() - start
+    return row
+
+
+def write_run_summary(
+    scenario_folder, child_results_folder, rows: list[dict]
+) -> pd.DataFrame:
+    """merge the per year rows into one table saved in the scenario folder"""
+    summary = pd.DataFrame(rows).sort_values("year").set_index("year")
+    summary_file = Path(scenario_folder) / f"run_summary_{child_results_folder}.csv"
+    summary.to_csv(summary_file)
+    print("\n\nRun summary")
+    print("-----------")
+    print(summary)
+    print(f"Saved to {summary_file}\n")
+    return summary
+
+
+def run_years_in_parallel(
+    scenario_folder,
+    years,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
     use_lpmethod_4=True,
+    parallel_workers=2,
+    threads_per_worker=None,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+    memory_budget_gb=None,
+) -> pd.DataFrame:
+    """
+    Solve independent years at the same time in a process pool.
+
+    Every year writes to its own '<year>/<child_results_folder>' folder.
+    A year only starts when its predicted peak memory (earlier runs of the case) fits in
+    'memory_budget_gb' next to the years that are running, by default 85% of the machine's memory.
+    'threads_per_worker' is the CPLEX threads budget per solve, by default the free cores are
+    split between the years that start, see helpers/admission.py.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    scenario_folder = Path(scenario_folder).absolute()
+    parallel_workers = max(1, min(int(parallel_workers), len(years)))
+    admission = AdmissionController(
+        parallel_workers, memory_budget_mb=(memory_budget_gb or 0) * 1024
+    )
+    run_metrics = read_run_metrics(scenario_folder)
+
+    print(
+        f"Solving {len(years)} years with up to {parallel_workers} workers, "
+        f"{threads_per_worker or 'shared'} CPLEX threads each, "
+        f"memory budget {admission.memory_budget_mb:.0f} MB"
+    )
+
+    # resolve paths and check for locked results files here, the workers can not prompt the user
+    year_paths = {}
+    for year in years:
+        year_paths[year] = get_year_paths(
+            scenario_folder, year, child_inputs_folder, child_results_folder
+        )
+        check_results_folder_unlocked(year_paths[year][1])
+        record_run_manifest(year_paths[year][1], year, year_paths[year][0], "running")
+
+    rows = []
+    waiting = list(year_paths)
+    running = {}
+    with ProcessPoolExecutor(max_workers=parallel_workers) as pool:
+        while waiting or running:
+            for year in list(waiting):
+                threads = admission.try_start(
+                    year,
+                    predicted_peak_mb(run_metrics, child_results_folder, year),
+                    waiting=len(waiting),
+                    threads=threads_per_worker,
+                )
+                if threads is None:
+                    break
+                waiting.remove(year)
+                inputs_folder_name, results_folder_name = year_paths[year]
+                cplex_option = get_cplex_options(
+                    use_lpmethod_4, threads=threads, solver_profile=solver_profile
+                )
+                future = pool.submit(
+                    _solve_unconstrained_year_worker,
+                    str(scenario_folder),
+                    year,
+                    inputs_folder_name,
+                    results_folder_name,
+                    cplex_option,
+                    warm_start,
+                    lazy_reserves,
+                )
+                running[future] = year
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                admission.finish(running.pop(future))
+                row = future.result()
+                print(
+                    f"Year {row['year']} finished: {row['status']} {row['termination_condition']} "
+                    f"in {row['wall_time_s']:.0f}s {row['error']}"
+                )
+                inputs_folder_name, results_folder_name = year_paths[row["year"]]
+                record_run_manifest(
+                    results_folder_name,
+                    row["year"],
+                    inputs_folder_name,
+                    row["status"],
+                    row["termination_condition"],
+                    outputs_written=True,
+                )
+                rows.append(row)
+
+    return write_run_summary(scenario_folder, child_results_folder, rows)
+
+
+def run_unconstrained_expansion(
+    scenario_folder,
+    years,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
+    use_lpmethod_4=True,
+    parallel_workers=1,
+    threads_per_worker=None,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    screening=False,
+    screening_period_hours=24,
+    screening_periods=12,
+    lazy_reserves=False,
+    preflight=True,
+    resume=False,
+    memory_budget_gb=None,
+    dry_run=False,
 ):
+    """
+    Every year is solved independently from its own Inputs folder.
+
+    parallel_workers > 1 solves the years at the same time in a process pool and returns the merged
+    run summary (pd.DataFrame) in place of the last solved network.
+    background_export=True writes the results folders in the background, see save_outputs.
+    warm_start: None, "previous_year" or "results_uc", see helpers/warm_start.py
+    solver_profile: a name in SOLVER_PROFILES, replaces use_lpmethod_4 when given
+    screening=True solves 'screening_periods' representative blocks of 'screening_period_hours'
+    (24 days, 168 weeks) in place of the full year, writes to '<child_results_folder>_screening' and
+    returns the capacities next to those of the last full run, see run_screening_expansion.
+    lazy_reserves=True adds the per snapshot reserve rows only where they are violated and solves
+    again until none are, the solves are listed in z_reserve_iterations.csv of the results folder
+    preflight=True checks the inputs and results folders of all the years first, see run_preflight
+    resume=True skips the years that are solved and whose inputs did not change since, see
+    helpers/run_manifest.py
+    memory_budget_gb: with parallel_workers > 1 a year only starts when its predicted peak memory
+    fits next to the running years, see run_years_in_parallel
+    dry_run=True builds the model of every year without solving it and returns the model sizes, see
+    preview_model_sizes (the full year models, also with screening=True)
+    """
     print_study_start_info(child_inputs_folder, child_results_folder)
+    stage = (
+        f"{child_results_folder}{SCREENING_SUFFIX}"
+        if screening
+        else child_results_folder
+    )
+    if resume:
+        years = resume_years(scenario_folder, stage, years, child_inputs_folder)
+        if not years:
+            return None
+    if dry_run:
+        return preview_model_sizes(
+            scenario_folder,
+            years,
+            child_inputs_folder,
+            child_results_folder,
+            prepare_unconstrained_network,
+            lazy_reserves=lazy_reserves,
+        )
+    if preflight:
+        run_preflight(scenario_folder, years, child_inputs_folder, stage)
+
+    if screening:
+        return run_screening_expansion(
+            scenario_folder,
+            years,
+            child_inputs_folder=child_inputs_folder,
+            child_results_folder=child_results_folder,
+            cplex_option=get_cplex_options(
+                use_lpmethod_4,
+                threads=threads_per_worker,
+                solver_profile=solver_profile,
+            ),
+            period_hours=screening_period_hours,
+            n_periods=screening_periods,
+            warm_start=warm_start,
+            lazy_reserves=lazy_reserves,
+        )
+
+    if parallel_workers > 1 and len(years) > 1:
+        summary = run_years_in_parallel(
+            scenario_folder,
+            years,
+            child_inputs_folder=child_inputs_folder,
+            child_results_folder=child_results_folder,
+            use_lpmethod_4=use_lpmethod_4,
+            parallel_workers=parallel_workers,
+            threads_per_worker=threads_per_worker,
+            warm_start=warm_start,
+            solver_profile=solver_profile,
+            lazy_reserves=lazy_reserves,
+            memory_budget_gb=memory_budget_gb,
+        )
+        record_outputs(scenario_folder, child_results_folder, years)
+        return summary
+
+    cplex_option = get_cplex_options(
+        use_lpmethod_4, threads=threads_per_worker, solver_profile=solver_profile
+    )
 
+    with results_writer(background_export) as writer:
+        network = run_years_serial(
+            scenario_folder,
+            years,
+            prepare_unconstrained_network,
+            child_inputs_folder,
+            child_results_folder,
+            cplex_option,
+            writer=writer,
+            warm_start=warm_start,
+            lazy_reserves=lazy_reserves,
+        )
+    record_outputs(scenario_folder, child_results_folder, years)
+    return network
+
+
+SCREENING_SUFFIX = "_screening"
+
+
+def run_screening_expansion(
+    scenario_folder,
+    years,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_uc",
+    cplex_option=None,
+    period_hours=24,
+    n_periods=12,
+    warm_start=None,
+    lazy_reserves=False,
+) -> pd.DataFrame:
+    """
+    Unconstrained expansion on representative periods, with the full custom constraint chain.
+    The results go to '<year>/<child_results_folder>_screening', the full run results are not touched.
+    """
+    screening_folder = f"{child_results_folder}{SCREENING_SUFFIX}"
+    print(
+        f"Screening run: {n_periods} representative blocks of {period_hours}h, "
+        f"results in {screening_folder}"
+    )
+    run_years_serial(
+        scenario_folder,
+        years,
+        partial(
+            prepare_screening_network, period_hours=period_hours, n_periods=n_periods
+        ),
+        child_inputs_folder,
+        screening_folder,
+        cplex_option if cplex_option is not None else get_cplex_options(),
+        warm_start=warm_start,
+        lazy_reserves=lazy_reserves,
+    )
+    record_outputs(scenario_folder, screening_folder, years)
+    return screening_capacity_comparison(
+        scenario_folder, years, child_results_folder, screening_folder
+    )
+
+
+def screening_capacity_comparison(
+    scenario_folder, years, full_stage="Results_uc", screening_stage=None
+) -> pd.DataFrame:
+    """
+    optimal capacities per year, component and carrier of the screening run next to the last full
+    run of the stage, from the capacity ledgers. Saved as '<case>/screening_vs_<full_stage>.csv'.
+    """
+    screening_stage = screening_stage or f"{full_stage}{SCREENING_SUFFIX}"
+    key = ["component", "name"]
+    frames = []
+    for year in years:
+        screening = read_capacity_ledger(scenario_folder, screening_stage, year)
+        if screening is None:
+            continue
+        full = read_capacity_ledger(scenario_folder, full_stage, year)
+        merged = screening[key + ["carrier", "nom_opt"]].rename(
+            columns={"nom_opt": "screening_nom_opt"}
+        )
+        merged["component"] = merged["component"].astype(str)
+        if full is None:
+            print(f"No full {full_stage} run found for {year}")
+            merged["full_nom_opt"] = np.nan
+        else:
+            full = full[key + ["nom_opt"]].rename(columns={"nom_opt": "full_nom_opt"})
+            full["component"] = full["component"].astype(str)
+            merged = merged.merge(full, on=key, how="outer")
+        merged["carrier"] = merged["carrier"].fillna("")
+        per_carrier = merged.groupby(["component", "carrier"])[
+            ["screening_nom_opt", "full_nom_opt"]
+        ].sum(min_count=1)
+        frames.append(pd.concat({int(year): per_carrier}, names=["year"]))
+
+    if not frames:
+        return pd.DataFrame()
+    comparison = pd.concat(frames)
+    comparison["diff"] = comparison["screening_nom_opt"] - comparison["full_nom_opt"]
+    comparison["diff_pct"] = 100 * comparison["diff"] / comparison["full_nom_opt"]
+
+    comparison_file = Path(scenario_folder) / f"screening_vs_{full_stage}.csv"
+    comparison.to_csv(comparison_file)
+    print("\n\nScreening vs full run capacities")
+    print("--------------------------------")
+    print(comparison)
+    print(f"Saved to {comparison_file}\n")
+    return comparison
+
+
+def run_years_serial(
+    scenario_folder,
+    years,
+    prepare_network,
+    child_inputs_folder,
+    child_results_folder,
+    cplex_option,
+    writer=None,
+    warm_start=None,
+    lazy_reserves=False,
+):
+    """the plain year loop: prepare, build, solve and save one year after the other"""
+    network = None
     for year in years:
         inputs_folder_name, results_folder_name = get_scenarios_paths(
             year,
@@ -1430,41 +2295,646 @@ def run_incremental_demand_expansion(
             child_results_folder=child_results_folder,
         )
 
-        network = load_and_prepare_network(inputs_folder_name, add_multi_index=True)
+        record_run_manifest(results_folder_name, year, inputs_folder_name, "running")
+        timer = StageTimer(f"{child_results_folder} {year}")
+        network = prepare_network(
+            inputs_folder_name, results_folder_name, year, timer=timer
+        )
+        build_study_model(
+            network, inputs_folder_name, lazy_reserves=lazy_reserves, timer=timer
+        )
+        status, condition = solve_and_save_year(
+            network,
+            scenario_folder,
+            year,
+            inputs_folder_name,
+            results_folder_name,
+            cplex_option,
+            writer=writer,
+            warm_start=warm_start,
+            timer=timer,
+        )
+        record_run_manifest(
+            results_folder_name,
+            year,
+            inputs_folder_name,
+            status,
+            condition,
+            outputs_written=writer is None,
+        )
 
-        # make extentable
-        make_all_non_extendable(network)
+    return network
 
-        make_extendable(network)
-        increase_load_fixed(network, inputs_folder_name)
 
-        # remove all proxy plants (3/7/2024)
-        remove_proxy_plant(network)
+def _prepare_and_build(
+    prepare_network,
+    inputs_folder_name,
+    results_folder_name,
+    year,
+    lazy_reserves=False,
+    timer=None,
+    **kwargs,
+):
+    network = prepare_network(
+        inputs_folder_name, results_folder_name, year, timer=timer, **kwargs
+    )
+    m = build_study_model(
+        network, inputs_folder_name, lazy_reserves=lazy_reserves, timer=timer
+    )
+    return network, m
 
-        m = network.optimize.create_model(multi_investment_periods=True)
-        add_hydro_turnine_efficiency(network, m)
-        fix_link_battery_capacity(network, m)
-        fix_links_capacity(network, m)
 
-        add_all_reserve_constraints(network, m, inputs_folder_name + r"\reserves.csv")
+def run_years_pipelined(
+    scenario_folder,
+    years,
+    prepare_network,
+    child_inputs_folder,
+    child_results_folder,
+    cplex_option,
+    chain_capacities=False,
+    writer=None,
+    warm_start=None,
+    lazy_reserves=False,
+):
+    """
+    Solve the years in order, but load and build year N+1 in a background thread while
+    year N is in the solver and being saved.
+
+    chain_capacities=True is for optimum expansion: when year N+1 directly follows year N, its
+    model is built without fix_n_minus_capacities, and once year N is solved and saved its
+    '*_nom_opt' are applied from the in memory capacity ledger and pushed into the model lower bounds.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    scenario_folder = Path(scenario_folder).absolute()
+    network = None
+
+    def submit(year, chained):
+        inputs_folder_name, results_folder_name = get_year_paths(
+            scenario_folder, year, child_inputs_folder, child_results_folder
+        )
+        check_results_folder_unlocked(results_folder_name)
+        kwargs = {"fix_n_minus": False} if chained else {}
+        timer = StageTimer(f"{child_results_folder} {year}")
+        future = prefetcher.submit(
+            _prepare_and_build,
+            prepare_network,
+            inputs_folder_name,
+            results_folder_name,
+            year,
+            lazy_reserves=lazy_reserves,
+            timer=timer,
+            **kwargs,
+        )
+        return future, inputs_folder_name, results_folder_name, timer
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        next_year = submit(years[0], chained=False)
+        chained = False
+        for i, year in enumerate(years):
+            future, inputs_folder_name, results_folder_name, timer = next_year
+            with timer.stage("wait_for_build"):
+                network, m = future.result()
+
+            if chained:
+                # the previous year was saved by now, its capacity ledger is still in memory
+                with timer.stage("fix_n_minus_capacities"):
+                    fix_n_minus_capacities(
+                        path_to_networks=results_folder_name,
+                        current_network=network,
+                        current_year=year,
+                    )
+                    update_nominal_lower_bounds(network, m)
+
+            if i + 1 < len(years):
+                chained = chain_capacities and int(years[i + 1]) == int(year) + 1
+                next_year = submit(years[i + 1], chained=chained)
+
+            print("\n\n\n**************************")
+            print("Next run started at : ", time.strftime("%H:%M:%S"))
+            print("Scenario Name: ", scenario_folder)
+            print("Year : ", year)
+            print("**************************\n\n")
+            record_run_manifest(
+                results_folder_name, year, inputs_folder_name, "running"
+            )
+            status, condition = solve_and_save_year(
+                network,
+                scenario_folder,
+                year,
+                inputs_folder_name,
+                results_folder_name,
+                cplex_option,
+                writer=writer,
+                warm_start=warm_start,
+                timer=timer,
+            )
+            record_run_manifest(
+                results_folder_name,
+                year,
+                inputs_folder_name,
+                status,
+                condition,
+                outputs_written=writer is None,
+            )
+
+    return network
 
-        if use_lpmethod_4:
-            cplex_option = {"lpmethod": 4}  # no crossover
-        else:
-            cplex_option = {}
 
-        network.optimize.solve_model(solver_name="cplex", solver_options=cplex_option)
+def run_optimum_expansion(
+    scenario_folder,
+    years,
+    child_inputs_folder="Results_uc",
+    child_results_folder="Results_opt",
+    use_lpmethod_4=True,
+    pipelined=False,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+    preflight=True,
+    resume=False,
+    threads=None,
+    dry_run=False,
+):
+    """
+    pipelined=True builds the next year while the current year is solving, see run_years_pipelined.
+    background_export=True writes the results folders in the background, see save_outputs.
+    warm_start: None, "previous_year" or "results_uc", see helpers/warm_start.py
+    solver_profile: a name in SOLVER_PROFILES, replaces use_lpmethod_4 when given
+    lazy_reserves, preflight, resume: see run_unconstrained_expansion
+    threads: CPLEX threads, all cores when None (the share of a batch, see cli.py)
+    dry_run: see run_unconstrained_expansion
+    """
+    print_study_start_info(child_inputs_folder, child_results_folder)
+    if resume:
+        years = resume_years(
+            scenario_folder,
+            child_results_folder,
+            years,
+            child_inputs_folder,
+            chained=True,
+        )
+        if not years:
+            return None
+    if dry_run:
+        return preview_model_sizes(
+            scenario_folder,
+            years,
+            child_inputs_folder,
+            child_results_folder,
+            prepare_optimum_network,
+            lazy_reserves=lazy_reserves,
+        )
+    if preflight:
+        run_preflight(scenario_folder, years, child_inputs_folder, child_results_folder)
+
+    cplex_option = get_cplex_options(
+        use_lpmethod_4, threads=threads, solver_profile=solver_profile
+    )
+
+    with results_writer(background_export) as writer:
+        if pipelined:
+            network = run_years_pipelined(
+                scenario_folder,
+                years,
+                prepare_optimum_network,
+                child_inputs_folder,
+                child_results_folder,
+                cplex_option,
+                chain_capacities=True,
+                writer=writer,
+                warm_start=warm_start,
+                lazy_reserves=lazy_reserves,
+            )
+        else:
+            network = run_years_serial(
+                scenario_folder,
+                years,
+                prepare_optimum_network,
+                child_inputs_folder,
+                child_results_folder,
+                cplex_option,
+                writer=writer,
+                warm_start=warm_start,
+                lazy_reserves=lazy_reserves,
+            )
+    record_outputs(scenario_folder, child_results_folder, years)
+    return network
 
-        add_summaries(network)
 
-        save_outputs(network, scenario_folder, year, results_folder_name)
+def run_incremental_demand_expansion(
+    scenario_folder,
+    years,
+    child_inputs_folder="Results_opt",
+    child_results_folder="Results_opti",
+    use_lpmethod_4=True,
+    pipelined=False,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+    preflight=True,
+    resume=False,
+    threads=None,
+    dry_run=False,
+):
+    """
+    pipelined=True builds the next year while the current year is solving, see run_years_pipelined.
+    background_export=True writes the results folders in the background, see save_outputs.
+    warm_start: None, "previous_year" or "results_uc", see helpers/warm_start.py
+    solver_profile: a name in SOLVER_PROFILES, replaces use_lpmethod_4 when given
+    lazy_reserves, preflight, resume: see run_unconstrained_expansion
+    threads: CPLEX threads, all cores when None (the share of a batch, see cli.py)
+    dry_run: see run_unconstrained_expansion
+    """
+    print_study_start_info(child_inputs_folder, child_results_folder)
+    if resume:
+        years = resume_years(
+            scenario_folder,
+            child_results_folder,
+            years,
+            child_inputs_folder,
+            chained=False,
+        )
+        if not years:
+            return None
+    if dry_run:
+        return preview_model_sizes(
+            scenario_folder,
+            years,
+            child_inputs_folder,
+            child_results_folder,
+            prepare_incremental_network,
+            lazy_reserves=lazy_reserves,
+        )
+    if preflight:
+        run_preflight(scenario_folder, years, child_inputs_folder, child_results_folder)
 
-        copy_file(inputs_folder_name, results_folder_name, "reserves.csv")
-        copy_file(inputs_folder_name, results_folder_name, "inc_load.csv")
+    cplex_option = get_cplex_options(
+        use_lpmethod_4, threads=threads, solver_profile=solver_profile
+    )
 
+    with results_writer(background_export) as writer:
+        if pipelined:
+            network = run_years_pipelined(
+                scenario_folder,
+                years,
+                prepare_incremental_network,
+                child_inputs_folder,
+                child_results_folder,
+                cplex_option,
+                writer=writer,
+                warm_start=warm_start,
+                lazy_reserves=lazy_reserves,
+            )
+        else:
+            network = run_years_serial(
+                scenario_folder,
+                years,
+                prepare_incremental_network,
+                child_inputs_folder,
+                child_results_folder,
+                cplex_option,
+                writer=writer,
+                warm_start=warm_start,
+                lazy_reserves=lazy_reserves,
+            )
+    record_outputs(scenario_folder, child_results_folder, years)
     return network
 
 
+def _solve_stage_year_worker(
+    scenario_folder,
+    stage,
+    year,
+    cplex_option,
+    warm_start=None,
+    lazy_reserves=False,
+) -> dict:
+    """process pool entry point of the full chain, prepares, builds, solves and saves one stage year"""
+    silence_warnings()
+    start = time.perf_counter()
+    row = {
+        "year": year,
+        "stage": stage,
+        "status": "",
+        "termination_condition": "",
+        "objective": np.nan,
+        "wall_time_s": np.nan,
+        "error": "",
+    }
+    try:
+        child_inputs_folder, prepare_network = STAGES[stage]
+        inputs_folder_name, results_folder_name = get_year_paths(
+            scenario_folder, year, child_inputs_folder, stage
+        )
+        timer = StageTimer(f"{stage} {year}")
+        network = prepare_network(
+            inputs_folder_name, results_folder_name, year, timer=timer
+        )
+        build_study_model(
+            network, inputs_folder_name, lazy_reserves=lazy_reserves, timer=timer
+        )
+        metrics = {}
+        status, condition = solve_and_save_year(
+            network,
+            scenario_folder,
+            year,
+            inputs_folder_name,
+            results_folder_name,
+            cplex_option,
+            warm_start=warm_start,
+            metrics=metrics,
+            timer=timer,
+        )
+        row.update(metrics)
+        row["status"] = status
+        row["termination_condition"] = condition
+        row["objective"] = network.objective
+    except Exception as e:
+        row["status"] = "error"
+        row["error"] = repr(e)
+    row["wall_time_s"] = time.perf_counter() - start
+    return row
+
+
+def full_chain_graph(years, stages=None) -> dict:
+    """
+    {(stage, year): [(stage, year) it waits for]} for the uc -> opt -> opti chain:
+    unconstrained years wait for nothing, optimum year N waits for unconstrained year N and
+    optimum year N-1 (when selected), incremental demand year N waits for optimum year N.
+    stages limits the graph to the given (stage, year) pairs, dependencies outside it are done.
+    """
+    years = sorted(int(year) for year in years)
+    graph = {}
+    for year in years:
+        graph[("Results_uc", year)] = []
+        graph[("Results_opt", year)] = [("Results_uc", year)]
+        if year - 1 in years:
+            graph[("Results_opt", year)].append(("Results_opt", year - 1))
+        graph[("Results_opti", year)] = [("Results_opt", year)]
+    if stages is not None:
+        graph = {
+            task: [d for d in depends_on if d in stages]
+            for task, depends_on in graph.items()
+            if task in stages
+        }
+    return graph
+
+
+# the optimum chain is the critical path, its tasks go first when several are ready
+FULL_CHAIN_PRIORITY = {"Results_opt": 0, "Results_uc": 1, "Results_opti": 2}
+
+
+def run_full_chain(
+    scenario_folder,
+    years,
+    child_inputs_folder="Inputs",
+    child_results_folder="Results_opti",
+    use_lpmethod_4=True,
+    parallel_workers=2,
+    threads_per_worker=None,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+    preflight=True,
+    resume=False,
+    memory_budget_gb=None,
+    dry_run=False,
+) -> pd.DataFrame:
+    """
+    Unconstrained, optimum and incremental demand expansion of all the years as one dependency graph
+    (see full_chain_graph), with up to 'parallel_workers' solves at the same time in a process pool.
+    A stage year that fails skips everything that waits for it.
+    A stage year only starts when its predicted peak memory fits in 'memory_budget_gb' next to the
+    running ones, and without threads_per_worker it gets a share of the free cores, see
+    helpers/admission.py.
+
+    Every solve writes its results folder directly, background_export is not used here.
+    resume=True only runs the stage years that are not solved or stale (helpers/run_manifest.py),
+    and everything downstream of them.
+    dry_run=True returns the model sizes of the stage years in place of solving them, see
+    preview_model_sizes.
+    Returns the run summary, also saved as '<case>/run_summary_full_chain.csv'.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    print_study_start_info(
+        child_inputs_folder, "Results_uc -> Results_opt -> Results_opti"
+    )
+    scenario_folder = Path(scenario_folder).absolute()
+    graph = full_chain_graph(years)
+
+    if resume:
+        stale = stale_outputs(scenario_folder, years)
+        stale = set(zip(stale["stage"], stale["year"]))
+        selected = set()
+        for task, depends_on in graph.items():
+            stage, year = task
+            solved = (scenario_folder / str(year) / stage / "network.csv").exists()
+            if task in stale or not solved or any(d in selected for d in depends_on):
+                selected.add(task)
+        graph = full_chain_graph(years, selected)
+        print(f"Resume: {len(graph)} stage years to run")
+    if not graph:
+        return pd.DataFrame()
+    if dry_run:
+        stage_years = {}
+        for stage, year in graph:
+            stage_years.setdefault(stage, []).append(year)
+        return pd.concat(
+            [
+                preview_model_sizes(
+                    scenario_folder,
+                    sorted(stage_years[stage]),
+                    STAGES[stage][0],
+                    stage,
+                    lazy_reserves=lazy_reserves,
+                )
+                for stage in STAGES
+                if stage in stage_years
+            ],
+            ignore_index=True,
+        )
+
+    uc_years = [year for stage, year in graph if stage == "Results_uc"]
+    if preflight and uc_years:
+        run_preflight(scenario_folder, uc_years, "Inputs", "Results_uc")
+
+    parallel_workers = max(1, int(parallel_workers))
+    admission = AdmissionController(
+        parallel_workers, memory_budget_mb=(memory_budget_gb or 0) * 1024
+    )
+    run_metrics = read_run_metrics(scenario_folder)
+    print(
+        f"Full chain: {len(graph)} stage years with up to {parallel_workers} workers, "
+        f"{threads_per_worker or 'shared'} CPLEX threads each, "
+        f"memory budget {admission.memory_budget_mb:.0f} MB"
+    )
+
+    # check for locked results files here, the workers can not prompt the user
+    for stage, year in graph:
+        inputs_folder_name, results_folder_name = get_year_paths(
+            scenario_folder, year, STAGES[stage][0], stage
+        )
+        check_results_folder_unlocked(results_folder_name)
+
+    done, rows, running = {}, [], {}
+
+    def ready():
+        tasks = [
+            task
+            for task, depends_on in graph.items()
+            if task not in done
+            and task not in running.values()
+            and all(done.get(d) == "ok" for d in depends_on)
+        ]
+        return sorted(tasks, key=lambda t: (FULL_CHAIN_PRIORITY[t[0]], t[1]))
+
+    def skip_blocked():
+        # everything that waits on a failed or skipped stage year is skipped
+        changed = True
+        while changed:
+            changed = False
+            for task, depends_on in graph.items():
+                if task in done or task in running.values():
+                    continue
+                failed = [d for d in depends_on if d in done and done[d] != "ok"]
+                if failed:
+                    done[task] = "skipped"
+                    rows.append(
+                        {
+                            "year": task[1],
+                            "stage": task[0],
+                            "status": "skipped",
+                            "error": f"{failed[0][0]} {failed[0][1]} did not solve",
+                        }
+                    )
+                    changed = True
+
+    with ProcessPoolExecutor(max_workers=parallel_workers) as pool:
+        while len(done) < len(graph):
+            ready_tasks = ready()
+            for i, task in enumerate(ready_tasks):
+                stage, year = task
+                threads = admission.try_start(
+                    task,
+                    predicted_peak_mb(run_metrics, stage, year),
+                    waiting=len(ready_tasks) - i,
+                    threads=threads_per_worker,
+                )
+                if threads is None:
+                    break
+                cplex_option = get_cplex_options(
+                    use_lpmethod_4, threads=threads, solver_profile=solver_profile
+                )
+                inputs_folder_name, results_folder_name = get_year_paths(
+                    scenario_folder, year, STAGES[stage][0], stage
+                )
+                record_run_manifest(
+                    results_folder_name, year, inputs_folder_name, "running"
+                )
+                print(f"[ INFO ] - Started {stage} {year}")
+                future = pool.submit(
+                    _solve_stage_year_worker,
+                    str(scenario_folder),
+                    stage,
+                    str(year),
+                    cplex_option,
+                    warm_start,
+                    lazy_reserves,
+                )
+                running[future] = task
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, year = task = running.pop(future)
+                admission.finish(task)
+                row = {**future.result(), "year": year}
+                print(
+                    f"{stage} {year} finished: {row['status']} {row['termination_condition']} "
+                    f"in {row['wall_time_s']:.0f}s {row['error']}"
+                )
+                inputs_folder_name, results_folder_name = get_year_paths(
+                    scenario_folder, year, STAGES[stage][0], stage
+                )
+                record_run_manifest(
+                    results_folder_name,
+                    year,
+                    inputs_folder_name,
+                    row["status"],
+                    row["termination_condition"],
+                    outputs_written=True,
+                )
+                done[task] = row["status"]
+                rows.append(row)
+            skip_blocked()
+
+    for stage in STAGE_INPUTS:
+        record_outputs(
+            scenario_folder,
+            stage,
+            [year for s, year in graph if s == stage and done.get((s, year)) == "ok"],
+        )
+    return write_run_summary(scenario_folder, "full_chain", rows)
+
+
+def find_stale_outputs(scenario_folder, years=None) -> pd.DataFrame:
+    """the stage and year outputs of the case that are out of date, see helpers/run_manifest.py"""
+    stale = stale_outputs(scenario_folder, years)
+    print("\n\nStale outputs")
+    print("-------------")
+    print(
+        stale.to_string(index=False)
+        if not stale.empty
+        else "None, all outputs are current"
+    )
+    print("")
+    return stale
+
+
+def rebuild_stale(
+    scenario_folder,
+    years=None,
+    use_lpmethod_4=True,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+) -> pd.DataFrame:
+    """
+    Run only the stale outputs of the case again, stage by stage (uc, opt, opti), each stage with
+    its stale years. Returns the stale outputs that were rebuilt.
+    """
+    stale = find_stale_outputs(scenario_folder, years)
+    stage_functions = {
+        "Results_uc": run_unconstrained_expansion,
+        "Results_opt": run_optimum_expansion,
+        "Results_opti": run_incremental_demand_expansion,
+    }
+    for stage, inputs_folder in STAGE_INPUTS.items():
+        stage_years = sorted(stale.loc[stale["stage"] == stage, "year"])
+        if not stage_years:
+            continue
+        print(f"Rebuilding {stage} for {stage_years}")
+        stage_functions[stage](
+            scenario_folder,
+            [str(year) for year in stage_years],
+            inputs_folder,
+            stage,
+            use_lpmethod_4=use_lpmethod_4,
+            background_export=background_export,
+            warm_start=warm_start,
+            solver_profile=solver_profile,
+            lazy_reserves=lazy_reserves,
+        )
+    return stale
+
+
 def generate_case_report(
     case_name,
     path_to_excel_settings,
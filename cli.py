@@ -0,0 +1,802 @@
+"""
+Headless runner for the studies and the case report, for batch runs on a server without the UI.
+
+    python cli.py study uc    <case folder> --years 2025-2030 --workers 4 --threads 4
+    python cli.py study opt   <case folder> --years 2025 2026 --pipelined --warm-start previous_year
+    python cli.py study chain <case folder> --workers 3 --resume
+    python cli.py study opt   <case folder> --dry-run
+    python cli.py report <case folder> <settings.xlsx> Results_opt --reports CAPACITY_ENERGY
+    python cli.py batch <project folder> --stages uc opt --cases A B --max-concurrent 3
+    python cli.py check-reserves <case folder> 2025 --stage uc
+    python cli.py rebuild <case folder> --warm-start previous_year
+
+The stage is a key of STUDY_TYPES (pages/helpers/study_types.py), its number ('1', '2', ...) or
+one of uc, opt, opti, chain. Without --years all the years of the case are run.
+--cprofile <file> saves the cProfile stats of the run (the parent process only, the stages of every
+year are in z_stage_metrics.csv / z_stage_trace.json of its results folder).
+--job-file <job.json> keeps the status, case, stages and years of the run in a job file, the
+Studies page starts its runs this way, see afripow_pypsa/helpers/jobs.py and study_args.
+--dry-run builds the model of every selected year without solving it and prints and saves its
+size and estimated peak memory to '<case>/model_size_<stage>.csv' (toolbox.preview_model_sizes),
+the Studies page shows these before a run.
+
+batch runs the stages (in STUDY_TYPES order) of several cases of a project folder, by default all
+the cases the Studies page lists, with at most --max-concurrent cases solving at the same time.
+Every case stops at the first stage that does not end ok, the later stages need its results. The
+summary (case, study type, stage, year, status, termination condition, solve time, objective and
+the exit code of the stage) is printed and saved to '<project>/batch_summary_<batch id>.csv', the
+output of every stage to '<project>/.jobs/<batch id>/<case> <stage>.log'.
+
+rebuild solves the stale outputs of a case again, stage by stage (toolbox.rebuild_stale), the
+Studies page starts it as a job.
+
+check-reserves solves one year with the sparse and with the per level and area reserve
+formulation and compares them, see toolbox.check_reserve_formulations.
+
+Exit codes:
+    0   every selected year solved ok (report: the report was generated, dry run: every model
+        was built, check-reserves: both formulations give the same objective)
+    1   one or more years did not solve ok, see the run manifests of the case (batch: any stage
+        of any case did not end ok, dry run: a model could not be built)
+    2   bad arguments
+    3   the pre-flight check stopped the run before anything was solved (PreflightError)
+    4   unexpected error
+    130 interrupted
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+EXIT_OK = 0
+EXIT_FAILED_YEARS = 1
+EXIT_USAGE = 2
+EXIT_INPUTS = 3
+EXIT_ERROR = 4
+EXIT_INTERRUPTED = 130
+
+STAGE_ALIASES = {
+    "uc": "1. Unconstrained Expansion",
+    "opt": "2. Optimum Expansion",
+    "opti": "3. Incremental Demand Expansion",
+    "chain": "5. Full Chain (uc -> opt -> opti)",
+}
+REPORTS = ["ALL", "CAPACITY_ENERGY", "LINK_PROFILES"]
+
+
+def parse_years(values: list[str]) -> list[int]:
+    """'2025 2027' or '2025-2030' (both ends included)"""
+    years = []
+    for value in values:
+        for part in value.split(","):
+            if not part:
+                continue
+            if "-" in part:
+                first, last = part.split("-", 1)
+                years.extend(range(int(first), int(last) + 1))
+            else:
+                years.append(int(part))
+    return sorted(set(years))
+
+
+def study_type_key(stage: str, study_types: dict) -> str:
+    if stage in study_types:
+        return stage
+    if stage.lower() in STAGE_ALIASES:
+        return STAGE_ALIASES[stage.lower()]
+    for key in study_types:
+        if key.split(".")[0] == stage:
+            return key
+    raise KeyError(
+        f"Unknown stage '{stage}', use one of {list(STAGE_ALIASES)} or {list(study_types)}"
+    )
+
+
+def study_args(stage: str, case, years: list, **options) -> list[str]:
+    """
+    the 'study' arguments of a run, options are the keyword arguments of the run_* functions
+    (parallel_workers, threads_per_worker, pipelined, background_export, warm_start,
+    solver_profile, lazy_reserves, preflight, resume, screening, screening_period_hours,
+    screening_periods, memory_budget_gb, dry_run)
+    """
+    args = ["study", stage, str(case), "--years", *[str(y) for y in years]]
+    flags = {
+        "pipelined": "--pipelined",
+        "background_export": "--background-export",
+        "lazy_reserves": "--lazy-reserves",
+        "resume": "--resume",
+        "screening": "--screening",
+        "dry_run": "--dry-run",
+    }
+    values = {
+        "parallel_workers": "--workers",
+        "threads_per_worker": "--threads",
+        "warm_start": "--warm-start",
+        "solver_profile": "--solver-profile",
+        "screening_period_hours": "--screening-period-hours",
+        "screening_periods": "--screening-periods",
+        "memory_budget_gb": "--memory-budget-gb",
+    }
+    for name, value in options.items():
+        if name in flags:
+            if value:
+                args.append(flags[name])
+        elif name in values:
+            if value is not None:
+                args.extend([values[name], str(value)])
+        elif name == "preflight":
+            if not value:
+                args.append("--no-preflight")
+        else:
+            raise KeyError(f"Unknown study option '{name}'")
+    return args
+
+
+def rebuild_args(
+    case,
+    years=None,
+    background_export=False,
+    warm_start=None,
+    solver_profile=None,
+    lazy_reserves=False,
+) -> list[str]:
+    """the 'rebuild' arguments, the keyword arguments of toolbox.rebuild_stale"""
+    args = ["rebuild", str(case)]
+    if years:
+        args.extend(["--years", *[str(y) for y in years]])
+    if background_export:
+        args.append("--background-export")
+    if warm_start:
+        args.extend(["--warm-start", warm_start])
+    if solver_profile:
+        args.extend(["--solver-profile", solver_profile])
+    if lazy_reserves:
+        args.append("--lazy-reserves")
+    return args
+
+
+def study_options(args) -> dict:
+    """the run_* keyword arguments of the study options of args, see study_args"""
+    options = {
+        "parallel_workers": args.workers,
+        "threads_per_worker": args.threads,
+        "pipelined": args.pipelined,
+        "background_export": args.background_export,
+        "warm_start": args.warm_start,
+        "solver_profile": args.solver_profile,
+        "lazy_reserves": args.lazy_reserves,
+        "preflight": not args.no_preflight,
+        "resume": args.resume,
+        "memory_budget_gb": args.memory_budget_gb,
+    }
+    if args.screening:
+        options["screening"] = True
+        options["screening_period_hours"] = args.screening_period_hours
+        options["screening_periods"] = args.screening_periods
+    if getattr(args, "dry_run", False):
+        options["dry_run"] = True
+    return options
+
+
+PARALLEL_OPTIONS = ["parallel_workers", "threads_per_worker", "memory_budget_gb"]
+SCREENING_OPTIONS = ["screening", "screening_period_hours", "screening_periods"]
+
+
+def study_kwargs(options: dict, study_type: dict) -> dict:
+    """
+    the options (see study_options) a STUDY_TYPES entry takes, as keyword arguments of its
+    function. The study types that solve the years one after the other take 'threads'.
+    """
+    kwargs = dict(options)
+    if not study_type.get("parallel_years", False):
+        kwargs["threads"] = kwargs.get("threads_per_worker")
+        for name in PARALLEL_OPTIONS:
+            kwargs.pop(name, None)
+    if not study_type.get("pipelined", False):
+        kwargs.pop("pipelined", None)
+    if not study_type.get("screening", False):
+        for name in SCREENING_OPTIONS:
+            kwargs.pop(name, None)
+    return kwargs
+
+
+def project_cases(project_folder: Path) -> list[str]:
+    """the case folders of a project, as the Studies page lists them"""
+    from afripow_pypsa.helpers.direcory_cases import find_int_named_subdirs
+
+    return sorted(
+        d.name
+        for d in Path(project_folder).iterdir()
+        if d.is_dir()
+        and not d.name.startswith(".")
+        and "reporting" not in d.name
+        and find_int_named_subdirs(d)
+    )
+
+
+def failed_years(case_folder: Path, stages: list[str], years: list[int]) -> list:
+    """(stage, year, status) of the years whose last solve in the run manifest was not ok"""
+    from afripow_pypsa.helpers.run_manifest import read_run_manifest
+
+    failed = []
+    for stage in stages:
+        manifest = read_run_manifest(case_folder, stage)
+        for year in years:
+            entry = manifest["years"].get(str(year), {})
+            if entry.get("status") != "ok":
+                status = entry.get("status", "not solved")
+                condition = entry.get("termination_condition", "")
+                failed.append((stage, year, f"{status} {condition}".strip()))
+    return failed
+
+
+def run_study(args) -> int:
+    from afripow_pypsa.helpers.jobs import update_job
+    from afripow_pypsa.helpers.preflight import PreflightError
+    from afripow_pypsa.helpers.run_manifest import STAGE_INPUTS, case_years
+    from afripow_pypsa.toolbox.toolbox import (
+        SCREENING_SUFFIX,
+        set_cplex_licence_key,
+        silence_warnings,
+    )
+    from pages.helpers.study_types import STUDY_TYPES
+
+    try:
+        key = study_type_key(args.stage, STUDY_TYPES)
+    except KeyError as e:
+        print(f"[ ERROR ] - {e.args[0]}")
+        return EXIT_USAGE
+    study_type = STUDY_TYPES[key]
+
+    case_folder = Path(args.case).absolute()
+    if not case_folder.is_dir():
+        print(f"[ ERROR ] - Case folder {case_folder} does not exist")
+        return EXIT_USAGE
+    years = parse_years(args.years) if args.years else case_years(case_folder)
+    if not years:
+        print(f"[ ERROR ] - No years to run in {case_folder}")
+        return EXIT_USAGE
+
+    if args.screening and not study_type.get("screening", False):
+        print(f"[ ERROR ] - {key} has no screening mode")
+        return EXIT_USAGE
+    if args.workers > 1 and not study_type.get("parallel_years", False):
+        print(
+            f"[ WARNING ] - {key} solves the years one after the other, --workers ignored"
+        )
+    kwargs = study_kwargs(study_options(args), study_type)
+
+    if args.screening:
+        stages = [f"{study_type['output']}{SCREENING_SUFFIX}"]
+    elif study_type["function"].__name__ == "run_full_chain":
+        stages = list(STAGE_INPUTS)
+    else:
+        stages = [study_type["output"]]
+    if args.job_file:
+        update_job(args.job_file, case=str(case_folder), stages=stages, years=years)
+
+    silence_warnings()
+    set_cplex_licence_key()
+    print(f"[ INFO ] - {key}: {case_folder}, years {years}")
+    try:
+        result = study_type["function"](
+            case_folder,
+            [str(y) for y in years],
+            study_type["input"],
+            study_type["output"],
+            **kwargs,
+        )
+    except PreflightError as e:
+        # only run_preflight stops a run before a solve, any other error is EXIT_ERROR
+        print(f"[ ERROR ] - {e}")
+        return EXIT_INPUTS
+
+    if args.dry_run:
+        # the model sizes, None or empty when resume left nothing to run
+        built = (
+            result is None or result.empty or (result["error"].fillna("") == "").all()
+        )
+        return EXIT_OK if built else EXIT_FAILED_YEARS
+
+    failed = failed_years(case_folder, stages, years)
+    for stage, year, status in failed:
+        print(f"[ WARNING ] - {stage} {year}: {status}")
+    return EXIT_FAILED_YEARS if failed else EXIT_OK
+
+
+def _run_case_stages(
+    case_folder: Path,
+    keys: list[str],
+    years,
+    options: dict,
+    log_folder: Path,
+    admission,
+    batch_stages: dict,
+    parallel_keys: list[str],
+) -> list[dict]:
+    """
+    run the stages of one case one after the other as cli.py processes, every stage waits until
+    admission (helpers/admission.py) has room for its predicted memory, its CPLEX threads are the
+    case's share of the cores
+    """
+    from afripow_pypsa.helpers.admission import predicted_peak_mb
+    from afripow_pypsa.helpers.run_metrics import read_run_metrics
+
+    rows = []
+    for i, key in enumerate(keys):
+        # years solved at the same time inside the stage
+        workers = 1
+        if key in parallel_keys:
+            workers = max(1, min(options["parallel_workers"], len(years)))
+        run_metrics = read_run_metrics(case_folder)
+        predicted_mb = workers * max(
+            predicted_peak_mb(run_metrics, stage, year)
+            for stage in batch_stages[key]
+            for year in years
+        )
+        task = f"{case_folder.name} {key}"
+        threads = admission.acquire(
+            task,
+            predicted_mb,
+            threads=max(1, admission.total_threads // admission.max_solves),
+        )
+        stage_options = {**options}
+        if not options["threads_per_worker"]:
+            stage_options["threads_per_worker"] = max(1, threads // workers)
+
+        log_file = log_folder / f"{case_folder.name} {key.split('.')[0]}.log"
+        command = [
+            sys.executable,
+            "-u",
+            str(Path(__file__).absolute()),
+            *study_args(key, case_folder, years, **stage_options),
+        ]
+        print(f"[ INFO ] - {case_folder.name}: {key} started, log {log_file}")
+        start = time.perf_counter()
+        try:
+            with open(log_file, "w") as log:
+                returncode = subprocess.run(
+                    command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    cwd=Path(__file__).parent,
+                ).returncode
+        finally:
+            admission.finish(task)
+        print(f"[ INFO ] - {case_folder.name}: {key} ended with exit code {returncode}")
+        rows.append(
+            {
+                "case": case_folder.name,
+                "study_type": key,
+                "exit_code": returncode,
+                "wall_time_s": time.perf_counter() - start,
+            }
+        )
+        if returncode != EXIT_OK:
+            # the later stages read the results of this one
+            for skipped in keys[i + 1 :]:
+                rows.append({"case": case_folder.name, "study_type": skipped})
+            break
+    return rows
+
+
+def batch_summary(
+    project_folder: Path, jobs: list[dict], batch_stages: dict, years: dict, since: str
+) -> "pd.DataFrame":
+    """
+    one row per case, stage and year of the batch, from the run_metrics.csv rows recorded
+    since the batch started. batch_stages: {study type: [results stages]}
+    """
+    import pandas as pd
+
+    from afripow_pypsa.helpers.run_metrics import read_run_metrics
+
+    rows = []
+    for job in jobs:
+        metrics = read_run_metrics(project_folder / job["case"])
+        if not metrics.empty:
+            metrics = metrics[metrics["recorded_at"] >= since]
+        for stage in batch_stages[job["study_type"]]:
+            for year in years[job["case"]]:
+                solved = pd.DataFrame()
+                if not metrics.empty:
+                    solved = metrics[
+                        (metrics["stage"] == stage) & (metrics["year"] == year)
+                    ]
+                row = {**job, "stage": stage, "year": year, "status": "not run"}
+                if not solved.empty:
+                    last = solved.iloc[-1]
+                    row.update(
+                        {
+                            "status": last["status"],
+                            "termination_condition": last["termination_condition"],
+                            "solve_time_s": last.get("solve_time_s"),
+                            "objective": last["objective"],
+                        }
+                    )
+                rows.append(row)
+    columns = [
+        "case",
+        "study_type",
+        "stage",
+        "year",
+        "status",
+        "termination_condition",
+        "solve_time_s",
+        "objective",
+        "exit_code",
+        "wall_time_s",
+    ]
+    return pd.DataFrame(rows).reindex(columns=columns)
+
+
+def run_batch(args) -> int:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from afripow_pypsa.helpers.admission import AdmissionController
+    from afripow_pypsa.helpers.jobs import jobs_folder
+    from afripow_pypsa.helpers.run_manifest import STAGE_INPUTS, case_years
+    from afripow_pypsa.toolbox.toolbox import SCREENING_SUFFIX
+    from pages.helpers.study_types import STUDY_TYPES
+
+    project_folder = Path(args.project).absolute()
+    if not project_folder.is_dir():
+        print(f"[ ERROR ] - Project folder {project_folder} does not exist")
+        return EXIT_USAGE
+    try:
+        keys = {study_type_key(stage, STUDY_TYPES) for stage in args.stages}
+    except KeyError as e:
+        print(f"[ ERROR ] - {e.args[0]}")
+        return EXIT_USAGE
+    keys = [key for key in STUDY_TYPES if key in keys]
+    cases = args.cases or project_cases(project_folder)
+    missing = [case for case in cases if not (project_folder / case).is_dir()]
+    if missing or not cases:
+        print(f"[ ERROR ] - No case folders {missing} in {project_folder}")
+        return EXIT_USAGE
+
+    years = {
+        case: (
+            parse_years(args.years) if args.years else case_years(project_folder / case)
+        )
+        for case in cases
+    }
+    batch_stages = {}
+    for key in keys:
+        if args.screening:
+            batch_stages[key] = [f"{STUDY_TYPES[key]['output']}{SCREENING_SUFFIX}"]
+        elif STUDY_TYPES[key]["function"].__name__ == "run_full_chain":
+            batch_stages[key] = list(STAGE_INPUTS)
+        else:
+            batch_stages[key] = [STUDY_TYPES[key]["output"]]
+
+    batch_id = f"batch-{time.strftime('%Y%m%d-%H%M%S')}"
+    log_folder = jobs_folder(project_folder) / batch_id
+    log_folder.mkdir(parents=True)
+    since = time.strftime("%Y-%m-%d %H:%M:%S")
+    options = study_options(args)
+    # each case gets an equal share of the cores, a case starts its next stage only when the
+    # memory it needed before fits next to the running ones
+    admission = AdmissionController(
+        min(args.max_concurrent, len(cases)),
+        total_threads=os.cpu_count(),
+        memory_budget_mb=(args.memory_budget_gb or 0) * 1024,
+    )
+    parallel_keys = [key for key in keys if STUDY_TYPES[key].get("parallel_years")]
+    print(f"\nBatch {batch_id}")
+    print("---------------------------")
+    print(f"Cases        : {cases}")
+    print(f"Study types  : {keys}")
+    print(f"Concurrent   : {args.max_concurrent} cases")
+    print(f"Memory budget: {admission.memory_budget_mb:.0f} MB")
+    print("---------------------------\n")
+
+    with ThreadPoolExecutor(max_workers=max(1, args.max_concurrent)) as pool:
+        futures = [
+            pool.submit(
+                _run_case_stages,
+                project_folder / case,
+                keys,
+                years[case],
+                options,
+                log_folder,
+                admission,
+                batch_stages,
+                parallel_keys,
+            )
+            for case in cases
+        ]
+        jobs = [row for future in futures for row in future.result()]
+
+    summary = batch_summary(project_folder, jobs, batch_stages, years, since)
+    summary_file = project_folder / f"batch_summary_{batch_id}.csv"
+    summary.to_csv(summary_file, index=False)
+    print("\n\nBatch summary")
+    print("-------------")
+    print(summary.to_string(index=False))
+    print(f"Saved to {summary_file}\n")
+    failed = [job for job in jobs if job.get("exit_code") != EXIT_OK]
+    return EXIT_FAILED_YEARS if failed else EXIT_OK
+
+
+def run_report(args) -> int:
+    # no display on a server
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from afripow_pypsa.toolbox.toolbox import generate_case_report, silence_warnings
+
+    case_folder = Path(args.case).absolute()
+    if not case_folder.is_dir():
+        print(f"[ ERROR ] - Case folder {case_folder} does not exist")
+        return EXIT_USAGE
+    if not Path(args.settings).is_file():
+        print(f"[ ERROR ] - Settings file {args.settings} does not exist")
+        return EXIT_USAGE
+
+    silence_warnings()
+    kwargs = {}
+    if args.price_y_lim is not None:
+        kwargs["marginal_price_durtion_curve_plot"] = {
+            "plt": {"ylim": (0, args.price_y_lim)}
+        }
+    generate_case_report(
+        case_folder.name,
+        str(Path(args.settings).absolute()),
+        case_folder,
+        args.results_dir,
+        reports_to_run=args.reports,
+        link_plot_color=args.link_plot_color,
+        currency_str=args.currency,
+        **kwargs,
+    )
+    return EXIT_OK
+
+
+def run_rebuild(args) -> int:
+    from afripow_pypsa.helpers.jobs import update_job
+    from afripow_pypsa.helpers.preflight import PreflightError
+    from afripow_pypsa.helpers.run_manifest import STAGE_INPUTS, case_years
+    from afripow_pypsa.toolbox.toolbox import (
+        rebuild_stale,
+        set_cplex_licence_key,
+        silence_warnings,
+    )
+
+    case_folder = Path(args.case).absolute()
+    if not case_folder.is_dir():
+        print(f"[ ERROR ] - Case folder {case_folder} does not exist")
+        return EXIT_USAGE
+    years = parse_years(args.years) if args.years else case_years(case_folder)
+    if args.job_file:
+        update_job(
+            args.job_file, case=str(case_folder), stages=list(STAGE_INPUTS), years=years
+        )
+
+    silence_warnings()
+    set_cplex_licence_key()
+    print(f"[ INFO ] - Rebuild stale outputs: {case_folder}, years {years}")
+    try:
+        rebuilt = rebuild_stale(
+            case_folder,
+            years,
+            background_export=args.background_export,
+            warm_start=args.warm_start,
+            solver_profile=args.solver_profile,
+            lazy_reserves=args.lazy_reserves,
+        )
+    except PreflightError as e:
+        print(f"[ ERROR ] - {e}")
+        return EXIT_INPUTS
+
+    print(f"[ INFO ] - Rebuilt {len(rebuilt)} stale outputs")
+    failed = [
+        failure
+        for stage, year in zip(rebuilt["stage"], rebuilt["year"])
+        for failure in failed_years(case_folder, [stage], [year])
+    ]
+    for stage, year, status in failed:
+        print(f"[ WARNING ] - {stage} {year}: {status}")
+    return EXIT_FAILED_YEARS if failed else EXIT_OK
+
+
+def run_check_reserves(args) -> int:
+    from afripow_pypsa.toolbox.toolbox import (
+        check_reserve_formulations,
+        set_cplex_licence_key,
+        silence_warnings,
+    )
+
+    case_folder = Path(args.case).absolute()
+    if not case_folder.is_dir():
+        print(f"[ ERROR ] - Case folder {case_folder} does not exist")
+        return EXIT_USAGE
+    stage = {"uc": "Results_uc", "opt": "Results_opt", "opti": "Results_opti"}[
+        args.stage
+    ]
+    silence_warnings()
+    set_cplex_licence_key()
+    check = check_reserve_formulations(case_folder, args.year, stage, args.threads)
+    return EXIT_OK if check["same"].all() else EXIT_FAILED_YEARS
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Run AfriPow PyPSA studies and reports without the UI",
+        epilog="exit codes: 0 ok, 1 failed years, 2 bad arguments, "
+        "3 stopped by the pre-flight check, 4 error, 130 interrupted",
+    )
+    parser.add_argument(
+        "--cprofile", metavar="FILE", help="save cProfile stats of the run to FILE"
+    )
+    parser.add_argument(
+        "--job-file", metavar="FILE", help="job.json to keep the status of the run in"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    # the study options, shared by study and batch
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument(
+        "--years", nargs="+", help="years to run, e.g. 2025 2026 or 2025-2030"
+    )
+    options.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="years (stage years for chain) solved at the same time",
+    )
+    options.add_argument(
+        "--threads", type=int, default=None, help="CPLEX threads per worker"
+    )
+    options.add_argument(
+        "--memory-budget-gb",
+        type=float,
+        default=None,
+        help="start a solve only when its predicted peak memory fits, 85%% of the "
+        "machine by default",
+    )
+    options.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="build the next year while the current year solves (opt, opti)",
+    )
+    options.add_argument(
+        "--background-export",
+        action="store_true",
+        help="write the results folders in the background",
+    )
+    options.add_argument(
+        "--warm-start", choices=["previous_year", "results_uc"], default=None
+    )
+    options.add_argument(
+        "--solver-profile",
+        default=None,
+        help="a name in SOLVER_PROFILES, helpers/solver_profiles.py",
+    )
+    options.add_argument("--lazy-reserves", action="store_true")
+    options.add_argument(
+        "--resume", action="store_true", help="skip the years that are current"
+    )
+    options.add_argument("--no-preflight", action="store_true")
+    options.add_argument(
+        "--screening", action="store_true", help="representative periods only (uc)"
+    )
+    options.add_argument("--screening-period-hours", type=int, default=24)
+    options.add_argument("--screening-periods", type=int, default=12)
+
+    study = commands.add_parser(
+        "study", parents=[options], help="run a study stage for a case"
+    )
+    study.add_argument("stage", help=f"{', '.join(STAGE_ALIASES)} or a STUDY_TYPES key")
+    study.add_argument("case", help="case folder, holds one folder per year")
+    study.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="build the models and report their size and memory, nothing is solved",
+    )
+    study.set_defaults(run=run_study)
+
+    batch = commands.add_parser(
+        "batch", parents=[options], help="run study stages for several cases"
+    )
+    batch.add_argument("project", help="project folder, holds the case folders")
+    batch.add_argument(
+        "--stages",
+        nargs="+",
+        required=True,
+        help="study types to run for every case, in STUDY_TYPES order",
+    )
+    batch.add_argument(
+        "--cases", nargs="+", help="case folders of the project, all cases by default"
+    )
+    batch.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=2,
+        help="cases solving at the same time (each with --workers years)",
+    )
+    batch.set_defaults(run=run_batch)
+
+    report = commands.add_parser("report", help="generate the case report")
+    report.add_argument("case", help="case folder")
+    report.add_argument("settings", help="report settings xlsx")
+    report.add_argument("results_dir", help="stage folder to report, e.g. Results_opt")
+    report.add_argument("--reports", nargs="+", choices=REPORTS, default=["ALL"])
+    report.add_argument("--link-plot-color", default=None)
+    report.add_argument("--currency", default="$/MWh")
+    report.add_argument(
+        "--price-y-lim", type=float, default=None, help="y limit of the price curve"
+    )
+    report.set_defaults(run=run_report)
+
+    rebuild = commands.add_parser(
+        "rebuild", help="solve the stale outputs of a case again, stage by stage"
+    )
+    rebuild.add_argument("case", help="case folder")
+    rebuild.add_argument(
+        "--years", nargs="+", help="years to check, all the years by default"
+    )
+    rebuild.add_argument("--background-export", action="store_true")
+    rebuild.add_argument(
+        "--warm-start", choices=["previous_year", "results_uc"], default=None
+    )
+    rebuild.add_argument("--solver-profile", default=None)
+    rebuild.add_argument("--lazy-reserves", action="store_true")
+    rebuild.set_defaults(run=run_rebuild)
+
+    check_reserves = commands.add_parser(
+        "check-reserves",
+        help="solve a year with the sparse and the per level and area reserves and compare",
+    )
+    check_reserves.add_argument("case", help="case folder")
+    check_reserves.add_argument("year", type=int)
+    check_reserves.add_argument("--stage", choices=["uc", "opt", "opti"], default="uc")
+    check_reserves.add_argument(
+        "--threads", type=int, default=None, help="CPLEX threads"
+    )
+    check_reserves.set_defaults(run=run_check_reserves)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.job_file:
+        from afripow_pypsa.helpers.jobs import read_job, update_job
+
+        update_job(args.job_file, status="running", pid=os.getpid())
+    profiler = None
+    if args.cprofile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        returncode = args.run(args)
+    except KeyboardInterrupt:
+        print("[ WARNING ] - Interrupted")
+        returncode = EXIT_INTERRUPTED
+    except Exception:
+        traceback.print_exc()
+        returncode = EXIT_ERROR
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"[ INFO ] - cProfile stats saved to {args.cprofile}")
+
+    if args.job_file and read_job(args.job_file).get("status") != "cancelled":
+        update_job(
+            args.job_file,
+            status="finished" if returncode == EXIT_OK else "failed",
+            returncode=returncode,
+            finished_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+            finished_ts=time.time(),
+        )
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,24 @@
-import json
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
-from huey import SqliteHuey
-import time
-from pages.task_que.task_que import create_excel_file, huey, PATH_TO_GIM
+from pages.task_que.job_store import ACTIVE_JOB_STATUSES, jobs_frame
+from pages.task_que.task_que import (
+    create_excel_file,
+    huey,
+    task_log_file,
+    PATH_TO_GIM,
+    PATH_TO_TASK_DB,
+    QUEUE_MEMORY_GB,
+    QUEUE_THREADS,
+)
 
 with st.container(border=True):
     st.write("# Task que (experimental)")
+    st.write(
+        "Studies and reports are queued from the Studies and Reporting pages. "
+        "Start the consumer with task.bat."
+    )
 
 
 if st.button("Refresh"):
@@ -24,14 +34,73 @@ if st.button("Start Task"):
         ),
         use_container_width=True,
     )
-#
-# try:
-#     with open("current_task.json", "r", encoding="utf-8") as f:
-#         data = json.load(f)
-#         st.write(data)
-# except FileNotFoundError:
-#     st.write({"message": "No current task found"})
+
+JOB_TABLE_COLUMNS = [
+    "label",
+    "kind",
+    "status",
+    "priority",
+    "threads",
+    "memory_gb",
+    "admitted_threads",
+    "attempts",
+    "enqueued_at",
+    "started_at",
+    "finished_at",
+    "waited_min",
+    "duration_min",
+    "error",
+    "task_id",
+]
+
+
+@st.fragment(run_every=10)
+def show_jobs():
+    """pending, running and finished jobs, refreshed every 10 seconds"""
+    jobs = jobs_frame(PATH_TO_TASK_DB)
+    st.write(
+        f"{huey.pending_count()} tasks in the queue, {huey.scheduled_count()} retries scheduled"
+    )
+
+    st.write("# Pending")
+    pending = jobs[jobs["status"].isin(["pending", "retrying"])]
+    st.dataframe(
+        pending.sort_values("priority", ascending=False)[JOB_TABLE_COLUMNS],
+        use_container_width=True,
+        hide_index=True,
+    )
+    revoke = st.selectbox("Pending job", pending["task_id"], index=None)
+    if st.button("Revoke job", disabled=revoke is None):
+        huey.revoke_by_id(revoke)
+        st.rerun(scope="fragment")
+
+    st.write("# Running")
+    running = jobs[jobs["status"].isin(["waiting", "running"])]
+    admitted = running[running["admitted_threads"].notna()]
+    st.write(
+        f"{admitted['admitted_threads'].sum():.0f} of {QUEUE_THREADS} threads and "
+        f"{admitted['memory_gb'].sum():.1f} of {QUEUE_MEMORY_GB:.1f} GB in use, "
+        "'waiting' studies start when theirs fit"
+    )
+    st.dataframe(running[JOB_TABLE_COLUMNS], use_container_width=True, hide_index=True)
+
+    st.write("# Finished")
+    finished = jobs[~jobs["status"].isin(ACTIVE_JOB_STATUSES)]
+    st.dataframe(finished[JOB_TABLE_COLUMNS], use_container_width=True, hide_index=True)
+
+    log_job = st.selectbox(
+        "Show the log of",
+        jobs["task_id"],
+        index=None,
+        format_func=lambda i: jobs.set_index("task_id").loc[i, "label"] or i,
+    )
+    if log_job is not None and task_log_file(log_job).exists():
+        st.code(
+            "\n".join(
+                task_log_file(log_job).read_text(errors="replace").splitlines()[-60:]
+            ),
+            language=None,
+        )
 
 
-st.write("# Task que")
-st.dataframe(pd.DataFrame(huey.pending()), use_container_width=True)
+show_jobs()
@@ -1,4 +1,5 @@
 import os
+import subprocess
 import sys
 from pathlib import Path
 import pandas as pd
@@ -9,11 +10,28 @@ from pages.helpers.excess_energy_optimisation import (
 )
 
 from afripow_pypsa.toolbox.toolbox import (
+    MODEL_SIZE_COLUMNS,
+    model_size_file,
     silence_warnings,
     set_cplex_licence_key,
 )
+from afripow_pypsa.helpers.admission import total_memory_mb
+from afripow_pypsa.helpers.run_manifest import STAGE_INPUTS, stale_outputs
+from afripow_pypsa.helpers.jobs import (
+    ACTIVE_STATUSES,
+    cancel_job,
+    job_file,
+    job_progress,
+    job_status,
+    list_jobs,
+    log_tail,
+    read_job,
+    start_job,
+)
 
 from afripow_pypsa.helpers.direcory_cases import find_int_named_subdirs
+from afripow_pypsa.helpers.warm_start import WARM_START_MODES
+from afripow_pypsa.helpers.solver_profiles import SOLVER_PROFILES
 
 from pages.helpers.helpers import (
     open_location,
@@ -26,6 +44,11 @@ from pages.helpers.helpers import (
     study_type_input,
 )
 from pages.helpers.study_types import STUDY_TYPES
+from pages.helpers.user_settings_db import (
+    get_setting_for_current_user,
+    set_setting_for_current_user,
+)
+import cli
 
 page_setup(page_name="PyPSA Studies")
 
@@ -70,6 +93,105 @@ years = st_container.multiselect(
     default=years_in_directory,
 )
 
+# parallel solving of independent years
+parallel_workers = 1
+threads_per_worker = None
+memory_budget_gb = None
+if STUDY_TYPES[study_type].get("parallel_years", False):
+    parallel_workers = st_container.number_input(
+        "Parallel year workers",
+        min_value=1,
+        max_value=max(1, os.cpu_count() or 1),
+        value=1,
+        help="Number of years solved at the same time. 1 solves the years one after another.",
+    )
+    if parallel_workers > 1:
+        threads_per_worker = st_container.number_input(
+            "CPLEX threads per worker",
+            min_value=0,
+            max_value=max(1, os.cpu_count() or 1),
+            value=0,
+            help="0 splits the free cores between the years that start together",
+        )
+        memory_budget_gb = st_container.number_input(
+            "Memory budget (GB)",
+            min_value=0.0,
+            value=0.0,
+            help="A year only starts when the peak memory it used before fits next to the "
+            "running years. 0 uses 85% of the machine's memory.",
+        )
+
+# build the next year while the current year is solving
+pipelined = False
+if STUDY_TYPES[study_type].get("pipelined", False):
+    pipelined = st_container.checkbox(
+        "Prefetch next year while solving",
+        value=False,
+        help="Loads and builds year N+1 in the background while year N is in CPLEX. Uses more memory.",
+    )
+
+background_export = st_container.checkbox(
+    "Write results in background",
+    value=False,
+    help="The next year starts while the results csv files of the last year are being written.",
+)
+
+# representative period screening
+screening = False
+screening_kwargs = {}
+if STUDY_TYPES[study_type].get("screening", False):
+    screening = st_container.checkbox(
+        "Screening run (representative periods)",
+        value=False,
+        help="Solves representative days or weeks with scaled snapshot weightings, results go to "
+        "a separate '_screening' folder and are compared with the last full run.",
+    )
+    if screening:
+        screening_block = st_container.radio(
+            "Representative block", ["day", "week"], horizontal=True
+        )
+        screening_kwargs = {
+            "screening": True,
+            "screening_period_hours": 24 if screening_block == "day" else 168,
+            "screening_periods": st_container.number_input(
+                f"Number of representative {screening_block}s",
+                min_value=1,
+                max_value=365 if screening_block == "day" else 52,
+                value=12 if screening_block == "day" else 4,
+            ),
+        }
+
+profiles = list(SOLVER_PROFILES)
+solver_profile = st_container.selectbox(
+    "Solver profile",
+    profiles,
+    index=profiles.index(STUDY_TYPES[study_type].get("solver_profile", "default")),
+    help="CPLEX parameters used for the solve, see afripow_pypsa/helpers/solver_profiles.py",
+)
+
+warm_start = st_container.selectbox(
+    "CPLEX warm start",
+    ["off"] + WARM_START_MODES,
+    index=0,
+    help="Start CPLEX from the saved basis of the previous year or of the same year in Results_uc. "
+    "Solve time and iterations are recorded in run_metrics.csv in the case folder.",
+)
+
+lazy_reserves = st_container.checkbox(
+    "Lazy reserve constraints",
+    value=False,
+    help="Solve with the reserve rows of the peak load hours only, add the hours where the reserves "
+    "are violated and solve again until none are. The solves are listed in z_reserve_iterations.csv.",
+)
+
+resume = st_container.checkbox(
+    "Resume (skip years that are up to date)",
+    value=False,
+    help="Skips the years that were solved and whose inputs did not change since, see the "
+    "run_manifest_<stage>.json in the case folder. Optimum expansion restarts its chain from the "
+    "first year that is missing or out of date.",
+)
+
 # refresh button
 
 
@@ -83,12 +205,55 @@ save_to_dir = STUDY_TYPES[study_type]["output"]
 doc = STUDY_TYPES[study_type]["doc"]
 solver_function = STUDY_TYPES[study_type]["function"]
 
+# model sizes of the selected years from the last dry run (cli.py study --dry-run)
+case_folder = Path(BASE_DIR) / start_dir
+size_stages = (
+    list(STAGE_INPUTS)
+    if solver_function.__name__ == "run_full_chain"
+    else [save_to_dir]
+)
+size_frames = [
+    pd.read_csv(model_size_file(case_folder, stage))
+    for stage in size_stages
+    if model_size_file(case_folder, stage).exists()
+]
+model_sizes = (
+    pd.concat(size_frames, ignore_index=True)
+    if size_frames
+    else pd.DataFrame(columns=MODEL_SIZE_COLUMNS)
+)
+model_sizes = model_sizes[model_sizes["year"].astype(str).isin(map(str, years))]
+built = model_sizes.dropna(subset=["nonzeros"])
+machine_gb = total_memory_mb() / 1024
+if built.empty:
+    model_size_text = "Not previewed yet, press Preview Model Size"
+    peak_memory_text = ""
+else:
+    largest = built.loc[built["nonzeros"].idxmax()]
+    model_size_text = (
+        f"{largest['stage']} {largest['year']}: {largest['variables']:,.0f} variables, "
+        f"{largest['constraints']:,.0f} constraints, {largest['nonzeros']:,.0f} nonzeros"
+    )
+    peak_memory_text = (
+        f"{built['estimated_peak_mb'].max() / 1024:.1f} GB per solve, "
+        f"the machine has {machine_gb:.0f} GB"
+    )
+
 setttings_file = None
 # Table summary
 if study_type != "4. Excess Energy Optimisation":
     st.table(
         pd.DataFrame(
-            [doc, BASE_DIR, start_dir, load_from_dir, save_to_dir, years],
+            [
+                doc,
+                BASE_DIR,
+                start_dir,
+                load_from_dir,
+                save_to_dir,
+                years,
+                model_size_text,
+                peak_memory_text,
+            ],
             columns=["Value"],
             index=[
                 "Study description",
@@ -97,9 +262,19 @@ if study_type != "4. Excess Energy Optimisation":
                 f"Case input directory [load from]",
                 "Results output directory [write to]",
                 "Selected Solver Years",
+                "Model size [largest year]",
+                "Estimated peak memory",
             ],
         )
     )
+    if not model_sizes.empty:
+        st.dataframe(model_sizes, use_container_width=True, hide_index=True)
+        if (built["estimated_peak_mb"] > machine_gb * 1024).any():
+            st.warning(
+                "The largest models are expected to need more memory than the machine has."
+            )
+        if (model_sizes["error"].fillna("") != "").any():
+            st.warning("Some models could not be built, see the error column.")
 else:
     setttings_file = file_selector(Path(BASE_DIR), st)
     if setttings_file:
@@ -141,19 +316,175 @@ else:
 if st.button("Open Case Directory", type="primary"):
     open_location(Path(BASE_DIR) / start_dir)
 
+# build the models of the selected years without solving, in its own process so the memory is
+# that of a solve and the page does not hold the models
+if study_type != "4. Excess Energy Optimisation" and st.button(
+    "Preview Model Size",
+    disabled=len(years) == 0,
+    help="Builds the model of every selected year with the custom constraints, nothing is solved.",
+):
+    with st.spinner("Building the models. Output in terminal window."):
+        returncode = subprocess.run(
+            [
+                sys.executable,
+                "-u",
+                str(Path(cli.__file__).absolute()),
+                *cli.study_args(
+                    study_type,
+                    case_folder,
+                    years,
+                    lazy_reserves=lazy_reserves,
+                    dry_run=True,
+                ),
+            ],
+            cwd=Path(cli.__file__).absolute().parent,
+        ).returncode
+    if returncode == cli.EXIT_OK:
+        st.rerun()
+    st.error(f"The dry run ended with exit code {returncode}")
+
 # run button
 refresh_button(sidebar=False)
 v = "Run Study" if len(years) > 0 else "Select years to enable Run button"
 run_button = st.button(v, type="primary", disabled=len(years) == 0)
 if run_button:
-    with st.spinner("Report is running. Output in terminal window."):
-        f = STUDY_TYPES[study_type]["function"]
-        f(
-            BASE_DIR / Path(start_dir),
-            [str(y) for y in years],
-            load_from_dir,
-            save_to_dir,
-        )  # st.rerun()
+    # the study runs as its own process (cli.py), the page only follows the job
+    kwargs = {
+        "background_export": background_export,
+        "warm_start": None if warm_start == "off" else warm_start,
+        "solver_profile": solver_profile,
+        "lazy_reserves": lazy_reserves,
+        "resume": resume,
+    }
+    if STUDY_TYPES[study_type].get("parallel_years", False):
+        kwargs["parallel_workers"] = parallel_workers
+        kwargs["threads_per_worker"] = threads_per_worker or None
+        kwargs["memory_budget_gb"] = memory_budget_gb or None
+    if STUDY_TYPES[study_type].get("pipelined", False):
+        kwargs["pipelined"] = pipelined
+    kwargs.update(screening_kwargs)
+    job = start_job(
+        BASE_DIR,
+        Path(cli.__file__),
+        cli.study_args(study_type, Path(BASE_DIR) / start_dir, years, **kwargs),
+        label=f"{start_dir} - {study_type} - {years[0]}-{years[-1]}",
+    )
+    set_setting_for_current_user("study_job", job["id"])
+    st.toast(f"Started job {job['id']}")
+
+# the same study through the job queue (pages/task_que), runs when a worker is free
+with st.expander("Queue study"):
+    queue_priority = st.number_input("Priority (higher runs first)", value=0, step=1)
+    queue_threads = st.number_input(
+        "CPLEX threads", min_value=1, max_value=max(1, os.cpu_count() or 1), value=4
+    )
+    queue_memory_gb = st.number_input(
+        "Expected peak memory (GB)",
+        min_value=0.0,
+        value=8.0,
+        help="The job waits in its worker until its threads and memory fit next to the running "
+        "jobs. Parallel years stay within this memory.",
+    )
+    queue_retries = st.number_input(
+        "Retries when the run crashes", min_value=0, value=1
+    )
+    if st.button("Queue Study", disabled=len(years) == 0):
+        from pages.task_que.task_que import enqueue_study
+
+        queue_kwargs = {
+            "background_export": background_export,
+            "warm_start": None if warm_start == "off" else warm_start,
+            "solver_profile": solver_profile,
+            "lazy_reserves": lazy_reserves,
+            "resume": resume,
+            **screening_kwargs,
+        }
+        if STUDY_TYPES[study_type].get("parallel_years", False):
+            queue_kwargs["parallel_workers"] = parallel_workers
+            queue_kwargs["memory_budget_gb"] = memory_budget_gb or None
+        if STUDY_TYPES[study_type].get("pipelined", False):
+            queue_kwargs["pipelined"] = pipelined
+        task_id = enqueue_study(
+            f"{start_dir} - {study_type} - {years[0]}-{years[-1]}",
+            study_type,
+            Path(BASE_DIR) / start_dir,
+            years,
+            queue_kwargs,
+            priority=int(queue_priority),
+            threads=int(queue_threads),
+            memory_gb=float(queue_memory_gb),
+            retries=int(queue_retries),
+        )
+        st.toast(f"Queued task {task_id}, see the Worker QUE page")
+
+
+@st.fragment(run_every=5)
+def show_job(job_id):
+    """status, stage / year progress and the log tail of a job, refreshed every 5 seconds"""
+    job = read_job(job_file(BASE_DIR, job_id))
+    status = job_status(job)
+    col_status, col_cancel = st.columns([4, 1])
+    col_status.write(f"**{job.get('label', job_id)}**: {status}")
+    if col_cancel.button(
+        "Cancel job", disabled=status not in ACTIVE_STATUSES, key=f"cancel_{job_id}"
+    ):
+        cancel_job(BASE_DIR, job_id)
+        st.rerun(scope="fragment")
+
+    progress = job_progress(job)
+    if not progress.empty:
+        done = progress["status"].isin(["ok"]).sum()
+        st.progress(done / len(progress), text=f"{done} of {len(progress)} stage years")
+        st.dataframe(
+            progress.pivot(index="stage", columns="year", values="status"),
+            use_container_width=True,
+        )
+    st.code(log_tail(BASE_DIR, job_id) or "(no output yet)", language=None)
+
+
+# jobs of the study base directory, a new session can reconnect to a running job
+with st.expander("Study jobs", expanded=True):
+    jobs = list_jobs(BASE_DIR)
+    if jobs.empty:
+        st.write("No jobs started yet.")
+    else:
+        job_ids = jobs["id"].tolist()
+        last_job = get_setting_for_current_user("study_job")
+        selected_job = st.selectbox(
+            "Job",
+            job_ids,
+            index=job_ids.index(last_job) if last_job in job_ids else 0,
+            format_func=lambda i: " | ".join(
+                str(v) for v in jobs.set_index("id").loc[i, ["label", "status"]]
+            ),
+        )
+        show_job(selected_job)
+        st.dataframe(jobs, use_container_width=True, hide_index=True)
+
+# stale outputs of the case, over all stages and years
+with st.expander("Stale outputs"):
+    stale = stale_outputs(case_folder) if case_folder.is_dir() else pd.DataFrame()
+    if stale.empty:
+        st.write("All solved outputs are up to date.")
+    else:
+        st.dataframe(stale, use_container_width=True, hide_index=True)
+    if st.button("Rebuild stale", type="primary", disabled=stale.empty):
+        # its own process (cli.py rebuild), followed under Study jobs
+        job = start_job(
+            BASE_DIR,
+            Path(cli.__file__),
+            cli.rebuild_args(
+                case_folder,
+                background_export=background_export,
+                warm_start=None if warm_start == "off" else warm_start,
+                solver_profile=solver_profile,
+                lazy_reserves=lazy_reserves,
+            ),
+            label=f"{start_dir} - Rebuild stale",
+        )
+        set_setting_for_current_user("study_job", job["id"])
+        st.toast(f"Started job {job['id']}")
+        st.rerun()
 
 package_version()
 
@@ -273,6 +273,11 @@ if excel_file:
             type="primary",
             use_container_width=True,
         )
+        queue_all = st.sidebar.button(
+            "Queue All Plots",
+            use_container_width=True,
+            help="Runs the report in the job queue, see the Worker QUE page",
+        )
         # run_all = st.sidebar.button(
         #     ":white[Generate All Plots]", type="primary", use_container_width=True
         # )
@@ -284,6 +289,22 @@ if excel_file:
         }
         print(settings_kwargs)
 
+        if queue_all:
+            from pages.task_que.task_que import enqueue_report
+
+            report_options = {"link_plot_color": link_plot_color, "currency": currency}
+            if isinstance(marginal_price_y_lim, float):
+                report_options["price_y_lim"] = marginal_price_y_lim
+            task_id = enqueue_report(
+                f"{start_dir} - {study_type} report",
+                Path(BASE_DIR) / Path(start_dir),
+                excel_file,
+                study_type,
+                reports=["ALL"],
+                options=report_options,
+            )
+            st.toast(f":green[Report queued, task {task_id}]")
+
         if run_capacity_energy:
             with st.spinner("Report is running. Output in terminal window."):
                 generate_case_report(
@@ -164,7 +164,8 @@ def list_directories_with_paths(base_directory) -> dict:
     directories = {}  # Dictionary to store directory names and paths
     with os.scandir(base_directory) as entries:
         for entry in entries:
-            if entry.is_dir():  # Check if the entry is a directory
+            # Check if the entry is a directory, hidden ones (.jobs) are not cases
+            if entry.is_dir() and not entry.name.startswith("."):
                 directories[entry.name] = (
                     entry.path
                 )  # Add directory name and path to the dictionary
@@ -2,6 +2,7 @@ from afripow_pypsa.toolbox.toolbox import (
     run_unconstrained_expansion,
     run_optimum_expansion,
     run_incremental_demand_expansion,
+    run_full_chain,
 )
 
 STUDY_TYPES = {
@@ -10,18 +11,38 @@ STUDY_TYPES = {
         "output": "Results_uc",
         "function": run_unconstrained_expansion,
         "doc": "1) Adding Hydro Efficiency, 2) Fix Battery Capacity, 3) Add reserve constraints",
+        "parallel_years": True,  # years are independent, can be solved in a process pool
+        "pipelined": False,
+        "solver_profile": "default",  # a name in SOLVER_PROFILES, helpers/solver_profiles.py
+        "screening": True,  # can run on representative days/weeks
     },
     "2. Optimum Expansion": {
         "input": "Results_uc",
         "output": "Results_opt",
         "function": run_optimum_expansion,
         "doc": "Add documentation for Optimum Expansion",
+        "parallel_years": False,
+        "pipelined": True,  # next year is built while the current year is solving
+        "solver_profile": "default",
     },
     "3. Incremental Demand Expansion": {
         "input": "Results_opt",
         "output": "Results_opti",
         "function": run_incremental_demand_expansion,
         "doc": "Add documentation for Incremental Demand Expansion",
+        "parallel_years": False,
+        "pipelined": True,  # next year is built while the current year is solving
+        "solver_profile": "default",
+    },
+    "5. Full Chain (uc -> opt -> opti)": {
+        "input": "Inputs",
+        "output": "Results_opti",
+        "function": run_full_chain,
+        "doc": "Unconstrained, Optimum and Incremental Demand Expansion as one dependency graph: "
+        "optimum year N starts when unconstrained year N and optimum year N-1 are done",
+        "parallel_years": True,  # number of concurrent solves
+        "pipelined": False,
+        "solver_profile": "default",
     },
     # "4. Excess Energy Optimisation": {
     #     "input": "Results_opt",
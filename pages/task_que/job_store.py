@@ -0,0 +1,200 @@
+"""
+The jobs of the huey queue with their status and timing, in the sqlite file PATH_TO_TASK_DB.
+
+huey only knows the pending tasks and the results, so every job is added here when it is
+enqueued ('pending') and the consumer signals (task_que.record_job_status) move it to 'running',
+'retrying', 'finished', 'failed', 'error', 'revoked' ... with the start and end time, the number of
+attempts and the result. Several consumer processes write to it, every write is one short
+transaction.
+
+The same table admits the studies across the consumer processes: a study task waits ('waiting')
+until try_admit finds room for its CPLEX threads and memory_gb next to the admitted jobs that are
+still running, then it runs with 'admitted_threads' set. The first job is always admitted.
+
+Every job records the pid of the consumer process that runs it ('worker_pid'). A consumer that is
+killed (the task.bat window closed, a restart) can not update its jobs, so try_admit does not
+count running jobs whose worker is gone, and mark_lost_jobs, called when a consumer starts, sets
+the 'running' and 'waiting' jobs of dead workers to 'lost'.
+"""
+
+import json
+import math
+import sqlite3
+import time
+
+import os
+
+import pandas as pd
+
+from afripow_pypsa.helpers.jobs import pid_alive
+
+JOB_COLUMNS = [
+    "task_id",
+    "kind",
+    "label",
+    "priority",
+    "threads",
+    "memory_gb",
+    "retries",
+    "status",
+    "attempts",
+    "enqueued_at",
+    "started_at",
+    "finished_at",
+    "result",
+    "error",
+    "admitted_threads",
+    "worker_pid",
+]
+ACTIVE_JOB_STATUSES = ["pending", "waiting", "running", "retrying"]
+
+
+def _connect(db_file):
+    connection = sqlite3.connect(db_file, timeout=30)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "task_id TEXT PRIMARY KEY, kind TEXT, label TEXT, priority INTEGER, threads INTEGER, "
+        "memory_gb REAL, retries INTEGER, status TEXT, attempts INTEGER DEFAULT 0, "
+        "enqueued_at REAL, started_at REAL, finished_at REAL, result TEXT, error TEXT, "
+        "admitted_threads INTEGER, worker_pid INTEGER)"
+    )
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+    for column in ["admitted_threads", "worker_pid"]:
+        if column not in columns:
+            # a task db of an earlier version
+            connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+    return connection
+
+
+def add_job(
+    db_file, task_id, kind, label, priority=0, threads=None, memory_gb=None, retries=0
+):
+    with _connect(db_file) as connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO jobs (task_id, kind, label, priority, threads, memory_gb, "
+            "retries, status, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+            (task_id, kind, label, priority, threads, memory_gb, retries, time.time()),
+        )
+
+
+def update_job(db_file, task_id, **fields):
+    """set columns of a job, a job that was not added (a task enqueued elsewhere) is created"""
+    if "result" in fields and not isinstance(fields["result"], str):
+        fields["result"] = json.dumps(fields["result"], default=str)
+    with _connect(db_file) as connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO jobs (task_id, status, enqueued_at) VALUES (?, 'pending', ?)",
+            (task_id, time.time()),
+        )
+        if fields:
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE task_id = ?",
+                (*fields.values(), task_id),
+            )
+
+
+def job_started(db_file, task_id):
+    """called in the consumer process that runs the job"""
+    with _connect(db_file) as connection:
+        connection.execute(
+            "INSERT OR IGNORE INTO jobs (task_id, status, enqueued_at) VALUES (?, 'pending', ?)",
+            (task_id, time.time()),
+        )
+        connection.execute(
+            "UPDATE jobs SET status = 'running', started_at = ?, finished_at = NULL, "
+            "admitted_threads = NULL, worker_pid = ?, attempts = COALESCE(attempts, 0) + 1 "
+            "WHERE task_id = ?",
+            (time.time(), os.getpid(), task_id),
+        )
+
+
+def _set_lost(connection, task_ids):
+    connection.executemany(
+        "UPDATE jobs SET status = 'lost', admitted_threads = NULL, finished_at = ?, "
+        "error = 'the worker process ended while the job was active' WHERE task_id = ?",
+        [(time.time(), task_id) for task_id in task_ids],
+    )
+
+
+def mark_lost_jobs(db_file) -> int:
+    """set the 'running' and 'waiting' jobs whose worker process is gone to 'lost'"""
+    with _connect(db_file) as connection:
+        jobs = connection.execute(
+            "SELECT task_id, worker_pid FROM jobs WHERE status IN ('running', 'waiting')"
+        ).fetchall()
+        lost = [task_id for task_id, pid in jobs if not pid_alive(pid)]
+        _set_lost(connection, lost)
+    if lost:
+        print(f"[ WARNING ] - {len(lost)} jobs of ended workers marked 'lost'")
+    return len(lost)
+
+
+def try_admit(
+    db_file, task_id, threads, memory_gb, total_threads, memory_budget_gb
+) -> bool:
+    """
+    admit the job when its threads and memory_gb fit next to the admitted running jobs, see the
+    module docstring. One transaction, two workers can not both take the last room. A nan
+    memory_budget_gb (memory unknown) only limits the threads. Admitted jobs whose worker process
+    is gone are set to 'lost' and do not count.
+    """
+    connection = _connect(db_file)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        jobs = connection.execute(
+            "SELECT task_id, admitted_threads, memory_gb, worker_pid FROM jobs "
+            "WHERE admitted_threads IS NOT NULL AND status = 'running' AND task_id != ?",
+            (task_id,),
+        ).fetchall()
+        alive = [job for job in jobs if pid_alive(job[3])]
+        _set_lost(connection, [job[0] for job in jobs if job not in alive])
+        admitted = len(alive)
+        used_threads = sum(job[1] for job in alive)
+        used_memory_gb = sum(job[2] or 0 for job in alive)
+        fits = used_threads + threads <= total_threads and (
+            math.isnan(memory_budget_gb)
+            or used_memory_gb + (memory_gb or 0) <= memory_budget_gb
+        )
+        if not admitted or fits:
+            connection.execute(
+                "UPDATE jobs SET status = 'running', admitted_threads = ?, worker_pid = ? "
+                "WHERE task_id = ?",
+                (threads, os.getpid(), task_id),
+            )
+        connection.commit()
+        return not admitted or fits
+    finally:
+        connection.close()
+
+
+def get_job(db_file, task_id) -> dict:
+    with _connect(db_file) as connection:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            "SELECT * FROM jobs WHERE task_id = ?", (task_id,)
+        ).fetchone()
+    return dict(row) if row else {}
+
+
+def jobs_frame(db_file) -> pd.DataFrame:
+    """all jobs, newest first, with the times as text and the duration in minutes"""
+    with _connect(db_file) as connection:
+        jobs = pd.read_sql_query(
+            "SELECT * FROM jobs ORDER BY enqueued_at DESC", connection
+        )
+    now = time.time()
+    end = jobs["finished_at"].fillna(now)
+    jobs["duration_min"] = ((end - jobs["started_at"]) / 60).round(1)
+    jobs["waited_min"] = (
+        (jobs["started_at"].fillna(now) - jobs["enqueued_at"]) / 60
+    ).round(1)
+    for column in ["enqueued_at", "started_at", "finished_at"]:
+        jobs[column] = jobs[column].map(
+            lambda t: (
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))
+                if pd.notna(t)
+                else ""
+            )
+        )
+    return jobs
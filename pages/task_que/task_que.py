@@ -1,33 +1,253 @@
-import json
+"""
+Job queue for studies, reports and the GIM Excel export.
+
+Start the consumer with several worker processes (task.bat):
+
+    huey_consumer pages.task_que.task_que.huey -w 4 -k process
+
+Studies and reports run cli.py as a child process (huey process workers are daemonic and can not
+start the process pool of a parallel study), its output goes to 'task_logs/<task id>.log' next to
+the task db. Every job carries:
+
+    priority    higher runs first
+    threads     CPLEX threads of the job (threads per worker for the parallel study types)
+    memory_gb   expected peak memory of the job, also its --memory-budget-gb for the parallel
+                study types
+    retries     a job that crashed (cli.py exit code 4, or killed) runs again after retry_delay
+                seconds, a study then resumes from the years that are not solved yet
+
+A study only starts when its threads (times its workers) and memory_gb fit next to the studies
+that are running in the other worker processes, within QUEUE_THREADS and QUEUE_MEMORY_GB
+(AFRIPOW_QUEUE_THREADS / AFRIPOW_QUEUE_MEMORY_GB, all cores and 85% of the memory by default),
+until then it waits in its worker with status 'waiting', see job_store.try_admit. When a consumer
+starts, the jobs left active by a consumer that was killed are set to 'lost'.
+
+Years that did not solve (exit code 1) or a failed pre-flight check (exit code 3) are not retried,
+the job ends 'failed'. Status, attempts and timing of every job are kept in the task db, see
+job_store.py, the return value of the task also in the huey result store.
+"""
+
+import os
+import subprocess
+import sys
+import time
 from pathlib import Path
-import xlwings as xw
+
 from huey import SqliteHuey
-import streamlit as st
+from huey import signals
+
+import cli
+from afripow_pypsa.helpers.admission import DEFAULT_BUDGET_SHARE, total_memory_mb
+from pages.task_que.job_store import (
+    add_job,
+    job_started,
+    get_job,
+    mark_lost_jobs,
+    try_admit,
+    update_job,
+)
 
 PATH_TO_GIM = Path(
     r"C:\Users\apvse\OneDrive\S(Pypsa)-APVserver2\2502_Link-Relationship_Example\250211_GIM_Link_Example_v12.6.xlsb"
 )
-PATH_TO_TASK_DB = r"C:\Users\apvse\OneDrive\afripow-streamlit-gui-dev\pages\tasks.db"
-PATH_TO_HUEY_DB = r"C:\Users\apvse\OneDrive\afripow-streamlit-gui-dev\pages\huey.db"
+PATH_TO_TASK_DB = os.environ.get(
+    "AFRIPOW_TASK_DB",
+    r"C:\Users\apvse\OneDrive\afripow-streamlit-gui-dev\pages\tasks.db",
+)
+PATH_TO_HUEY_DB = os.environ.get(
+    "AFRIPOW_HUEY_DB",
+    r"C:\Users\apvse\OneDrive\afripow-streamlit-gui-dev\pages\huey.db",
+)
+QUEUE_THREADS = int(os.environ.get("AFRIPOW_QUEUE_THREADS", os.cpu_count() or 1))
+QUEUE_MEMORY_GB = float(
+    os.environ.get(
+        "AFRIPOW_QUEUE_MEMORY_GB", total_memory_mb() * DEFAULT_BUDGET_SHARE / 1024
+    )
+)
+# seconds between two admission checks of a waiting study
+ADMISSION_POLL_S = 15
+CLI_SCRIPT = Path(cli.__file__).absolute()
+RETRY_EXIT_CODES = [cli.EXIT_ERROR, cli.EXIT_INTERRUPTED]
 
 
 huey = SqliteHuey(PATH_TO_HUEY_DB)
 
 
+class QueueJobError(Exception):
+    """cli.py crashed, the job is retried when it has retries left"""
+
+
+def task_log_file(task_id) -> Path:
+    return Path(PATH_TO_TASK_DB).parent / "task_logs" / f"{task_id}.log"
+
+
+def _run_cli(args: list[str], task) -> dict:
+    """run cli.py with args for the task, returns its exit code and log file"""
+    log_file = task_log_file(task.id)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-u", str(CLI_SCRIPT), *args]
+    with open(log_file, "a") as log:
+        log.write(f"\n>>> {subprocess.list2cmdline(command)}\n")
+        log.flush()
+        returncode = subprocess.run(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            cwd=CLI_SCRIPT.parent,
+        ).returncode
+    result = {"returncode": returncode, "log": str(log_file)}
+    if returncode in RETRY_EXIT_CODES or returncode < 0:
+        raise QueueJobError(f"cli.py ended with exit code {returncode}, see {log_file}")
+    update_job(
+        PATH_TO_TASK_DB,
+        task.id,
+        status="finished" if returncode == cli.EXIT_OK else "failed",
+        result=result,
+    )
+    return result
+
+
+@huey.task(context=True)
+def run_study_task(
+    stage, case, years, options: dict, threads=None, memory_gb=None, task=None
+):
+    """
+    a study stage of a case (see cli.py study), options are the run_* keyword arguments. Waits until
+    its threads and memory_gb are admitted, see the module docstring
+    """
+    options = dict(options)
+    workers = max(1, int(options.get("parallel_workers") or 1))
+    if threads:
+        options["threads_per_worker"] = threads
+    if memory_gb and workers > 1 and not options.get("memory_budget_gb"):
+        # the years solved at the same time stay within the memory of the job
+        options["memory_budget_gb"] = memory_gb
+    if get_job(PATH_TO_TASK_DB, task.id).get("attempts", 1) > 1:
+        # a retry continues where the crashed attempt stopped
+        options["resume"] = True
+
+    job_threads = (threads or QUEUE_THREADS) * workers
+    update_job(PATH_TO_TASK_DB, task.id, status="waiting")
+    while not try_admit(
+        PATH_TO_TASK_DB,
+        task.id,
+        min(job_threads, QUEUE_THREADS),
+        memory_gb,
+        QUEUE_THREADS,
+        QUEUE_MEMORY_GB,
+    ):
+        time.sleep(ADMISSION_POLL_S)
+    return _run_cli(cli.study_args(stage, case, years, **options), task)
+
+
+@huey.task(context=True)
+def run_report_task(
+    case, settings, results_dir, reports=("ALL",), options=None, task=None
+):
+    """the case report of a stage folder (see cli.py report)"""
+    args = ["report", str(case), str(settings), results_dir, "--reports", *reports]
+    for name, value in (options or {}).items():
+        args.extend([f"--{name.replace('_', '-')}", str(value)])
+    return _run_cli(args, task)
+
+
+def enqueue_study(
+    label,
+    stage,
+    case,
+    years,
+    options: dict,
+    priority=0,
+    threads=None,
+    memory_gb=None,
+    retries=1,
+    retry_delay=60,
+) -> str:
+    """queue a study, returns the task id"""
+    task = run_study_task.s(
+        stage,
+        str(case),
+        [int(y) for y in years],
+        options,
+        threads=threads,
+        memory_gb=memory_gb,
+        priority=priority,
+        retries=retries,
+        retry_delay=retry_delay,
+    )
+    add_job(
+        PATH_TO_TASK_DB, task.id, "study", label, priority, threads, memory_gb, retries
+    )
+    huey.enqueue(task)
+    return task.id
+
+
+def enqueue_report(
+    label,
+    case,
+    settings,
+    results_dir,
+    reports=("ALL",),
+    options=None,
+    priority=0,
+    retries=0,
+) -> str:
+    """queue a case report, options: link_plot_color, currency, price_y_lim, returns the task id"""
+    task = run_report_task.s(
+        str(case),
+        str(settings),
+        results_dir,
+        list(reports),
+        options or {},
+        priority=priority,
+        retries=retries,
+    )
+    add_job(PATH_TO_TASK_DB, task.id, "report", label, priority, retries=retries)
+    huey.enqueue(task)
+    return task.id
+
+
+@huey.on_startup()
+def recover_lost_jobs():
+    """jobs left 'running' or 'waiting' by a consumer that was killed would block the admission"""
+    mark_lost_jobs(PATH_TO_TASK_DB)
+
+
+@huey.signal()
+def record_job_status(signal, task, exc=None):
+    """keep the job store up to date from the consumer, see job_store.py"""
+    if signal == signals.SIGNAL_EXECUTING:
+        job_started(PATH_TO_TASK_DB, task.id)
+    elif signal == signals.SIGNAL_COMPLETE:
+        if get_job(PATH_TO_TASK_DB, task.id).get("status") == "running":
+            update_job(PATH_TO_TASK_DB, task.id, status="finished")
+        update_job(PATH_TO_TASK_DB, task.id, finished_at=time.time())
+    elif signal == signals.SIGNAL_ERROR:
+        update_job(
+            PATH_TO_TASK_DB,
+            task.id,
+            status="error",
+            error=repr(exc),
+            finished_at=time.time(),
+        )
+    elif signal == signals.SIGNAL_RETRYING:
+        update_job(PATH_TO_TASK_DB, task.id, status="retrying")
+    elif signal in [
+        signals.SIGNAL_CANCELED,
+        signals.SIGNAL_REVOKED,
+        signals.SIGNAL_EXPIRED,
+        signals.SIGNAL_INTERRUPTED,
+    ]:
+        update_job(PATH_TO_TASK_DB, task.id, status=signal, finished_at=time.time())
+
+
 @huey.task(context=True)
 def create_excel_file(message, task=None):
     """Run a background task and update its status."""
-    task_id = task.id
-
-    with open("current_task.json", "w") as f:
-        json.dump(
-            {
-                "task_id": task_id,
-                "message": message,
-            },
-            f,
-            indent=4,
-        )
+    import xlwings as xw
+
+    update_job(PATH_TO_TASK_DB, task.id, kind="excel", label=message)
 
     # set current running task
     original_file = PATH_TO_GIM
@@ -41,14 +261,3 @@ def create_excel_file(message, task=None):
     # Close workbook and quit Excel completely
     wb.close()
     app.quit()  # Ensure Excel process is terminated
-
-    # clear current running task
-    with open("current_task.json", "w") as f:
-        json.dump(
-            {
-                "task_id": "No task",
-                "message": "No message",
-            },
-            f,
-            indent=4,
-        )
@@ -1 +1 @@
-huey_consumer pages.task_que.task_que.huey
+huey_consumer pages.task_que.task_que.huey -w 4 -k process